@@ -41,11 +41,43 @@ def handle_preflight():
 # ==============================
 # ✅ INIT EXTENSIONS
 # ==============================
+# Bind 'replica' opsional untuk request baca (lihat utils/replica_helper.py)
+from sim_buah_api.utils.replica_helper import init_read_replica
+init_read_replica(app)
+
+# Opsi engine & pool dari profil DB_PROFILE + env DB_* (lihat utils/engine_helper.py)
+from sim_buah_api.utils.engine_helper import init_engine_options, pool_status
+init_engine_options(app)
+
 db.init_app(app)
 jwt.init_app(app)
 bcrypt.init_app(app)
 migrate = Migrate(app, db)
 
+# Log aktivitas ditulis dalam commit transaksi utama (lihat utils/log_helper.py)
+from sim_buah_api.utils.log_helper import init_audit_log
+init_audit_log(app)
+
+# Versi tabel master naik di commit yang sama (ETag list master)
+from sim_buah_api.utils.versi_helper import init_versi_data
+init_versi_data(app)
+
+# Waktu request, jumlah / waktu SQL, deteksi N+1 (lihat utils/perf_helper.py)
+from sim_buah_api.utils.perf_helper import init_perf
+init_perf(app)
+
+# Metrik Prometheus di GET /metrics (lihat utils/metrics_helper.py)
+from sim_buah_api.utils.metrics_helper import init_metrics
+init_metrics(app)
+
+# Perintah CLI tambahan (flask rekap-penjualan ..., flask kadaluarsa ...)
+from sim_buah_api.cli import register_commands
+register_commands(app)
+
+# Scan kadaluarsa terjadwal (aktif jika EXPIRY_SCAN_INTERVAL > 0)
+from sim_buah_api.utils.kadaluarsa_helper import init_scan_scheduler
+init_scan_scheduler(app)
+
 # ==============================
 # ✅ JWT CONFIG
 # ==============================
@@ -97,7 +129,8 @@ app.register_blueprint(monitor_bp, url_prefix="/api/monitor")
 def get_status():
     return jsonify({
         "status": "ok",
-        "service": "SIM Buah API is running"
+        "service": "SIM Buah API is running",
+        "database_pool": pool_status(db, app)
     }), 200
 
 # ==============================
@@ -0,0 +1,140 @@
+"""
+Benchmark export XLSX laporan transaksi: jalur lama (list dict -> pandas
+DataFrame -> ExcelWriter ke BytesIO) vs jalur constant_memory
+(iter_laporan_rows -> write_xlsx ke file sementara).
+
+Setiap kombinasi (mode, jumlah baris) dijalankan di proses terpisah agar
+peak RSS (ru_maxrss) tidak saling memengaruhi:
+
+    python bench_export_xlsx.py
+    python bench_export_xlsx.py --sizes 10000 100000
+    python bench_export_xlsx.py --modes stream --sizes 1000000
+
+Data sintetis disimpan di file SQLite sementara per ukuran (dipakai ulang
+antar run lewat --data-dir).
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+from decimal import Decimal
+
+from sqlalchemy import insert
+
+from sim_buah_api import create_app
+from sim_buah_api.config import Config
+from sim_buah_api.database import db
+from sim_buah_api.models import Role, User, Pelanggan, BarangKeluar
+
+DEFAULT_SIZES = [10_000, 100_000, 1_000_000]
+MODES = ['pandas', 'stream']
+START_DATE = date(2000, 1, 1)
+
+
+def make_app(db_path):
+    class BenchConfig(Config):
+        SQLALCHEMY_DATABASE_URI = 'sqlite:///' + db_path
+        SQLALCHEMY_ENGINE_OPTIONS = {}
+    return create_app(BenchConfig)
+
+
+def seed(db_path, rows):
+    app = make_app(db_path)
+    with app.app_context():
+        db.create_all()
+        role = Role(nama_role='Admin')
+        db.session.add(role)
+        db.session.flush()
+        user = User(username='bench', nama_lengkap='Bench', role_id=role.role_id, password_hash='-')
+        pelanggan = Pelanggan(nama_pelanggan='Pelanggan Bench', alamat='-')
+        db.session.add_all([user, pelanggan])
+        db.session.flush()
+        batch = 50_000
+        for offset in range(0, rows, batch):
+            db.session.execute(insert(BarangKeluar), [
+                {
+                    "tanggal_transaksi": START_DATE + timedelta(days=i % 9000),
+                    "pelanggan_id": pelanggan.pelanggan_id,
+                    "user_id": user.user_id,
+                    "status_pesanan": "Terkirim",
+                    "total_penjualan": Decimal('125000.50'),
+                } for i in range(offset, min(offset + batch, rows))
+            ])
+        db.session.commit()
+
+
+def run_worker(mode, db_path):
+    """Dijalankan di proses anak: export sekali, cetak hasil sebagai JSON."""
+    from sim_buah_api.routes.laporan_routes import get_transaksi_data
+    from sim_buah_api.utils.export_helper import KOLOM_LAPORAN, TIPE_KOLOM, iter_laporan_rows, write_xlsx
+
+    app = make_app(db_path)
+    end_date = date.today()
+    with app.app_context():
+        started = time.perf_counter()
+        if mode == 'pandas':
+            import io
+            import pandas as pd
+            df = pd.DataFrame(get_transaksi_data(START_DATE, end_date))
+            output = io.BytesIO()
+            with pd.ExcelWriter(output, engine='xlsxwriter') as writer:
+                df.to_excel(writer, index=False, sheet_name='Laporan')
+            size = output.getbuffer().nbytes
+        else:
+            rows = iter_laporan_rows('transaksi', START_DATE, end_date)
+            output = write_xlsx(KOLOM_LAPORAN['transaksi'], TIPE_KOLOM['transaksi'], rows)
+            size = os.fstat(output.fileno()).st_size
+            output.close()
+        elapsed = time.perf_counter() - started
+
+    # Linux: ru_maxrss dalam KB
+    peak_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print(json.dumps({"seconds": elapsed, "peak_rss_mb": peak_mb, "bytes": size}))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES)
+    parser.add_argument('--modes', nargs='+', choices=MODES, default=MODES)
+    parser.add_argument('--data-dir', default=os.path.join(tempfile.gettempdir(), 'sim_buah_bench_export'))
+    parser.add_argument('--timeout', type=int, default=1800, help='Batas waktu per run (detik)')
+    parser.add_argument('--worker', choices=MODES, help=argparse.SUPPRESS)
+    parser.add_argument('--db', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        run_worker(args.worker, args.db)
+        return
+
+    os.makedirs(args.data_dir, exist_ok=True)
+    print(f"{'baris':>10} {'mode':>8} {'waktu (s)':>10} {'peak RSS (MB)':>14} {'ukuran (MB)':>12}")
+    for size in args.sizes:
+        db_path = os.path.join(args.data_dir, f'bench_{size}.db')
+        if not os.path.exists(db_path):
+            print(f"Menyiapkan {size} baris di {db_path} ...", file=sys.stderr)
+            seed(db_path, size)
+
+        for mode in args.modes:
+            try:
+                proc = subprocess.run(
+                    [sys.executable, os.path.abspath(__file__), '--worker', mode, '--db', db_path],
+                    capture_output=True, text=True, timeout=args.timeout
+                )
+            except subprocess.TimeoutExpired:
+                print(f"{size:>10} {mode:>8} {'timeout':>10}")
+                continue
+            if proc.returncode != 0:
+                print(f"{size:>10} {mode:>8} {'gagal':>10}  {proc.stderr.strip().splitlines()[-1:]}")
+                continue
+            result = json.loads(proc.stdout.strip().splitlines()[-1])
+            print(f"{size:>10} {mode:>8} {result['seconds']:>10.2f} {result['peak_rss_mb']:>14.1f} "
+                  f"{result['bytes'] / 1e6:>12.2f}")
+
+
+if __name__ == '__main__':
+    main()
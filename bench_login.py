@@ -0,0 +1,120 @@
+"""
+Benchmark login (POST /api/auth/login) per cost bcrypt (BCRYPT_LOG_ROUNDS).
+
+Login dijalankan berurutan di satu proses. Bcrypt murni CPU, jadi hasilnya
+= kapasitas login per detik per core; kalikan dengan jumlah worker sync
+gunicorn (1 worker = 1 core) untuk mengukur lonjakan login saat ganti shift:
+
+    python bench_login.py
+    python bench_login.py --costs 10 12 14 --logins 50
+
+Kolom:
+  login/s/core : throughput end-to-end (request Flask + query + bcrypt + commit)
+  bcrypt ms    : waktu check_password_hash saja
+  sql/login    : jumlah statement SQL per login (SELECT join + INSERT log)
+  rehash ms    : login pertama setelah cost diganti (verifikasi hash lama + hash baru)
+"""
+import argparse
+import os
+import statistics
+import tempfile
+import time
+
+import bcrypt as bcrypt_lib
+from sqlalchemy import event
+
+from sim_buah_api import create_app
+from sim_buah_api.config import Config
+from sim_buah_api.database import db, bcrypt
+from sim_buah_api.models import Role, User
+
+DEFAULT_COSTS = [10, 11, 12, 13]
+PASSWORD = 'rahasia-bench'
+
+
+def make_app(cost):
+    tmp = tempfile.mkdtemp()
+
+    class BenchConfig(Config):
+        SQLALCHEMY_DATABASE_URI = 'sqlite:///' + os.path.join(tmp, 'bench.db')
+        SQLALCHEMY_ENGINE_OPTIONS = {}
+        BCRYPT_LOG_ROUNDS = cost
+        CACHE_PATH = os.path.join(tmp, 'cache.db')
+        METRICS_PATH = os.path.join(tmp, 'metrics.db')
+
+    return create_app(BenchConfig)
+
+
+def seed(app, hash_cost):
+    with app.app_context():
+        db.create_all()
+        role = Role(nama_role='Petugas Gudang')
+        db.session.add(role)
+        db.session.flush()
+        password_hash = bcrypt_lib.hashpw(PASSWORD.encode(), bcrypt_lib.gensalt(hash_cost)).decode()
+        db.session.add(User(username='bench', nama_lengkap='Bench', role_id=role.role_id,
+                            password_hash=password_hash))
+        db.session.commit()
+
+
+def login(client):
+    start = time.perf_counter()
+    response = client.post('/api/auth/login', json={'username': 'bench', 'password': PASSWORD})
+    elapsed = time.perf_counter() - start
+    if response.status_code != 200:
+        raise SystemExit(f"Login gagal ({response.status_code}): {response.get_json()}")
+    return elapsed
+
+
+def bench_cost(cost, logins):
+    # Hash awal dibuat dengan cost berbeda -> login pertama memicu rehash
+    app = make_app(cost)
+    seed(app, cost - 1 if cost > 4 else cost + 1)
+    client = app.test_client()
+
+    rehash = login(client)
+    with app.app_context():
+        user = User.query.filter_by(username='bench').one()
+        if user.password_perlu_rehash():
+            raise SystemExit(f"Hash tidak di-rehash ke cost {cost}")
+        password_hash = user.password_hash
+
+        statements = []
+        event.listen(db.engine, 'before_cursor_execute', lambda *args: statements.append(1))
+
+    times = [login(client) for _ in range(logins)]
+
+    bcrypt_times = []
+    for _ in range(max(3, logins // 5)):
+        start = time.perf_counter()
+        bcrypt.check_password_hash(password_hash, PASSWORD)
+        bcrypt_times.append(time.perf_counter() - start)
+
+    mean = statistics.mean(times)
+    return {
+        'cost': cost,
+        'per_core': 1 / mean,
+        'login_ms': mean * 1000,
+        'p95_ms': sorted(times)[max(0, int(len(times) * 0.95) - 1)] * 1000,
+        'bcrypt_ms': statistics.mean(bcrypt_times) * 1000,
+        'sql': len(statements) / logins,
+        'rehash_ms': rehash * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--costs', type=int, nargs='+', default=DEFAULT_COSTS)
+    parser.add_argument('--logins', type=int, default=20, help='jumlah login terukur per cost')
+    args = parser.parse_args()
+
+    print(f"{'cost':>4} {'login/s/core':>13} {'login ms':>9} {'p95 ms':>8} "
+          f"{'bcrypt ms':>10} {'sql/login':>10} {'rehash ms':>10}")
+    for cost in args.costs:
+        r = bench_cost(cost, args.logins)
+        print(f"{r['cost']:>4} {r['per_core']:>13.1f} {r['login_ms']:>9.1f} {r['p95_ms']:>8.1f} "
+              f"{r['bcrypt_ms']:>10.1f} {r['sql']:>10.1f} {r['rehash_ms']:>10.1f}")
+
+
+if __name__ == '__main__':
+    main()
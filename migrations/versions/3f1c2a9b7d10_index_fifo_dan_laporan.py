@@ -0,0 +1,51 @@
+"""index fifo dan laporan
+
+Revision ID: 3f1c2a9b7d10
+Revises:
+Create Date: 2026-10-18 09:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3f1c2a9b7d10'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+# (nama index, tabel, kolom) — harus sama dengan __table_args__ di models.py
+INDEXES = [
+    ('ix_batch_stok_fifo', 'batch_stok', ['buah_id', 'tanggal_masuk_batch', 'stok_saat_ini']),
+    ('ix_batch_stok_tanggal_stok', 'batch_stok', ['tanggal_masuk_batch', 'stok_saat_ini']),
+    ('ix_barang_keluar_tanggal_status', 'trx_barang_keluar', ['tanggal_transaksi', 'status_pesanan']),
+    ('ix_barang_keluar_tanggal_id', 'trx_barang_keluar', ['tanggal_transaksi', 'keluar_id']),
+    ('ix_barang_keluar_status', 'trx_barang_keluar', ['status_pesanan']),
+    ('ix_barang_masuk_tanggal', 'trx_barang_masuk', ['tanggal_transaksi']),
+    ('ix_log_aktivitas_timestamp', 'log_aktivitas', ['timestamp']),
+]
+
+
+def _existing_indexes(table):
+    # app.py menjalankan db.create_all() sebelum migrasi, jadi pada database
+    # baru index sudah ada. Migrasi ini harus idempotent.
+    inspector = sa.inspect(op.get_bind())
+    if not inspector.has_table(table):
+        return None
+    return {ix['name'] for ix in inspector.get_indexes(table)}
+
+
+def upgrade():
+    for name, table, columns in INDEXES:
+        existing = _existing_indexes(table)
+        if existing is not None and name not in existing:
+            op.create_index(name, table, columns)
+
+
+def downgrade():
+    for name, table, columns in reversed(INDEXES):
+        existing = _existing_indexes(table)
+        if existing and name in existing:
+            op.drop_index(name, table_name=table)
@@ -0,0 +1,46 @@
+"""rekap penjualan harian
+
+Revision ID: 8b2d4e6f1a35
+Revises: 3f1c2a9b7d10
+Create Date: 2026-10-18 12:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8b2d4e6f1a35'
+down_revision = '3f1c2a9b7d10'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # app.py menjalankan db.create_all() sebelum migrasi: tabel bisa sudah ada.
+    inspector = sa.inspect(op.get_bind())
+    if not inspector.has_table('rekap_penjualan_harian'):
+        op.create_table(
+            'rekap_penjualan_harian',
+            sa.Column('tanggal', sa.Date(), primary_key=True),
+            sa.Column('jumlah_transaksi', sa.Integer(), nullable=False, server_default='0'),
+            sa.Column('total_penjualan', sa.Numeric(14, 2), nullable=False, server_default='0'),
+            sa.Column('jumlah_batal', sa.Integer(), nullable=False, server_default='0'),
+        )
+
+    # Backfill dari transaksi yang sudah ada (hanya jika rekap masih kosong)
+    if inspector.has_table('trx_barang_keluar'):
+        op.execute(
+            "INSERT INTO rekap_penjualan_harian (tanggal, jumlah_transaksi, total_penjualan, jumlah_batal) "
+            "SELECT tanggal_transaksi, COUNT(keluar_id), COALESCE(SUM(total_penjualan), 0), "
+            "SUM(CASE WHEN status_pesanan = 'Batal' THEN 1 ELSE 0 END) "
+            "FROM trx_barang_keluar "
+            "WHERE NOT EXISTS (SELECT 1 FROM rekap_penjualan_harian) "
+            "GROUP BY tanggal_transaksi"
+        )
+
+
+def downgrade():
+    inspector = sa.inspect(op.get_bind())
+    if inspector.has_table('rekap_penjualan_harian'):
+        op.drop_table('rekap_penjualan_harian')
@@ -0,0 +1,32 @@
+"""versi data master
+
+Revision ID: a7d3f5b8c214
+Revises: e2a9c4f7b613
+Create Date: 2026-10-18 20:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a7d3f5b8c214'
+down_revision = 'e2a9c4f7b613'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Idempotent: app.py menjalankan db.create_all() sebelum migrasi
+    if sa.inspect(op.get_bind()).has_table('versi_data'):
+        return
+    op.create_table(
+        'versi_data',
+        sa.Column('nama_tabel', sa.String(length=50), primary_key=True),
+        sa.Column('versi', sa.BigInteger(), nullable=False),
+    )
+
+
+def downgrade():
+    if sa.inspect(op.get_bind()).has_table('versi_data'):
+        op.drop_table('versi_data')
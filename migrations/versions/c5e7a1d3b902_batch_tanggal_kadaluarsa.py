@@ -0,0 +1,64 @@
+"""batch tanggal kadaluarsa
+
+Revision ID: c5e7a1d3b902
+Revises: 8b2d4e6f1a35
+Create Date: 2026-10-18 15:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c5e7a1d3b902'
+down_revision = '8b2d4e6f1a35'
+branch_labels = None
+depends_on = None
+
+INDEX_NAME = 'ix_batch_stok_kadaluarsa_stok'
+
+
+def upgrade():
+    bind = op.get_bind()
+    inspector = sa.inspect(bind)
+    if not inspector.has_table('batch_stok'):
+        return
+
+    # create_all() di app.py tidak menambah kolom ke tabel lama, jadi kolom
+    # ditambahkan di sini; tetap idempotent untuk database yang baru dibuat.
+    columns = {col['name'] for col in inspector.get_columns('batch_stok')}
+    if 'tanggal_kadaluarsa' not in columns:
+        op.add_column('batch_stok', sa.Column('tanggal_kadaluarsa', sa.Date(), nullable=True))
+
+    if INDEX_NAME not in {ix['name'] for ix in inspector.get_indexes('batch_stok')}:
+        op.create_index(INDEX_NAME, 'batch_stok', ['tanggal_kadaluarsa', 'stok_saat_ini'])
+
+    # Backfill: tanggal_masuk_batch + umur_simpan_hari buah
+    if bind.dialect.name == 'mysql':
+        op.execute(
+            "UPDATE batch_stok b JOIN master_buah m ON m.buah_id = b.buah_id "
+            "SET b.tanggal_kadaluarsa = DATE_ADD(b.tanggal_masuk_batch, INTERVAL m.umur_simpan_hari DAY) "
+            "WHERE b.tanggal_kadaluarsa IS NULL"
+        )
+    elif bind.dialect.name == 'sqlite':
+        op.execute(
+            "UPDATE batch_stok SET tanggal_kadaluarsa = date(tanggal_masuk_batch, '+' || "
+            "(SELECT umur_simpan_hari FROM master_buah m WHERE m.buah_id = batch_stok.buah_id) || ' days') "
+            "WHERE tanggal_kadaluarsa IS NULL"
+        )
+    else:
+        op.execute(
+            "UPDATE batch_stok b SET tanggal_kadaluarsa = b.tanggal_masuk_batch + m.umur_simpan_hari "
+            "FROM master_buah m WHERE m.buah_id = b.buah_id AND b.tanggal_kadaluarsa IS NULL"
+        )
+
+
+def downgrade():
+    inspector = sa.inspect(op.get_bind())
+    if not inspector.has_table('batch_stok'):
+        return
+    if INDEX_NAME in {ix['name'] for ix in inspector.get_indexes('batch_stok')}:
+        op.drop_index(INDEX_NAME, table_name='batch_stok')
+    if 'tanggal_kadaluarsa' in {col['name'] for col in inspector.get_columns('batch_stok')}:
+        with op.batch_alter_table('batch_stok') as batch_op:
+            batch_op.drop_column('tanggal_kadaluarsa')
@@ -0,0 +1,38 @@
+"""alert kadaluarsa
+
+Revision ID: e2a9c4f7b613
+Revises: c5e7a1d3b902
+Create Date: 2026-10-18 16:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e2a9c4f7b613'
+down_revision = 'c5e7a1d3b902'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Idempotent: app.py menjalankan db.create_all() sebelum migrasi
+    if sa.inspect(op.get_bind()).has_table('alert_kadaluarsa'):
+        return
+    op.create_table(
+        'alert_kadaluarsa',
+        sa.Column('batch_id', sa.Integer(), sa.ForeignKey('batch_stok.batch_id', ondelete='CASCADE'), primary_key=True),
+        sa.Column('buah_id', sa.Integer(), sa.ForeignKey('master_buah.buah_id'), nullable=False),
+        sa.Column('nama_buah', sa.String(length=100), nullable=False),
+        sa.Column('tanggal_kadaluarsa', sa.Date(), nullable=False),
+        sa.Column('stok', sa.Numeric(10, 2), nullable=False),
+        sa.Column('status', sa.String(length=20), nullable=False),
+        sa.Column('dihapusbukukan', sa.Boolean(), nullable=False),
+        sa.Column('waktu_scan', sa.DateTime(), nullable=False),
+    )
+
+
+def downgrade():
+    if sa.inspect(op.get_bind()).has_table('alert_kadaluarsa'):
+        op.drop_table('alert_kadaluarsa')
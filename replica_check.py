@@ -0,0 +1,164 @@
+"""
+Cek routing read replica dengan dua file SQLite (primary & replica).
+
+Kedua file diisi skema yang sama, tapi nama buah di replica diberi akhiran
+" (replica)" sehingga dari response terlihat database mana yang dibaca:
+
+    python replica_check.py
+
+Yang dicek:
+  - GET listing / laporan membaca dari replica
+  - snapshot dashboard yang di-cache selalu dibangun dari primary, juga jika
+    blueprint dashboard dimasukkan ke DB_REPLICA_BLUEPRINTS
+  - write selalu ke primary, replica tidak pernah menerima INSERT/UPDATE/DELETE
+  - read-your-writes: GET user yang sama tepat setelah write membaca primary,
+    user lain tetap ke replica, dan penanda kadaluarsa setelah
+    DB_REPLICA_STICKY_SECONDS
+  - header 'X-Read-Primary: 1' memaksa primary
+  - blueprint di luar DB_REPLICA_BLUEPRINTS (admin, auth) tetap ke primary
+  - tanpa DATABASE_REPLICA_URL semua request ke primary
+
+Keluar dengan kode 1 jika ada pengecekan yang gagal.
+"""
+import os
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+from decimal import Decimal
+
+from flask_jwt_extended import create_access_token
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import Session
+
+from sim_buah_api import create_app
+from sim_buah_api.config import Config
+from sim_buah_api.database import db
+from sim_buah_api.models import Role, User, Buah, Supplier, Pelanggan, BarangMasuk, BatchStok
+
+STICKY_SECONDS = 1
+
+
+def seed(url, suffix):
+    """Skema + data awal di satu file; nama buah diberi akhiran penanda database."""
+    engine = create_engine(url)
+    db.metadata.create_all(engine)
+    with Session(engine) as session:
+        roles = [Role(nama_role=nama) for nama in ('Admin', 'Manajer', 'Petugas Gudang')]
+        session.add_all(roles)
+        session.flush()
+        session.add_all([
+            User(username='admin', nama_lengkap='Admin', role_id=roles[0].role_id, password_hash='-'),
+            User(username='gudang', nama_lengkap='Gudang', role_id=roles[2].role_id, password_hash='-'),
+            Supplier(nama_supplier='Supplier', alamat='-'),
+            Pelanggan(nama_pelanggan='Pelanggan', alamat='-'),
+            Buah(nama_buah=f'Apel{suffix}', satuan='kg', umur_simpan_hari=30, stok_total=Decimal(50)),
+        ])
+        session.flush()
+        masuk = BarangMasuk(supplier_id=1, user_id=1)
+        session.add(masuk)
+        session.flush()
+        session.add(BatchStok(masuk_id=masuk.masuk_id, buah_id=1, tanggal_masuk_batch=date.today(),
+                              tanggal_kadaluarsa=date.today() + timedelta(days=30),
+                              stok_awal=Decimal(50), stok_saat_ini=Decimal(50)))
+        session.commit()
+    engine.dispose()
+
+
+def make_app(primary_url, replica_url):
+    class ReplicaConfig(Config):
+        SQLALCHEMY_DATABASE_URI = primary_url
+        DATABASE_REPLICA_URL = replica_url
+        # dashboard ikut didaftarkan untuk menguji guard baca_dari_primary
+        DB_REPLICA_BLUEPRINTS = Config.DB_REPLICA_BLUEPRINTS + ['dashboard']
+        DB_REPLICA_STICKY_SECONDS = STICKY_SECONDS
+        CACHE_PATH = os.path.join(tempfile.mkdtemp(), 'cache.db')
+        METRICS_PATH = os.path.join(tempfile.mkdtemp(), 'metrics.db')
+
+    return create_app(ReplicaConfig)
+
+
+def main():
+    tmp = tempfile.mkdtemp()
+    primary_url = 'sqlite:///' + os.path.join(tmp, 'primary.db')
+    replica_url = 'sqlite:///' + os.path.join(tmp, 'replica.db')
+    seed(primary_url, '')
+    seed(replica_url, ' (replica)')
+
+    failed = []
+
+    def check(name, ok, detail=''):
+        print(f"[{'OK' if ok else 'GAGAL'}] {name}{f' ({detail})' if detail and not ok else ''}")
+        if not ok:
+            failed.append(name)
+
+    app = make_app(primary_url, replica_url)
+    replica_writes = []
+    with app.app_context():
+        headers = {}
+        for user_id, role in ((1, 'Admin'), (2, 'Petugas Gudang')):
+            token = create_access_token(identity=str(user_id), additional_claims={'role': role, 'username': 'x'})
+            headers[user_id] = {'Authorization': f'Bearer {token}'}
+
+        @event.listens_for(db.engines['replica'], 'before_cursor_execute')
+        def catat_replica(conn, cursor, statement, parameters, context, executemany):
+            if not statement.lstrip().upper().startswith(('SELECT', 'PRAGMA', 'WITH')):
+                replica_writes.append(statement)
+
+    client = app.test_client()
+
+    def nama_buah(user_id, **kwargs):
+        response = client.get('/api/master/buah', headers={**headers[user_id], **kwargs})
+        return response.headers.get('X-DB-Read'), response.get_json()[0]['nama_buah']
+
+    check('listing master membaca replica', nama_buah(2) == ('replica', 'Apel (replica)'), nama_buah(2))
+    for path in ('/api/monitor/batch_stock',
+                 f'/api/laporan/transaksi?start_date={date.today()}&end_date={date.today()}'):
+        response = client.get(path, headers=headers[1])
+        check(f'GET {path} membaca replica', response.headers.get('X-DB-Read') == 'replica',
+              response.headers.get('X-DB-Read'))
+
+    check('X-Read-Primary memaksa primary', nama_buah(2, **{'X-Read-Primary': '1'}) == ('primary', 'Apel'))
+    response = client.get('/api/admin/users', headers=headers[1])
+    check('blueprint admin tetap ke primary', response.headers.get('X-DB-Read') == 'primary')
+
+    # Write oleh user 2 -> masuk ke primary
+    response = client.post('/api/inventory/masuk', headers=headers[2],
+                           json={'supplier_id': 1, 'items': [{'buah_id': 1, 'stok_awal': 5}]})
+    check('write barang masuk sukses', response.status_code == 201, response.status_code)
+    check('read-your-writes: user penulis membaca primary', nama_buah(2) == ('primary', 'Apel'), nama_buah(2))
+    check('user lain tetap membaca replica', nama_buah(1)[0] == 'replica')
+    time.sleep(STICKY_SECONDS + 0.2)
+    check('penanda read-your-writes kadaluarsa', nama_buah(2)[0] == 'replica')
+    check('replica tidak pernah menerima write', not replica_writes, replica_writes[:1])
+
+    # Write di atas mem-bump versi dashboard; snapshot baru harus dari primary
+    # (stok 55), bukan replica yang tertinggal (stok 50)
+    response = client.get('/api/dashboard/?sections=kpi', headers=headers[1])
+    total_stok = response.get_json()['kpi_data']['total_stock']
+    check('snapshot dashboard dibangun dari primary',
+          (response.headers.get('X-Cache'), response.headers.get('X-DB-Read'), total_stok) == ('MISS', 'primary', 55),
+          (response.headers.get('X-Cache'), response.headers.get('X-DB-Read'), total_stok))
+
+    with app.app_context():
+        with db.engines['replica'].connect() as conn:
+            jumlah_replica = conn.exec_driver_sql('SELECT COUNT(*) FROM batch_stok').scalar()
+        jumlah_primary = db.session.query(BatchStok).count()
+    check('batch baru hanya ada di primary', (jumlah_primary, jumlah_replica) == (2, 1),
+          (jumlah_primary, jumlah_replica))
+
+    app_tanpa_replica = make_app(primary_url, None)
+    with app_tanpa_replica.app_context():
+        token = create_access_token(identity='2', additional_claims={'role': 'Petugas Gudang', 'username': 'x'})
+        check('tanpa DATABASE_REPLICA_URL tidak ada bind replica', 'replica' not in db.engines)
+    response = app_tanpa_replica.test_client().get('/api/master/buah', headers={'Authorization': f'Bearer {token}'})
+    check('tanpa replica membaca primary', response.get_json()[0]['nama_buah'] == 'Apel')
+
+    if failed:
+        print(f"\n{len(failed)} pengecekan gagal.")
+        sys.exit(1)
+    print("\nRouting read replica sesuai.")
+
+
+if __name__ == '__main__':
+    main()
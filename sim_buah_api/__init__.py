@@ -21,11 +21,43 @@ def create_app(config_class=Config):
          supports_credentials=True, 
          expose_headers=["Content-Disposition"]) 
 
+    # Bind 'replica' opsional untuk request baca (lihat utils/replica_helper.py)
+    from .utils.replica_helper import init_read_replica
+    init_read_replica(app)
+
+    # Opsi engine & pool dari profil DB_PROFILE + env DB_* (lihat utils/engine_helper.py)
+    from .utils.engine_helper import init_engine_options, pool_status
+    init_engine_options(app)
+
     db.init_app(app)
     jwt.init_app(app) 
     bcrypt.init_app(app)
     migrate.init_app(app, db)
 
+    # Log aktivitas ditulis dalam commit transaksi utama (lihat utils/log_helper.py)
+    from .utils.log_helper import init_audit_log
+    init_audit_log(app)
+
+    # Versi tabel master naik di commit yang sama (ETag list master)
+    from .utils.versi_helper import init_versi_data
+    init_versi_data(app)
+
+    # Waktu request, jumlah / waktu SQL, deteksi N+1 (lihat utils/perf_helper.py)
+    from .utils.perf_helper import init_perf
+    init_perf(app)
+
+    # Metrik Prometheus di GET /metrics (lihat utils/metrics_helper.py)
+    from .utils.metrics_helper import init_metrics
+    init_metrics(app)
+
+    # Perintah CLI tambahan (flask rekap-penjualan ..., flask kadaluarsa ...)
+    from .cli import register_commands
+    register_commands(app)
+
+    # Scan kadaluarsa terjadwal (aktif jika EXPIRY_SCAN_INTERVAL > 0)
+    from .utils.kadaluarsa_helper import init_scan_scheduler
+    init_scan_scheduler(app)
+
     app.config["JWT_ACCESS_TOKEN_EXPIRES"] = timedelta(minutes=15)
 
     # ==============================================================
@@ -74,6 +106,10 @@ def create_app(config_class=Config):
 
     @app.route('/api/status', methods=['GET'])
     def get_status():
-        return jsonify({"status": "ok", "service": "SIM Buah API is running"}), 200
+        return jsonify({
+            "status": "ok",
+            "service": "SIM Buah API is running",
+            "database_pool": pool_status(db, app)
+        }), 200
     
     return app
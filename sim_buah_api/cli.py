@@ -0,0 +1,81 @@
+import sys
+import click
+from flask.cli import AppGroup
+from .database import db
+
+# ====================================================================
+# PERINTAH CLI (flask <perintah>)
+# ====================================================================
+
+rekap_cli = AppGroup('rekap-penjualan', help='Kelola tabel rekap_penjualan_harian.')
+kadaluarsa_cli = AppGroup('kadaluarsa', help='Scan batch kadaluarsa & write-off stok.')
+
+
+def _parse_tanggal(ctx, param, value):
+    if value is None:
+        return None
+    try:
+        return click.DateTime(formats=['%Y-%m-%d']).convert(value, param, ctx).date()
+    except click.BadParameter:
+        raise click.BadParameter('Format tanggal harus YYYY-MM-DD')
+
+
+@rekap_cli.command('rebuild')
+@click.option('--start-date', callback=_parse_tanggal, help='Tanggal awal (YYYY-MM-DD), default: semua')
+@click.option('--end-date', callback=_parse_tanggal, help='Tanggal akhir (YYYY-MM-DD), default: semua')
+def rebuild_rekap(start_date, end_date):
+    """Bangun ulang rekap dari trx_barang_keluar."""
+    from .utils.rekap_helper import rebuild_rekap_penjualan
+    try:
+        jumlah_hari = rebuild_rekap_penjualan(start_date, end_date)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    click.echo(f"Rekap penjualan dibangun ulang: {jumlah_hari} hari.")
+
+
+@rekap_cli.command('check')
+@click.option('--start-date', callback=_parse_tanggal, help='Tanggal awal (YYYY-MM-DD), default: semua')
+@click.option('--end-date', callback=_parse_tanggal, help='Tanggal akhir (YYYY-MM-DD), default: semua')
+@click.option('--fix', is_flag=True, help='Bangun ulang rentang yang sama jika ada selisih')
+def check_rekap(start_date, end_date, fix):
+    """Rekonsiliasi rekap dengan transaksi asli (exit 1 jika ada selisih dan tidak --fix)."""
+    from .utils.rekap_helper import cek_rekap_penjualan, rebuild_rekap_penjualan
+    selisih = cek_rekap_penjualan(start_date, end_date)
+    if not selisih:
+        click.echo("OK: rekap penjualan sesuai dengan transaksi.")
+        return
+
+    for row in selisih:
+        click.echo(f"SELISIH {row['tanggal']}: transaksi={row['transaksi']} rekap={row['rekap']}")
+    if not fix:
+        sys.exit(1)
+    rebuild_rekap_penjualan(start_date, end_date)
+    db.session.commit()
+    click.echo(f"{len(selisih)} hari diperbaiki.")
+
+
+@kadaluarsa_cli.command('scan')
+@click.option('--hari', type=int, default=None, help='Batas hari hampir kadaluarsa (default: EXPIRY_ALERT_DAYS)')
+@click.option('--write-off', is_flag=True, help='Nolkan stok batch yang sudah kadaluarsa')
+@click.option('--user-id', type=int, default=None, help='User pencatat log write-off (default: EXPIRY_SYSTEM_USER)')
+def scan_kadaluarsa(hari, write_off, user_id):
+    """Perbarui tabel alert_kadaluarsa (dan write-off stok kadaluarsa jika --write-off)."""
+    from flask import current_app
+    from .utils.kadaluarsa_helper import TidakAdaUserAudit, jalankan_scan_kadaluarsa
+    if hari is None:
+        hari = current_app.config.get('EXPIRY_ALERT_DAYS', 2)
+    try:
+        hasil = jalankan_scan_kadaluarsa(hari, write_off, user_id)
+    except TidakAdaUserAudit as e:
+        click.echo(f"ERROR: Write-off dibatalkan, stok tidak diubah: {e}. Isi --user-id atau EXPIRY_SYSTEM_USER.", err=True)
+        sys.exit(1)
+    click.echo(f"Kadaluarsa: {hasil['kadaluarsa']} batch, hampir kadaluarsa: {hasil['hampir_kadaluarsa']} batch.")
+    if write_off:
+        click.echo(f"Write-off: {hasil['dihapusbukukan']} batch, total {hasil['total_write_off']:.2f} kg.")
+
+
+def register_commands(app):
+    app.cli.add_command(rekap_cli)
+    app.cli.add_command(kadaluarsa_cli)
@@ -2,8 +2,10 @@
 from flask_sqlalchemy import SQLAlchemy
 from flask_bcrypt import Bcrypt
 from flask_jwt_extended import JWTManager
+from .utils.replica_helper import RoutingSession
 
 # Objek Singleton: Dibuat di sini untuk diimpor oleh models dan routes
-db = SQLAlchemy()
+# RoutingSession: SELECT di request baca boleh diarahkan ke read replica
+db = SQLAlchemy(session_options={"class_": RoutingSession})
 bcrypt = Bcrypt()
 jwt = JWTManager()
\ No newline at end of file
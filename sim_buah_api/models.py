@@ -2,6 +2,7 @@
 
 from datetime import datetime, date
 from decimal import Decimal
+from flask import current_app
 
 # PENTING: Import db dan bcrypt dari file database yang berisi extensions
 from .database import db, bcrypt 
@@ -44,6 +45,15 @@ class User(db.Model):
         """Memverifikasi password hash."""
         return bcrypt.check_password_hash(self.password_hash, password)
 
+    def password_perlu_rehash(self):
+        """True jika hash dibuat dengan cost bcrypt selain BCRYPT_LOG_ROUNDS saat ini."""
+        # Format hash: $2b$<cost>$<salt+hash>
+        try:
+            cost = int(self.password_hash.split('$')[2])
+        except (IndexError, ValueError):
+            return True
+        return cost != current_app.config.get('BCRYPT_LOG_ROUNDS', 12)
+
 
 class LogAktivitas(db.Model):
     __tablename__ = 'log_aktivitas'
@@ -53,6 +63,11 @@ class LogAktivitas(db.Model):
     jenis_aksi = db.Column(db.String(50), nullable=False) # e.g., 'TRX_MASUK', 'USER_CREATE'
     deskripsi = db.Column(db.String(255), nullable=False)
 
+    # Index: "aktivitas terbaru" di dashboard (ORDER BY timestamp DESC LIMIT n)
+    __table_args__ = (
+        db.Index('ix_log_aktivitas_timestamp', 'timestamp'),
+    )
+
 # ====================================================================
 # B. MASTER DATA PENDUKUNG (FR-03, FR-04, FR-05)
 # ====================================================================
@@ -103,6 +118,11 @@ class BarangMasuk(db.Model):
     # Relasi Balik
     batches = db.relationship('BatchStok', backref='barang_masuk', lazy=True)
 
+    # Index: filter rentang tanggal di laporan & list barang masuk
+    __table_args__ = (
+        db.Index('ix_barang_masuk_tanggal', 'tanggal_transaksi'),
+    )
+
 class BatchStok(db.Model):
     __tablename__ = 'batch_stok'
     batch_id = db.Column(db.Integer, primary_key=True)
@@ -110,7 +130,7 @@ class BatchStok(db.Model):
     buah_id = db.Column(db.Integer, db.ForeignKey('master_buah.buah_id'), nullable=False)
     
     tanggal_masuk_batch = db.Column(db.Date, nullable=False) # KUNCI UTAMA FIFO
-    # tanggal_kadaluarsa = db.Column(db.Date)
+    tanggal_kadaluarsa = db.Column(db.Date) # tanggal_masuk_batch + umur_simpan_hari, diisi saat penerimaan
     
     stok_awal = db.Column(db.Numeric(10, 2), nullable=False)
     stok_saat_ini = db.Column(db.Numeric(10, 2), default=Decimal('0.00'), nullable=False)
@@ -126,8 +146,14 @@ class BatchStok(db.Model):
 
     
     # Constraint Kritis: Stok saat ini tidak boleh negatif
+    # Index FIFO: stok_saat_ini ikut di-index agar filter "stok > 0" cukup dibaca
+    # dari index (MySQL tidak mendukung partial index).
     __table_args__ = (
         db.CheckConstraint(stok_saat_ini >= Decimal('0.00'), name='stok_must_be_non_negative'),
+        db.Index('ix_batch_stok_fifo', 'buah_id', 'tanggal_masuk_batch', 'stok_saat_ini'),
+        db.Index('ix_batch_stok_tanggal_stok', 'tanggal_masuk_batch', 'stok_saat_ini'),
+        # Monitor kesegaran & scan kadaluarsa: urut/rentang tanggal_kadaluarsa untuk batch yang masih ada stok
+        db.Index('ix_batch_stok_kadaluarsa_stok', 'tanggal_kadaluarsa', 'stok_saat_ini'),
     )
 
 class BarangKeluar(db.Model):
@@ -148,6 +174,14 @@ class BarangKeluar(db.Model):
     cascade="all, delete-orphan"  # <--- penting
 )
 
+    # Index: laporan & dashboard (rentang tanggal + status), list keluar
+    # (ORDER BY tanggal DESC, keluar_id DESC) dan hitung pesanan batal.
+    __table_args__ = (
+        db.Index('ix_barang_keluar_tanggal_status', 'tanggal_transaksi', 'status_pesanan'),
+        db.Index('ix_barang_keluar_tanggal_id', 'tanggal_transaksi', 'keluar_id'),
+        db.Index('ix_barang_keluar_status', 'status_pesanan'),
+    )
+
 
 class DetailKeluar(db.Model):
     __tablename__ = 'trx_detail_keluar'
@@ -156,4 +190,49 @@ class DetailKeluar(db.Model):
     batch_id = db.Column(db.Integer, db.ForeignKey('batch_stok.batch_id'), nullable=False) # Kunci audit FIFO
     
     jumlah_keluar = db.Column(db.Numeric(10, 2), nullable=False)
-    harga_jual_satuan = db.Column(db.Numeric(10, 2), nullable=False)
\ No newline at end of file
+    harga_jual_satuan = db.Column(db.Numeric(10, 2), nullable=False)
+
+# ====================================================================
+# D. REKAP & ALERT (TABEL TURUNAN UNTUK LAPORAN, GRAFIK & DASHBOARD)
+# ====================================================================
+
+class RekapPenjualanHarian(db.Model):
+    """
+    Rekap penjualan per hari, di-update dalam transaksi yang sama dengan
+    create / ubah status / hapus pesanan (lihat utils/rekap_helper.py).
+    Bisa dibangun ulang dari trx_barang_keluar: `flask rekap-penjualan rebuild`.
+    """
+    __tablename__ = 'rekap_penjualan_harian'
+    tanggal = db.Column(db.Date, primary_key=True)
+    jumlah_transaksi = db.Column(db.Integer, nullable=False, default=0)
+    total_penjualan = db.Column(db.Numeric(14, 2), nullable=False, default=Decimal('0.00'))
+    jumlah_batal = db.Column(db.Integer, nullable=False, default=0)
+
+
+class AlertKadaluarsa(db.Model):
+    """
+    Hasil scan kadaluarsa terakhir (lihat utils/kadaluarsa_helper.py): satu baris
+    per batch yang sudah / hampir kadaluarsa. Tabel kecil ini yang dibaca
+    dashboard, bukan scan batch_stok setiap request.
+    """
+    __tablename__ = 'alert_kadaluarsa'
+    batch_id = db.Column(db.Integer, db.ForeignKey('batch_stok.batch_id', ondelete='CASCADE'), primary_key=True)
+    buah_id = db.Column(db.Integer, db.ForeignKey('master_buah.buah_id'), nullable=False)
+    nama_buah = db.Column(db.String(100), nullable=False)
+    tanggal_kadaluarsa = db.Column(db.Date, nullable=False)
+    stok = db.Column(db.Numeric(10, 2), nullable=False)
+    status = db.Column(db.String(20), nullable=False) # 'Kadaluarsa' / 'Hampir Kadaluarsa'
+    dihapusbukukan = db.Column(db.Boolean, nullable=False, default=False)
+    waktu_scan = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+
+class VersiData(db.Model):
+    """
+    Penanda versi per tabel master (buah / supplier / pelanggan), naik di commit
+    yang sama dengan setiap perubahan datanya (lihat utils/versi_helper.py).
+    Dipakai sebagai ETag list master: klien yang datanya masih sama cukup
+    menerima 304 dari satu lookup primary key.
+    """
+    __tablename__ = 'versi_data'
+    nama_tabel = db.Column(db.String(50), primary_key=True)
+    versi = db.Column(db.BigInteger, nullable=False, default=0)
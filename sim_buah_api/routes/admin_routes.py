@@ -1,31 +1,25 @@
 # /backend_flask/routes/admin_routes.py
 
 from flask import Blueprint, request, jsonify
-from flask_jwt_extended import jwt_required, get_jwt_identity, get_jwt
+from flask_jwt_extended import jwt_required, get_jwt_identity
 from ..database import db
 from ..models import User, Role # Impor model
-from functools import wraps
 # FIX KRITIS: Import record_log dari lokasi baru
 from ..utils.log_helper import record_log 
+from ..utils.cache_helper import invalidate_dashboard_on_write
+from ..utils.auth_helper import admin_required, invalidate_status_user_on_write
 
 admin_bp = Blueprint('admin', __name__)
 
+# Setiap write yang sukses meng-invalidate snapshot dashboard
+admin_bp.after_request(invalidate_dashboard_on_write)
+# ... dan cache status akun (is_active / role) di semua worker
+admin_bp.after_request(invalidate_status_user_on_write)
+
 
 # --- 1. HELPER: DECORATOR UNTUK RBAC (ROLE CHECKING) ---
-def admin_required():
-    """Decorator kustom untuk membatasi akses hanya untuk user dengan Role 'Admin'."""
-    def wrapper(fn):
-        @wraps(fn)
-        def decorator(*args, **kwargs):
-            claims = get_jwt()
-            user_role = claims.get('role')
-            
-            if user_role != 'Admin':
-                return jsonify(msg="Akses Ditolak: Hanya Admin yang dapat mengakses modul ini."), 403
-            
-            return fn(*args, **kwargs)
-        return decorator
-    return wrapper
+# admin_required ada di utils/auth_helper (role terkini dari status akun di
+# database, lewat cache per proses; claim 'role' di token tidak dipakai).
 
 # --- 2. API ENDPOINTS UNTUK USER MANAGEMENT (CRUD) ---
 
@@ -82,13 +76,13 @@ def create_user():
         new_user.set_password(password)
         
         db.session.add(new_user)
-        db.session.commit() # Commit transaksi utama
-        
-        # --- FIX 2: Panggil record_log setelah Commit sukses ---
+
+        # --- FIX 2: Catat log dalam transaksi yang sama (sebelum commit) ---
         record_log(
             action_type='USER_CREATE',
             description=f'Menambahkan user: {new_user.username} ({role_name})'
         )
+        db.session.commit() # Commit transaksi utama
         
         return jsonify({'message': f'User {username} ({role_name}) berhasil dibuat.'}), 201
     except Exception as e:
@@ -146,14 +140,14 @@ def update_user(user_id):
             log_desc += 'Password diubah, '
             is_updated = True
 
-        db.session.commit() # Commit transaksi utama
-        
-        # --- FIX 3: Panggil Log setelah Commit sukses ---
+        # --- FIX 3: Catat log dalam transaksi yang sama (sebelum commit) ---
         if is_updated:
             record_log(
                 action_type='USER_UPDATE',
                 description=log_desc.strip().rstrip(',') # Bersihkan koma & spasi di akhir
             )
+
+        db.session.commit() # Commit transaksi utama
         
         return jsonify({'message': f'User ID {user_id} berhasil diperbarui.'}), 200
 
@@ -172,13 +166,13 @@ def delete_user(user_id):
     try:
         # Soft Delete: Menonaktifkan user
         user.is_active = False 
-        db.session.commit() # Commit transaksi utama
-        
-        # --- FIX 4: Panggil Log setelah Commit sukses ---
+
+        # --- FIX 4: Catat log dalam transaksi yang sama (sebelum commit) ---
         record_log(
             action_type='USER_DELETE',
             description=f'Menonaktifkan user: {user.username} (ID {user_id}). (Soft Delete)'
         )
+        db.session.commit() # Commit transaksi utama
         
         return jsonify({'message': f'User ID {user_id} berhasil dinonaktifkan.'}), 200
     except Exception as e:
@@ -9,8 +9,11 @@ from flask_jwt_extended import (
     unset_jwt_cookies,
     get_jwt
 )
-from ..database import db, bcrypt
-from ..models import User, Role, LogAktivitas # <-- FIX 1: Import LogAktivitas
+from ..database import db
+from ..models import User, Role
+from ..utils.log_helper import record_log
+from ..utils.auth_helper import status_user
+from ..utils.metrics_helper import inc_metric
 from datetime import timedelta, datetime
 
 auth_bp = Blueprint('auth', __name__)
@@ -25,63 +28,75 @@ def login():
     password = data.get('password')
 
     if not username or not password:
+        inc_metric('sim_buah_login_attempts_total', {'result': 'invalid_request'})
         return jsonify(msg="Username dan Password wajib diisi."), 400
 
-    user = User.query.filter_by(username=username).first()
+    # User + nama role dalam satu query (join), bukan User lalu Role.query.get
+    row = db.session.query(User, Role.nama_role).join(
+        Role, Role.role_id == User.role_id
+    ).filter(User.username == username).first()
 
-    if not user:
+    if not row:
+        inc_metric('sim_buah_login_attempts_total', {'result': 'unknown_user'})
         return jsonify(msg="User tidak ditemukan."), 404
+    user, nama_role = row
+    user_id = user.user_id  # dibaca sebelum commit (menghindari reload setelah expire)
 
     if not user.is_active:
+        inc_metric('sim_buah_login_attempts_total', {'result': 'inactive'})
         return jsonify(msg="Akun tidak aktif."), 403
 
-    if not bcrypt.check_password_hash(user.password_hash, password):
+    if not user.check_password(password):
+        inc_metric('sim_buah_login_attempts_total', {'result': 'wrong_password'})
         return jsonify(msg="Password salah."), 401
 
-    # Ambil role (Admin, Manajer, Petugas Gudang)
-    role = Role.query.get(user.role_id)
+    # Cost bcrypt berubah (BCRYPT_LOG_ROUNDS) -> hash ulang dengan password yang
+    # baru terverifikasi; UPDATE ikut commit log login di bawah
+    if user.password_perlu_rehash():
+        user.set_password(password)
 
     # Payload untuk RBAC
     claims = {
         "username": user.username,
-        "role": role.nama_role 
+        "role": nama_role
     }
 
     # TOKEN
     access_token = create_access_token(
-        identity=str(user.user_id),
+        identity=str(user_id),
         additional_claims=claims,
         expires_delta=timedelta(minutes=30)
     )
 
     refresh_token = create_refresh_token(
-        identity=str(user.user_id),
+        identity=str(user_id),
         expires_delta=timedelta(days=7)
     )
 
     # -------------------------------------------------------------
     # FIX 2: PENAMBAHAN LOG AKTIVITAS LOGIN
     # -------------------------------------------------------------
+    # Satu commit: log login (+ UPDATE hash jika di-rehash).
+    record_log(
+        action_type='LOGIN_SUCCESS',
+        description=f'Pengguna {user.nama_lengkap} ({nama_role}) berhasil login.',
+        user_id=user_id
+    )
     try:
-        log = LogAktivitas(
-            user_id=user.user_id,
-            jenis_aksi='LOGIN_SUCCESS',
-            deskripsi=f'Pengguna {user.nama_lengkap} ({role.nama_role}) berhasil login.'
-        )
-        db.session.add(log)
         db.session.commit()
     except Exception as e:
         # PENTING: Jika log gagal, jangan batalkan login.
         print(f"Error logging LOGIN activity: {e}")
         db.session.rollback()
     # -------------------------------------------------------------
-    
+    inc_metric('sim_buah_login_attempts_total', {'result': 'success'})
+
     return jsonify({
         "message": "Login sukses",
         "access_token": access_token,
         "refresh_token": refresh_token,
-        "user_role": role.nama_role,
-        "user_id": user.user_id
+        "user_role": nama_role,
+        "user_id": user_id
     }), 200
 
 
@@ -94,12 +109,18 @@ def refresh():
     user_id = get_jwt_identity()
     claims = get_jwt()
 
-    # Buat ulang access token baru dengan claims lama (role, username)
+    # Refresh token tidak membawa claim role: ambil status akun terkini
+    # (sekaligus menolak akun yang sudah dinonaktifkan)
+    status = status_user(user_id)
+    if status is None or not status[0]:
+        return jsonify(msg="Akun tidak aktif."), 403
+
+    # Buat ulang access token baru (role terkini, username dari claim lama)
     new_access = create_access_token(
         identity=user_id,
         additional_claims={
             "username": claims.get("username"),
-            "role": claims.get("role"),
+            "role": status[1],
         },
         expires_delta=timedelta(minutes=30)
     )
@@ -116,16 +137,20 @@ def refresh():
 @jwt_required()
 def me():
     user_id = get_jwt_identity()
-    user = User.query.get(user_id)
+    # Satu query (user + nama role), tanpa lazy load user.role
+    row = db.session.query(User, Role.nama_role).join(
+        Role, Role.role_id == User.role_id
+    ).filter(User.user_id == user_id).first()
 
-    if not user:
+    if not row:
         return jsonify(msg="User tidak ditemukan."), 404
+    user, nama_role = row
 
     return jsonify({
         "user_id": user.user_id,
         "username": user.username,
         "nama_lengkap": user.nama_lengkap,
-        "role": user.role.nama_role
+        "role": nama_role
     }), 200
 
 
@@ -3,18 +3,12 @@
 from flask import Blueprint, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from sim_buah_api.database import db
-from sim_buah_api.models import BatchStok, Buah, User
+from sim_buah_api.models import BatchStok, Buah
+from sim_buah_api.utils.auth_helper import get_user_role
 from sqlalchemy import func
 
 batch_stock_bp = Blueprint('batch_stock', __name__, url_prefix='/api/batch-stock')
 
-# =========================
-# Helper: Ambil role user
-# =========================
-def get_user_role(user_id):
-    user = User.query.get(user_id)
-    return user.role.nama_role if user else None
-
 # =========================
 # Get all batch stock (FIFO)
 # =========================
@@ -1,40 +1,181 @@
-from flask import Blueprint, jsonify
+from flask import Blueprint, jsonify, current_app, request
 from flask_jwt_extended import jwt_required
 from sqlalchemy import extract, func, case, or_
 from ..database import db
 from ..models import (
     User, Supplier, Pelanggan, Buah,
-    LogAktivitas, BarangKeluar, DetailKeluar, BatchStok
+    LogAktivitas, BarangMasuk, BarangKeluar, DetailKeluar, BatchStok,
+    RekapPenjualanHarian, AlertKadaluarsa
 )
-from datetime import datetime, date
+from datetime import datetime, date, timedelta
+from ..utils.cache_helper import get_cache
+from ..utils.replica_helper import baca_dari_primary
+from ..utils.auth_helper import admin_required, get_user_role
 
 dashboard_bp = Blueprint('dashboard', __name__)
 
+# ======================================================
+# SECTION DASHBOARD PER ROLE
+# ------------------------------------------------------
+# Nama section (parameter ?sections=) -> key di response JSON.
+# Hanya query untuk section yang diminta yang dijalankan.
+# ======================================================
+SECTION_KEYS = {
+    "kpi": "kpi_data",
+    "manager": "manager_stats",
+    "petugas": "petugas_stats",
+    "system": "system_health",
+    "activities": "recent_activities",
+    "alerts": "expiry_alerts",
+}
+
+# Section default (dan yang diizinkan) per role terkini user (status akun di database)
+ROLE_SECTIONS = {
+    "Admin": ["kpi", "manager", "petugas", "system", "activities", "alerts"],
+    "Manajer": ["kpi", "manager", "alerts"],
+    "Petugas Gudang": ["petugas", "alerts"],
+}
+
 
 @dashboard_bp.route('/', methods=['GET'])
 @jwt_required()
 def get_dashboard_data():
-    now = datetime.now()
-    today = date.today()
+    """
+    Snapshot dashboard di-cache (TTL pendek, DASHBOARD_CACHE_TTL) di cache
+    bersama antar worker. Key memakai versi 'dashboard' yang di-bump oleh setiap
+    write sukses di transaksi/inventory/master/admin, jadi data tidak basi
+    setelah ada perubahan.
+
+    Section yang dihitung ditentukan oleh role terkini user (get_user_role,
+    bukan claim di token), dan bisa dipersempit dengan ?sections=kpi,manager.
+    User nonaktif / tidak ditemukan -> 403.
+    """
+    role = get_user_role()
+    if role is None:
+        return jsonify({"status": "error", "message": "Akses ditolak"}), 403
+    allowed = ROLE_SECTIONS.get(role, ["kpi"])
+
+    sections_arg = request.args.get("sections")
+    if sections_arg:
+        sections = [s.strip() for s in sections_arg.split(",") if s.strip()]
+        unknown = [s for s in sections if s not in SECTION_KEYS]
+        if unknown:
+            return jsonify({"status": "error", "message": f"Section tidak dikenal: {', '.join(unknown)}"}), 400
+        forbidden = [s for s in sections if s not in allowed]
+        if forbidden:
+            return jsonify({"status": "error", "message": f"Akses ditolak untuk section: {', '.join(forbidden)}"}), 403
+    else:
+        sections = allowed
+    sections = sorted(set(sections))
+
+    cache = get_cache()
+    key = f"dashboard:v{cache.get_version('dashboard')}:{'+'.join(sections)}"
+
+    snapshot = cache.get(key)
+    cache_status = "HIT"
+    if snapshot is None:
+        # Snapshot disimpan di bawah versi terbaru: bangun dari primary, bukan
+        # replica yang mungkin belum menerima write yang mem-bump versi tersebut
+        baca_dari_primary()
+        snapshot = build_dashboard_snapshot(sections)
+        cache.set(key, snapshot, current_app.config.get('DASHBOARD_CACHE_TTL', 30))
+        cache_status = "MISS"
+
+    response = jsonify(snapshot)
+    response.headers['X-Cache'] = cache_status
+    return response
+
+
+@dashboard_bp.route('/cache-stats', methods=['GET'])
+@jwt_required()
+@admin_required()
+def get_dashboard_cache_stats():
+    """Counter hit/miss cache dashboard (gabungan semua worker)."""
+    return jsonify(get_cache().stats()), 200
+
+
+def build_dashboard_snapshot(sections):
+    """Hitung data dashboard langsung dari database, hanya untuk section yang diminta."""
+    shared = {}
+    builders = {
+        "kpi": _kpi_data,
+        "manager": _manager_stats,
+        "petugas": _petugas_stats,
+        "system": _system_health,
+        "activities": _recent_activities,
+        "alerts": _expiry_alerts,
+    }
+    return {SECTION_KEYS[name]: builders[name](shared) for name in sections}
+
+
+# ======================================================
+# Nilai yang dipakai beberapa section dihitung sekali per snapshot
+# ======================================================
+def _total_stock(shared):
+    if "total_stock" not in shared:
+        shared["total_stock"] = float(
+            db.session.query(func.coalesce(func.sum(Buah.stok_total), 0)).scalar()
+        )
+    return shared["total_stock"]
+
+
+def _fifo_kritis(shared):
+    if "fifo_kritis" not in shared:
+        rows = db.session.query(
+            Buah.nama_buah,
+            BatchStok.stok_saat_ini,
+            BatchStok.tanggal_masuk_batch,
+            BatchStok.kualitas
+        ).join(
+            Buah, BatchStok.buah_id == Buah.buah_id
+        ).filter(
+            BatchStok.stok_saat_ini > 0
+        ).order_by(BatchStok.tanggal_masuk_batch.asc()).limit(5).all()
+
+        shared["fifo_kritis"] = [
+            {
+                "buah": row.nama_buah,
+                "stok_saat_ini": float(row.stok_saat_ini),
+                "tanggal_masuk": row.tanggal_masuk_batch.strftime("%Y-%m-%d"),
+                "kualitas": row.kualitas
+            }
+            for row in rows
+        ]
+    return shared["fifo_kritis"]
 
-    # ======================================================
-    # 1. KPI & STATS UMUM (Admin, Manajer, Petugas)
-    # ======================================================
+
+# ======================================================
+# 1. KPI & STATS UMUM (Admin, Manajer)
+# ======================================================
+def _kpi_data(shared):
     active_users_count = User.query.filter(
         (User.is_active == True) | (User.is_active == 1)
     ).count()
     total_suppliers = Supplier.query.count()
     total_customers = Pelanggan.query.count()
-    total_stock = db.session.query(func.coalesce(func.sum(Buah.stok_total), 0)).scalar()
 
-    # ======================================================
-    # 2. Manager Stats (Manajer)
-    # ======================================================
+    return {
+        "active_users": active_users_count,
+        "total_suppliers": total_suppliers,
+        "total_customers": total_customers,
+        "total_stock": _total_stock(shared)
+    }
+
+
+# ======================================================
+# 2. Manager Stats (Manajer)
+# ======================================================
+def _manager_stats(shared):
+    today = date.today()
+
+    # Rentang tanggal (bukan EXTRACT) agar bisa memakai index tanggal_transaksi
+    awal_bulan = today.replace(day=1)
+    awal_bulan_depan = (awal_bulan + timedelta(days=32)).replace(day=1)
     total_penjualan_bulan_ini = db.session.query(
         func.coalesce(func.sum(BarangKeluar.total_penjualan), 0)
     ).filter(
-        extract('month', BarangKeluar.tanggal_transaksi) == now.month,
-        extract('year', BarangKeluar.tanggal_transaksi) == now.year
+        BarangKeluar.tanggal_transaksi >= awal_bulan,
+        BarangKeluar.tanggal_transaksi < awal_bulan_depan
     ).scalar()
 
     kualitas_rata = db.session.query(
@@ -50,42 +191,61 @@ def get_dashboard_data():
 
     pesanan_dibatalkan = BarangKeluar.query.filter_by(status_pesanan="Batal").count()
 
-    fifo_kritis = BatchStok.query.filter(
-        BatchStok.stok_saat_ini > 0
-    ).order_by(BatchStok.tanggal_masuk_batch.asc()).limit(5).all()
-
-    fifo_kritis_list = [
-        {
-            "buah": batch.jenis_buah.nama_buah,
-            "stok_saat_ini": float(batch.stok_saat_ini),
-            "tanggal_masuk": batch.tanggal_masuk_batch.strftime("%Y-%m-%d"),
-            "kualitas": batch.kualitas
-        }
-        for batch in fifo_kritis
-    ]
-
+    # Grafik 12 bulan terakhir dari rekap harian (maks. ~366 baris), dikelompokkan
+    # per (tahun, bulan) agar bulan yang sama di tahun berbeda tidak tergabung.
+    awal_grafik = awal_bulan.replace(year=awal_bulan.year - 1)
+    if awal_grafik.month == 12:
+        awal_grafik = awal_grafik.replace(year=awal_grafik.year + 1, month=1)
+    else:
+        awal_grafik = awal_grafik.replace(month=awal_grafik.month + 1)
+    tahun = extract('year', RekapPenjualanHarian.tanggal)
+    bulan = extract('month', RekapPenjualanHarian.tanggal)
     grafik_penjualan = db.session.query(
-        extract('month', BarangKeluar.tanggal_transaksi).label('bulan'),
-        func.sum(BarangKeluar.total_penjualan).label('total')
-    ).group_by('bulan').order_by('bulan').all()
+        tahun.label('tahun'),
+        bulan.label('bulan'),
+        func.sum(RekapPenjualanHarian.total_penjualan).label('total')
+    ).filter(
+        RekapPenjualanHarian.tanggal >= awal_grafik,
+        RekapPenjualanHarian.tanggal < awal_bulan_depan
+    ).group_by(tahun, bulan).order_by(tahun, bulan).all()
 
     grafik_penjualan_list = [
-        {"bulan": int(row.bulan), "total": float(row.total)}
+        {"tahun": int(row.tahun), "bulan": int(row.bulan), "total": float(row.total)}
         for row in grafik_penjualan
     ]
 
     data_laporan = {
-        "total_transaksi_masuk": BarangKeluar.query.count(),
+        "total_transaksi_masuk": BarangMasuk.query.count(),
         "total_transaksi_keluar": BarangKeluar.query.count(),
         "total_buah_jenis": Buah.query.count(),
     }
 
-    # ======================================================
-    # 3. Petugas Gudang Stats
-    # ======================================================
+    return {
+        "total_stock_now": _total_stock(shared),
+        "total_sales_this_month": float(total_penjualan_bulan_ini),
+        "average_quality": float(kualitas_rata or 0),
+        "canceled_orders": pesanan_dibatalkan,
+        "fifo_critical_batches": _fifo_kritis(shared),
+        "sales_chart": grafik_penjualan_list,
+        "report_summary": data_laporan
+    }
+
+
+# ======================================================
+# 3. Petugas Gudang Stats
+# ======================================================
+def _petugas_stats(shared):
+    today = date.today()
     STATUS_PERLU_DITAMPILKAN = ['Diproses', 'diproses']
 
-    pesanan_hari_ini_qs = BarangKeluar.query.filter(
+    # Nama pelanggan di-JOIN langsung (tanpa lazy load per pesanan)
+    pesanan_hari_ini_qs = db.session.query(
+        BarangKeluar.keluar_id,
+        BarangKeluar.status_pesanan,
+        Pelanggan.nama_pelanggan
+    ).outerjoin(
+        Pelanggan, BarangKeluar.pelanggan_id == Pelanggan.pelanggan_id
+    ).filter(
         BarangKeluar.tanggal_transaksi == today,
         BarangKeluar.status_pesanan.in_(STATUS_PERLU_DITAMPILKAN)
     ).all()
@@ -93,22 +253,26 @@ def get_dashboard_data():
     pesanan_hari_ini_list = [
         {
             "id": trx.keluar_id,
-            "pelanggan": trx.pembeli.nama_pelanggan if trx.pembeli else "N/A",
+            "pelanggan": trx.nama_pelanggan or "N/A",
             "waktu": "Hari Ini",
             "status": trx.status_pesanan
         }
         for trx in pesanan_hari_ini_qs
     ]
 
-    pesanan_menunggu_count = BarangKeluar.query.filter(
-        BarangKeluar.tanggal_transaksi == today,
-        BarangKeluar.status_pesanan.in_(STATUS_PERLU_DITAMPILKAN)
-    ).count()
+    return {
+        "total_stock": _total_stock(shared),
+        "pesanan_menunggu_proses": len(pesanan_hari_ini_list),
+        "fifo_kritis_count": len(_fifo_kritis(shared)),
+        "pesanan_hari_ini": pesanan_hari_ini_list
+    }
+
 
-    # ======================================================
-    # 4. System Health & Log Aktivitas
-    # ======================================================
-    system_health = {
+# ======================================================
+# 4. System Health & Log Aktivitas
+# ======================================================
+def _system_health(shared):
+    return {
         "server": {
             "name": "Status Server",
             "detail": "API Flask & Database",
@@ -123,7 +287,17 @@ def get_dashboard_data():
         }
     }
 
-    logs = LogAktivitas.query.order_by(LogAktivitas.timestamp.desc()).limit(5).all()
+
+def _recent_activities(shared):
+    logs = db.session.query(
+        LogAktivitas.jenis_aksi,
+        LogAktivitas.deskripsi,
+        LogAktivitas.timestamp,
+        User.nama_lengkap
+    ).outerjoin(
+        User, LogAktivitas.user_id == User.user_id
+    ).order_by(LogAktivitas.timestamp.desc()).limit(5).all()
+
     recent_activities = []
     for log in logs:
         action_type = "update"
@@ -133,37 +307,36 @@ def get_dashboard_data():
             action_type = "delete"
 
         recent_activities.append({
-            "user": log.user.nama_lengkap if log.user else "Unknown",
+            "user": log.nama_lengkap or "Unknown",
             "action": log.deskripsi,
             "time": log.timestamp.strftime("%Y-%m-%d %H:%M:%S"),
             "type": action_type
         })
+    return recent_activities
 
-    # ======================================================
-    # RETURN JSON
-    # ======================================================
-    return jsonify({
-        "kpi_data": {
-            "active_users": active_users_count,
-            "total_suppliers": total_suppliers,
-            "total_customers": total_customers,
-            "total_stock": float(total_stock)
-        },
-        "manager_stats": {
-            "total_stock_now": float(total_stock),
-            "total_sales_this_month": float(total_penjualan_bulan_ini),
-            "average_quality": float(kualitas_rata or 0),
-            "canceled_orders": pesanan_dibatalkan,
-            "fifo_critical_batches": fifo_kritis_list,
-            "sales_chart": grafik_penjualan_list,
-            "report_summary": data_laporan
-        },
-        "petugas_stats": {
-            "total_stock": float(total_stock),
-            "pesanan_menunggu_proses": pesanan_menunggu_count,
-            "fifo_kritis_count": len(fifo_kritis_list),
-            "pesanan_hari_ini": pesanan_hari_ini_list
-        },
-        "system_health": system_health,
-        "recent_activities": recent_activities
-    })
+
+# ======================================================
+# 5. Alert Kadaluarsa (hasil scan terakhir, lihat utils/kadaluarsa_helper.py)
+# ======================================================
+def _expiry_alerts(shared):
+    counts = dict(db.session.query(
+        AlertKadaluarsa.status, func.count(AlertKadaluarsa.batch_id)
+    ).group_by(AlertKadaluarsa.status).all())
+
+    rows = db.session.query(AlertKadaluarsa).order_by(
+        AlertKadaluarsa.tanggal_kadaluarsa.asc(), AlertKadaluarsa.batch_id.asc()
+    ).limit(10).all()
+
+    return {
+        "kadaluarsa": counts.get("Kadaluarsa", 0),
+        "hampir_kadaluarsa": counts.get("Hampir Kadaluarsa", 0),
+        "waktu_scan": rows[0].waktu_scan.strftime("%Y-%m-%d %H:%M:%S") if rows else None,
+        "items": [{
+            "batch_id": row.batch_id,
+            "buah": row.nama_buah,
+            "stok": float(row.stok),
+            "tanggal_kadaluarsa": row.tanggal_kadaluarsa.strftime("%Y-%m-%d"),
+            "status": row.status,
+            "dihapusbukukan": row.dihapusbukukan
+        } for row in rows]
+    }
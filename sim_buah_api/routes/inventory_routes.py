@@ -2,24 +2,27 @@ from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from datetime import date
 from decimal import Decimal
+from sqlalchemy import insert
+from sqlalchemy.orm import joinedload, selectinload
 
 from sim_buah_api.database import db
 from sim_buah_api.models import (
-    Buah, Supplier, Pelanggan, User, LogAktivitas,
+    Buah, Supplier, Pelanggan, LogAktivitas,
     BarangMasuk, BatchStok,
     BarangKeluar, DetailKeluar
 )
 from ..utils.log_helper import record_log  # FIX: import helper log
+from ..utils.auth_helper import get_user_role
+from ..utils.cache_helper import invalidate_dashboard_on_write
+from ..utils.stok_helper import ubah_stok_total
+from ..utils.tanggal_helper import hitung_kadaluarsa
+from ..utils.metrics_helper import inc_metric
+from ..utils.pagination import get_limit_arg, get_int_arg, get_date_arg
 
 inventory_bp = Blueprint("inventory", __name__, url_prefix="/api/inventory")
 
-
-# =========================
-# HELPER: Ambil role user
-# =========================
-def get_user_role(user_id):
-    user = User.query.get(user_id)
-    return user.role.nama_role if user else None
+# Setiap write yang sukses meng-invalidate snapshot dashboard
+inventory_bp.after_request(invalidate_dashboard_on_write)
 
 
 # =========================
@@ -31,7 +34,42 @@ def list_barang_masuk():
     user_id = get_jwt_identity()
     role = get_user_role(user_id)
 
-    masuk_list = BarangMasuk.query.order_by(BarangMasuk.masuk_id.desc()).all()
+    try:
+        limit = get_limit_arg()
+        cursor = get_int_arg("cursor")
+        start_date = get_date_arg("start_date")
+        end_date = get_date_arg("end_date")
+        supplier_id = get_int_arg("supplier_id")
+        buah_id = get_int_arg("buah_id")
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    # Supplier & petugas di-JOIN, batch + buah diambil sekaligus (selectin),
+    # sehingga satu halaman selalu 2 query berapapun jumlah batch-nya.
+    query = BarangMasuk.query.options(
+        joinedload(BarangMasuk.pemasok),
+        joinedload(BarangMasuk.petugas_masuk),
+        selectinload(BarangMasuk.batches).joinedload(BatchStok.jenis_buah)
+    )
+
+    # Keyset pagination: cursor = masuk_id terakhir dari halaman sebelumnya
+    if cursor:
+        query = query.filter(BarangMasuk.masuk_id < cursor)
+    if start_date:
+        query = query.filter(BarangMasuk.tanggal_transaksi >= start_date)
+    if end_date:
+        query = query.filter(BarangMasuk.tanggal_transaksi <= end_date)
+    if supplier_id:
+        query = query.filter(BarangMasuk.supplier_id == supplier_id)
+    if buah_id:
+        query = query.filter(BarangMasuk.batches.any(BatchStok.buah_id == buah_id))
+
+    # Ambil satu baris ekstra untuk mengetahui apakah masih ada halaman berikutnya
+    masuk_list = query.order_by(BarangMasuk.masuk_id.desc()).limit(limit + 1).all()
+    has_more = len(masuk_list) > limit
+    masuk_list = masuk_list[:limit]
+    next_cursor = masuk_list[-1].masuk_id if has_more else None
+
     result = []
 
     for trx in masuk_list:
@@ -51,7 +89,104 @@ def list_barang_masuk():
             ]
         })
 
-    return jsonify({"data": result, "role": role})
+    return jsonify({"data": result, "role": role, "next_cursor": next_cursor})
+
+
+# =========================
+# HELPER: Simpan penerimaan barang (bulk)
+# =========================
+def simpan_barang_masuk(receipts, user_id):
+    """
+    Simpan satu atau banyak penerimaan (BarangMasuk + BatchStok) dalam satu transaksi.
+
+    receipts: list dict {supplier_id, items: [{buah_id, stok_awal, kualitas}], total_biaya}
+    Semua supplier & buah di-resolve dengan satu query IN, semua batch di-insert
+    dengan satu multi-row INSERT, dan stok_total ditambah sekali per buah.
+    Raise ValueError untuk data yang tidak valid. Return list (trx, deskripsi_log).
+    """
+    parsed = []
+    for r_idx, data in enumerate(receipts, start=1):
+        supplier_id = data.get("supplier_id")
+        items = data.get("items", [])
+        if not supplier_id or not items:
+            raise ValueError(f"Data supplier atau item penerimaan ke-{r_idx} tidak lengkap")
+        try:
+            total_biaya = Decimal(str(data.get("total_biaya", 0)))
+            lines = [
+                (int(item["buah_id"]), Decimal(str(item["stok_awal"])), item.get("kualitas"))
+                for item in items
+            ]
+        except (KeyError, TypeError, ValueError, ArithmeticError):
+            raise ValueError(f"Data item penerimaan ke-{r_idx} tidak valid")
+        parsed.append((int(supplier_id), total_biaya, lines))
+
+    supplier_ids = {supplier_id for supplier_id, _, _ in parsed}
+    buah_ids = {buah_id for _, _, lines in parsed for buah_id, _, _ in lines}
+
+    supplier_map = dict(db.session.query(Supplier.supplier_id, Supplier.nama_supplier).filter(
+        Supplier.supplier_id.in_(supplier_ids)
+    ).all())
+    buah_rows = db.session.query(Buah.buah_id, Buah.nama_buah, Buah.umur_simpan_hari).filter(
+        Buah.buah_id.in_(buah_ids)
+    ).all()
+    buah_map = {row.buah_id: row.nama_buah for row in buah_rows}
+    umur_map = {row.buah_id: row.umur_simpan_hari for row in buah_rows}
+
+    for supplier_id, _, lines in parsed:
+        if supplier_id not in supplier_map:
+            raise ValueError(f"Supplier ID {supplier_id} tidak ditemukan")
+        for buah_id, stok_awal, _ in lines:
+            if buah_id not in buah_map:
+                raise ValueError(f"Buah ID {buah_id} tidak ditemukan")
+            if stok_awal <= 0:
+                raise ValueError(f"Stok awal untuk {buah_map[buah_id]} harus > 0")
+
+    today = date.today()
+    trx_list = [
+        BarangMasuk(
+            tanggal_transaksi=today,
+            supplier_id=supplier_id,
+            user_id=user_id,
+            total_biaya=total_biaya
+        ) for supplier_id, total_biaya, _ in parsed
+    ]
+    db.session.add_all(trx_list)
+    db.session.flush()  # Mendapatkan masuk_id untuk semua penerimaan
+
+    batch_rows = []
+    delta_buah = {}
+    hasil = []
+    for trx, (supplier_id, _, lines) in zip(trx_list, parsed):
+        buah_masuk_list = []
+        for buah_id, stok_awal, kualitas in lines:
+            batch_rows.append({
+                "masuk_id": trx.masuk_id,
+                "buah_id": buah_id,
+                "tanggal_masuk_batch": today,
+                "tanggal_kadaluarsa": hitung_kadaluarsa(today, umur_map[buah_id]),
+                "stok_awal": stok_awal,
+                "stok_saat_ini": stok_awal,
+                "kualitas": kualitas
+            })
+            delta_buah[buah_id] = delta_buah.get(buah_id, 0) + stok_awal
+            buah_masuk_list.append(f'{buah_map[buah_id]} ({stok_awal} kg)')
+
+        hasil.append((
+            trx,
+            f'Mencatat barang masuk ID {trx.masuk_id} dari Supplier {supplier_map[supplier_id]}. Item: {", ".join(buah_masuk_list)}'
+        ))
+
+    db.session.execute(insert(BatchStok), batch_rows)
+    ubah_stok_total(delta_buah)
+    return hasil
+
+
+def catat_metrik_masuk(receipts):
+    """Counter penerimaan & kg stok masuk (dipanggil setelah commit; data sudah tervalidasi)."""
+    inc_metric('sim_buah_stock_received_total', amount=len(receipts))
+    inc_metric('sim_buah_stock_received_kg_total', amount=float(sum(
+        Decimal(str(item["stok_awal"])) for data in receipts for item in data["items"]
+    )))
 
 
 # =========================
@@ -68,58 +203,58 @@ def create_barang_masuk():
         return jsonify({"error": "Akses ditolak"}), 403
 
     data = request.json
-    supplier_id = data.get("supplier_id")
-    items = data.get("items", [])
-    total_biaya = Decimal(str(data.get("total_biaya", 0)))
-
-    if not supplier_id or not items:
-        return jsonify({"error": "Data supplier atau item tidak lengkap"}), 400
 
     try:
-        # Buat transaksi BarangMasuk
-        trx = BarangMasuk(
-            tanggal_transaksi=date.today(),
-            supplier_id=supplier_id,
-            user_id=user_id,
-            total_biaya=total_biaya
-        )
-        db.session.add(trx)
-        db.session.flush()  # Mendapatkan trx.masuk_id
+        hasil = simpan_barang_masuk([data], user_id)
 
-        buah_masuk_list = []
+        # Catat log aktivitas (ikut commit transaksi utama)
+        trx, deskripsi = hasil[0]
+        record_log(action_type='TRX_MASUK_CREATE', description=deskripsi)
+
+        masuk_id = trx.masuk_id  # dibaca sebelum commit (menghindari reload setelah expire)
+        db.session.commit()  # Commit transaksi utama
+        catat_metrik_masuk([data])
 
-        # Buat batch stok untuk tiap item
-        for item in items:
-            buah = Buah.query.get(item["buah_id"])
-            stok_awal = Decimal(str(item["stok_awal"]))
+        return jsonify({"msg": "Barang masuk berhasil dibuat", "id": masuk_id}), 201
 
-            if stok_awal <= 0:
-                db.session.rollback()
-                return jsonify({"error": f"Stok awal untuk {buah.nama_buah} harus > 0"}), 400
-
-            batch = BatchStok(
-                masuk_id=trx.masuk_id,
-                buah_id=buah.buah_id,
-                tanggal_masuk_batch=date.today(),
-                stok_awal=stok_awal,
-                stok_saat_ini=stok_awal,
-                kualitas=item.get("kualitas")
-            )
-            db.session.add(batch)
-
-            # Update stok total master buah
-            buah.stok_total += stok_awal
-            buah_masuk_list.append(f'{buah.nama_buah} ({stok_awal} kg)')
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({"error": str(e)}), 400
 
-        db.session.commit()  # Commit transaksi utama
 
-        # Catat log aktivitas
-        record_log(
-            action_type='TRX_MASUK_CREATE',
-            description=f'Mencatat barang masuk ID {trx.masuk_id} dari Supplier {trx.pemasok.nama_supplier}. Item: {", ".join(buah_masuk_list)}'
-        )
+# =========================
+# BARANG MASUK BULK (POST)
+# Banyak penerimaan (beberapa supplier) dalam satu request & satu transaksi
+# =========================
+@inventory_bp.route("/masuk/bulk", methods=["POST"])
+@jwt_required()
+def create_barang_masuk_bulk():
+    user_id = get_jwt_identity()
+    role = get_user_role(user_id)
+
+    # Hanya Admin & Petugas Gudang
+    if role not in ["Admin", "Petugas Gudang"]:
+        return jsonify({"error": "Akses ditolak"}), 403
+
+    receipts = (request.json or {}).get("receipts", [])
+    if not receipts:
+        return jsonify({"error": "Daftar penerimaan (receipts) tidak boleh kosong"}), 400
+
+    try:
+        hasil = simpan_barang_masuk(receipts, user_id)
+
+        # Satu log per penerimaan, ditulis dengan satu INSERT saat commit
+        for trx, deskripsi in hasil:
+            record_log(action_type='TRX_MASUK_CREATE', description=deskripsi)
+
+        ids = [trx.masuk_id for trx, _ in hasil]  # dibaca sebelum commit
+        db.session.commit()  # Semua penerimaan sukses atau tidak sama sekali
+        catat_metrik_masuk(receipts)
 
-        return jsonify({"msg": "Barang masuk berhasil dibuat", "id": trx.masuk_id}), 201
+        return jsonify({
+            "msg": f"{len(hasil)} penerimaan barang masuk berhasil dibuat",
+            "ids": ids
+        }), 201
 
     except Exception as e:
         db.session.rollback()
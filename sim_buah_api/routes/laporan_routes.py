@@ -1,66 +1,52 @@
-from flask import Blueprint, request, jsonify, send_file
-from flask_jwt_extended import jwt_required
+from flask import Blueprint, request, jsonify, send_file, Response, stream_with_context
+from flask_jwt_extended import jwt_required, get_jwt_identity
 from sim_buah_api.database import db
-from sim_buah_api.models import BarangKeluar, BarangMasuk, DetailKeluar, BatchStok, Supplier
+from sim_buah_api.models import RekapPenjualanHarian
+from sim_buah_api.utils.export_helper import (
+    KOLOM_LAPORAN, TIPE_KOLOM, FORMAT_EXPORT, nama_file_laporan, transaksi_query,
+    iter_laporan_rows, iter_csv, write_xlsx
+)
+from sim_buah_api.utils.pdf_helper import cached_laporan_pdf
+from sim_buah_api.utils.export_jobs import (
+    STATUS_DONE, get_job, submit_export_job, job_to_dict
+)
+from sim_buah_api.utils.pagination import get_bool_arg, get_page_arg, get_limit_arg
 from datetime import datetime
-import pandas as pd
-import io
-
-# Untuk ReportLab PDF
-from reportlab.lib.pagesizes import A4
-from reportlab.lib import colors
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
-from reportlab.lib.styles import getSampleStyleSheet
 
 laporan_bp = Blueprint('laporan', __name__, url_prefix='/api/laporan')
 
 # ========================== HELPERS ==========================
 
-def get_transaksi_data(start_date, end_date):
-    keluar_qs = BarangKeluar.query.filter(
-        BarangKeluar.tanggal_transaksi.between(start_date, end_date)
-    ).all()
-    transaksi_keluar = [{
-        "id": row.keluar_id,
-        "tanggal": row.tanggal_transaksi.strftime("%Y-%m-%d"),
-        "tipe": "Keluar",
-        "pihak": row.pembeli.nama_pelanggan if row.pembeli else "N/A",
-        "total": float(row.total_penjualan) if row.total_penjualan is not None else 0.00,
-        "status": row.status_pesanan
-    } for row in keluar_qs]
-
-    masuk_qs = BarangMasuk.query.filter(
-        BarangMasuk.tanggal_transaksi.between(start_date, end_date)
-    ).all()
-    transaksi_masuk = [{
-        "id": row.masuk_id,
-        "tanggal": row.tanggal_transaksi.strftime("%Y-%m-%d"),
-        "pihak": row.pemasok.nama_supplier if row.pemasok else "N/A",
-        "tipe": "Masuk",
-        "total": float(row.total_biaya) if row.total_biaya is not None else 0.00,
-        "status": "Selesai"
-    } for row in masuk_qs]
-    
-    all_transactions = sorted(transaksi_keluar + transaksi_masuk, key=lambda x: x['tanggal'], reverse=True)
-    return all_transactions
+def get_transaksi_data(start_date, end_date, limit=None, offset=0):
+    # Satu query UNION ALL (keluar + masuk, sudah JOIN nama pihak & terurut di DB)
+    query = transaksi_query(start_date, end_date)
+    if limit is not None:
+        query = query.limit(limit).offset(offset)
+
+    return [{
+        "id": row.id,
+        "tanggal": row.tanggal.strftime("%Y-%m-%d"),
+        "tipe": row.tipe,
+        "pihak": row.pihak,
+        "total": float(row.total) if row.total is not None else 0.00,
+        "status": row.status
+    } for row in db.session.execute(query)]
 
 def get_penjualan_data(start_date, end_date):
-    raw_data = db.session.query(
-        BarangKeluar.tanggal_transaksi,
-        db.func.sum(BarangKeluar.total_penjualan).label('total_penjualan'),
-        db.func.count(BarangKeluar.keluar_id).label('jumlah_transaksi')
-    ).filter(
-        BarangKeluar.tanggal_transaksi.between(start_date, end_date)
-    ).group_by(
-        BarangKeluar.tanggal_transaksi
+    # Dibaca dari tabel rekap harian (di-update bersama setiap pesanan),
+    # bukan GROUP BY ulang trx_barang_keluar.
+    raw_data = RekapPenjualanHarian.query.filter(
+        RekapPenjualanHarian.tanggal.between(start_date, end_date),
+        RekapPenjualanHarian.jumlah_transaksi > 0
     ).order_by(
-        BarangKeluar.tanggal_transaksi.desc()
+        RekapPenjualanHarian.tanggal.desc()
     ).all()
 
     data = [{
-        "tanggal": row.tanggal_transaksi.strftime("%Y-%m-%d"),
+        "tanggal": row.tanggal.strftime("%Y-%m-%d"),
         "total_penjualan": float(row.total_penjualan) if row.total_penjualan is not None else 0.00,
-        "jumlah_transaksi": row.jumlah_transaksi
+        "jumlah_transaksi": row.jumlah_transaksi,
+        "jumlah_batal": row.jumlah_batal
     } for row in raw_data]
     return data
 
@@ -79,9 +65,26 @@ def laporan_transaksi_json():
         start_date = datetime.strptime(start_date_str, '%Y-%m-%d').date()
         end_date = datetime.strptime(end_date_str, '%Y-%m-%d').date()
         
-        data = get_transaksi_data(start_date, end_date)
-        
-        return jsonify({"status": "success", "data": data}), 200
+        # Paginasi opsional (?page=&limit=); tanpa keduanya seluruh rentang dikembalikan
+        if 'page' not in request.args and 'limit' not in request.args:
+            data = get_transaksi_data(start_date, end_date)
+            return jsonify({"status": "success", "data": data}), 200
+
+        try:
+            page = get_page_arg()
+            limit = get_limit_arg(default=100, maximum=500)
+        except ValueError as e:
+            return jsonify({"status": "error", "message": str(e)}), 400
+
+        # Ambil limit+1 baris untuk mengetahui apakah masih ada halaman berikutnya
+        data = get_transaksi_data(start_date, end_date, limit=limit + 1, offset=(page - 1) * limit)
+        has_more = len(data) > limit
+
+        return jsonify({
+            "status": "success",
+            "data": data[:limit],
+            "pagination": {"page": page, "limit": limit, "has_more": has_more}
+        }), 200
 
     except Exception as e:
         return jsonify({"status": "error", "message": f"Error fetching data: {str(e)}"}), 500
@@ -125,75 +128,71 @@ def export_laporan(report_type):
     except:
         return jsonify({"error": "Format tanggal tidak valid (YYYY-MM-DD)"}), 400
 
-    try: 
-        # 1. Ambil data
-        if report_type == 'transaksi':
-            data = get_transaksi_data(start_date, end_date)
-            df = pd.DataFrame(data)
-            file_name = f"Laporan_Transaksi_{start_date}_to_{end_date}"
-        elif report_type == 'penjualan':
-            data = get_penjualan_data(start_date, end_date)
-            df = pd.DataFrame(data)
-            file_name = f"Laporan_Penjualan_{start_date}_to_{end_date}"
-        else:
-            return jsonify({"error": "Tipe laporan tidak dikenal"}), 400
-
-        # Inisialisasi response
-        response = None 
+    if report_type not in KOLOM_LAPORAN:
+        return jsonify({"error": "Tipe laporan tidak dikenal"}), 400
+    if report_format not in FORMAT_EXPORT:
+        return jsonify({"error": "Format export tidak didukung"}), 400
+
+    # Mode async: render di pool background, client polling /export-jobs/<job_id>
+    if get_bool_arg('async'):
+        try:
+            job, created = submit_export_job(
+                report_type, report_format, start_date, end_date, user_id=get_jwt_identity()
+            )
+        except Exception as e:
+            print(f"EXPORT JOB GAGAL DIBUAT: {e}")
+            return jsonify({"status": "error", "message": f"Gagal membuat job export: {str(e)}"}), 500
+        return jsonify(dict(job_to_dict(job), deduplicated=not created)), 202
+
+    file_name = nama_file_laporan(report_type, start_date, end_date)
+    ekstensi, mimetype = FORMAT_EXPORT[report_format]
+    rows = iter_laporan_rows(report_type, start_date, end_date)
+
+    # CSV di-stream langsung dari cursor database (tanpa DataFrame / buffer penuh)
+    if report_format == 'csv':
+        return Response(
+            stream_with_context(iter_csv(KOLOM_LAPORAN[report_type], rows)),
+            mimetype=mimetype,
+            headers={"Content-Disposition": f'attachment; filename="{file_name}.{ekstensi}"'}
+        )
 
-        # 2. LOGIKA EXPORT
+    try:
         if report_format == 'excel':
-            output = io.BytesIO()
-            with pd.ExcelWriter(output, engine='xlsxwriter') as writer:
-                df.to_excel(writer, index=False, sheet_name='Laporan')
-            output.seek(0)
-            response = send_file(output, as_attachment=True, download_name=f"{file_name}.xlsx",
-                                 mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
-
-        elif report_format == 'csv':
-            output = io.StringIO()
-            df.to_csv(output, index=False, encoding='utf-8-sig') 
-            csv_bytes = output.getvalue().encode('utf-8-sig')
-            response = send_file(io.BytesIO(csv_bytes), as_attachment=True, download_name=f"{file_name}.csv",
-                                 mimetype='text/csv')
-
-        elif report_format == 'pdf':
-            pdf_buffer = io.BytesIO()
-            doc = SimpleDocTemplate(pdf_buffer, pagesize=A4)
-            elements = []
-            styles = getSampleStyleSheet()
-
-            elements.append(Paragraph(file_name, styles['Title']))
-            elements.append(Spacer(1, 12)) 
-            header_row = df.columns.tolist()
-            data_rows = df.values.tolist()
-            data_table = [header_row] + data_rows
-            col_widths = [doc.width/len(header_row)] * len(header_row)
-
-            table = Table(data_table, colWidths=col_widths, repeatRows=1)
-            table.setStyle(TableStyle([
-                ('BACKGROUND', (0,0), (-1,0), colors.HexColor('#047857')), 
-                ('TEXTCOLOR', (0,0), (-1,0), colors.white),
-                ('ALIGN', (0,0), (-1,-1), 'LEFT'),
-                ('VALIGN', (0,0), (-1,-1), 'MIDDLE'),
-                ('FONTNAME', (0,0), (-1,0), 'Helvetica-Bold'),
-                ('INNERGRID', (0,0), (-1,-1), 0.25, colors.black),
-                ('BOX', (0,0), (-1,-1), 0.25, colors.black),
-            ]))
-            elements.append(table)
-            doc.build(elements)
-            pdf_buffer.seek(0)
-
-            response = send_file(pdf_buffer, as_attachment=True, download_name=f"{file_name}.pdf",
-                                 mimetype='application/pdf')
-                                 
+            # XLSX ditulis baris demi baris (constant_memory) ke file sementara, tanpa pandas
+            output = write_xlsx(KOLOM_LAPORAN[report_type], TIPE_KOLOM[report_type], rows)
         else:
-            return jsonify({"error": "Format export tidak didukung"}), 400
+            # PDF dari cache disk (key: tipe, rentang, versi data); dirender jika belum ada
+            output, _ = cached_laporan_pdf(report_type, start_date, end_date, rows=rows)
 
         # HANYA RETURN RESPONSE, header akan ditambahkan oleh app.py hook
-        return response 
+        return send_file(output, as_attachment=True, download_name=f"{file_name}.{ekstensi}", mimetype=mimetype)
 
     except Exception as e:
         # HANYA RETURN ERROR, header akan ditambahkan oleh app.py hook
         print(f"EXPORT CRASHED: {e}") 
-        return jsonify({"status": "error", "message": f"Server crash saat export: {str(e)}"}), 500
\ No newline at end of file
+        return jsonify({"status": "error", "message": f"Server crash saat export: {str(e)}"}), 500
+
+
+# ========================== JOB EXPORT (ASYNC) ==========================
+
+@laporan_bp.route("/export-jobs/<string:job_id>", methods=["GET"])
+@jwt_required()
+def status_export_job(job_id):
+    job = get_job(job_id)
+    if not job:
+        return jsonify({"error": "Job export tidak ditemukan atau sudah kadaluarsa"}), 404
+    return jsonify(job_to_dict(job)), 200
+
+
+@laporan_bp.route("/export-jobs/<string:job_id>/download", methods=["GET"])
+@jwt_required()
+def download_export_job(job_id):
+    job = get_job(job_id)
+    if not job:
+        return jsonify({"error": "Job export tidak ditemukan atau sudah kadaluarsa"}), 404
+    if job['status'] != STATUS_DONE:
+        return jsonify(dict(job_to_dict(job), error="File export belum siap")), 409
+
+    data = job_to_dict(job)
+    return send_file(job['file_path'], as_attachment=True, download_name=data['file_name'],
+                     mimetype=FORMAT_EXPORT[job['report_format']][1])
@@ -4,9 +4,14 @@ from decimal import Decimal
 from flask_jwt_extended import jwt_required
 # FIX KRITIS: Import record_log dari file helper
 from ..utils.log_helper import record_log 
+from ..utils.cache_helper import invalidate_master_on_write
+from ..utils.versi_helper import jsonify_list_versi
 
 master_bp = Blueprint('master', __name__, url_prefix='/api/master')
 
+# Setiap write yang sukses meng-invalidate snapshot dashboard & cache PDF laporan
+master_bp.after_request(invalidate_master_on_write)
+
 
 # =========================
 # CRUD Buah (Log Diterapkan)
@@ -14,16 +19,15 @@ master_bp = Blueprint('master', __name__, url_prefix='/api/master')
 @master_bp.route('/buah', methods=['GET'])
 @jwt_required()
 def get_buah():
-    # ... (READ logic tetap sama)
-    buah_list = Buah.query.all()
-    return jsonify([{
+    # ETag dari versi tabel: If-None-Match cocok -> 304 tanpa membaca master_buah
+    return jsonify_list_versi('buah', lambda: [{
         "buah_id": b.buah_id,
         "nama_buah": b.nama_buah,
         "satuan": b.satuan,
         "harga_satuan": float(b.harga_satuan),
         "umur_simpan_hari": b.umur_simpan_hari,
         "stok_total": float(b.stok_total)
-    } for b in buah_list])
+    } for b in Buah.query.all()])
 
 
 @master_bp.route('/buah', methods=['POST'])
@@ -39,13 +43,13 @@ def add_buah():
             stok_total=Decimal(data.get('stok_total', '0.00'))
         )
         db.session.add(new_buah)
-        db.session.commit()
-        
+
         # FIX 1: Catat Log (CREATE)
         record_log(
             action_type='BUAH_CREATE',
             description=f"Menambahkan jenis buah baru: {data['nama_buah']}"
         )
+        db.session.commit()
         
         return jsonify({"msg": "Buah berhasil ditambahkan", "id": new_buah.buah_id}), 201
     except Exception as e:
@@ -67,13 +71,13 @@ def update_buah(buah_id):
         buah.harga_satuan = Decimal(data.get('harga_satuan', buah.harga_satuan))
         buah.umur_simpan_hari = int(data.get('umur_simpan_hari', buah.umur_simpan_hari))
         buah.stok_total = Decimal(data.get('stok_total', buah.stok_total))
-        db.session.commit()
-        
+
         # FIX 2: Catat Log (UPDATE)
         record_log(
             action_type='BUAH_UPDATE',
             description=f"Memperbarui data buah: {buah.nama_buah} (ID {buah_id})"
         )
+        db.session.commit()
         
         return jsonify({"msg": "Buah berhasil diperbarui"})
     except Exception as e:
@@ -88,13 +92,13 @@ def delete_buah(buah_id):
     try:
         nama_buah = buah.nama_buah # Ambil nama sebelum delete
         db.session.delete(buah)
-        db.session.commit()
-        
+
         # FIX 3: Catat Log (DELETE)
         record_log(
             action_type='BUAH_DELETE',
             description=f"Menghapus jenis buah: {nama_buah} (ID {buah_id})"
         )
+        db.session.commit()
         
         return jsonify({"msg": "Buah berhasil dihapus"})
     except Exception as e:
@@ -108,14 +112,12 @@ def delete_buah(buah_id):
 @master_bp.route('/supplier', methods=['GET'])
 @jwt_required()
 def get_supplier():
-    # ... (READ logic tetap sama)
-    suppliers = Supplier.query.all()
-    return jsonify([{
+    return jsonify_list_versi('supplier', lambda: [{
         "supplier_id": s.supplier_id,
         "nama_supplier": s.nama_supplier,
         "alamat": s.alamat,
         "kontak": s.kontak
-    } for s in suppliers])
+    } for s in Supplier.query.all()])
 
 
 @master_bp.route('/supplier', methods=['POST'])
@@ -129,13 +131,13 @@ def add_supplier():
             kontak=data.get('kontak', '')
         )
         db.session.add(new_supplier)
-        db.session.commit()
-        
+
         # FIX 4: Catat Log (CREATE)
         record_log(
             action_type='SUPPLIER_CREATE',
             description=f"Menambahkan supplier baru: {data['nama_supplier']}"
         )
+        db.session.commit()
         
         return jsonify({"msg": "Supplier berhasil ditambahkan", "id": new_supplier.supplier_id}), 201
     except Exception as e:
@@ -152,13 +154,13 @@ def update_supplier(supplier_id):
         supplier.nama_supplier = data.get('nama_supplier', supplier.nama_supplier)
         supplier.alamat = data.get('alamat', supplier.alamat)
         supplier.kontak = data.get('kontak', supplier.kontak)
-        db.session.commit()
-        
+
         # FIX 5: Catat Log (UPDATE)
         record_log(
             action_type='SUPPLIER_UPDATE',
             description=f"Memperbarui data supplier: {supplier.nama_supplier} (ID {supplier_id})"
         )
+        db.session.commit()
         
         return jsonify({"msg": "Supplier berhasil diperbarui"})
     except Exception as e:
@@ -173,13 +175,13 @@ def delete_supplier(supplier_id):
     try:
         nama_supplier = supplier.nama_supplier
         db.session.delete(supplier)
-        db.session.commit()
-        
+
         # FIX 6: Catat Log (DELETE)
         record_log(
             action_type='SUPPLIER_DELETE',
             description=f"Menghapus supplier: {nama_supplier} (ID {supplier_id})"
         )
+        db.session.commit()
         
         return jsonify({"msg": "Supplier berhasil dihapus"})
     except Exception as e:
@@ -193,14 +195,12 @@ def delete_supplier(supplier_id):
 @master_bp.route('/pelanggan', methods=['GET'])
 @jwt_required()
 def get_pelanggan():
-    # ... (READ logic tetap sama)
-    customers = Pelanggan.query.all()
-    return jsonify([{
+    return jsonify_list_versi('pelanggan', lambda: [{
         "pelanggan_id": c.pelanggan_id,
         "nama_pelanggan": c.nama_pelanggan,
         "alamat": c.alamat,
         "telepon": c.telepon
-    } for c in customers])
+    } for c in Pelanggan.query.all()])
 
 
 @master_bp.route('/pelanggan', methods=['POST'])
@@ -214,13 +214,13 @@ def add_pelanggan():
             telepon=data.get('telepon', '')
         )
         db.session.add(new_cust)
-        db.session.commit()
-        
+
         # FIX 7: Catat Log (CREATE)
         record_log(
             action_type='PELANGGAN_CREATE',
             description=f"Menambahkan pelanggan baru: {data['nama_pelanggan']}"
         )
+        db.session.commit()
         
         return jsonify({"msg": "Pelanggan berhasil ditambahkan", "id": new_cust.pelanggan_id}), 201
     except Exception as e:
@@ -237,13 +237,13 @@ def update_pelanggan(pelanggan_id):
         cust.nama_pelanggan = data.get('nama_pelanggan', cust.nama_pelanggan)
         cust.alamat = data.get('alamat', cust.alamat)
         cust.telepon = data.get('telepon', cust.telepon)
-        db.session.commit()
-        
+
         # FIX 8: Catat Log (UPDATE)
         record_log(
             action_type='PELANGGAN_UPDATE',
             description=f"Memperbarui data pelanggan: {cust.nama_pelanggan} (ID {pelanggan_id})"
         )
+        db.session.commit()
         
         return jsonify({"msg": "Pelanggan berhasil diperbarui"})
     except Exception as e:
@@ -258,13 +258,13 @@ def delete_pelanggan(pelanggan_id):
     try:
         nama_pelanggan = cust.nama_pelanggan
         db.session.delete(cust)
-        db.session.commit()
-        
+
         # FIX 9: Catat Log (DELETE)
         record_log(
             action_type='PELANGGAN_DELETE',
             description=f"Menghapus pelanggan: {nama_pelanggan} (ID {pelanggan_id})"
         )
+        db.session.commit()
         
         return jsonify({"msg": "Pelanggan berhasil dihapus"})
     except Exception as e:
@@ -1,45 +1,111 @@
-from flask import Blueprint, jsonify
+from flask import Blueprint, jsonify, request, current_app
 from flask_jwt_extended import jwt_required
 from datetime import date
+from sqlalchemy import case
+from sim_buah_api.database import db
 from sim_buah_api.models import BatchStok, Buah
+from ..utils.pagination import get_page_arg, get_limit_arg
+from ..utils.tanggal_helper import selisih_hari
+from ..utils.perf_helper import perf_snapshot
+from ..utils.auth_helper import admin_required
 
 monitor_bp = Blueprint('monitor', __name__, url_prefix='/api/monitor')
 
+STATUS_KESEGARAN = ("Kritis", "Sedang", "Aman")
+
+
+def kesegaran_columns(today):
+    """
+    Kolom SQL (days_left, status) untuk klasifikasi kesegaran batch:
+    sisa umur <= 20% -> Kritis, <= 50% -> Sedang, selain itu Aman.
+    Perbandingan ditulis tanpa pembagian (days_left * 5 <= umur) agar tetap integer.
+    """
+    days_left = selisih_hari(BatchStok.tanggal_kadaluarsa, today)
+    status = case(
+        (days_left * 5 <= Buah.umur_simpan_hari, "Kritis"),
+        (days_left * 2 <= Buah.umur_simpan_hari, "Sedang"),
+        else_="Aman"
+    )
+    return days_left, status
+
+
 @monitor_bp.route("/batch_stock", methods=["GET"])
 @jwt_required()
 def get_batch_stock():
+    """
+    Batch yang masih ada stok beserta status kesegarannya. Filter stok > 0,
+    klasifikasi status dan filter ?status= dihitung di SQL (index
+    tanggal_kadaluarsa + stok_saat_ini), jadi biayanya mengikuti jumlah batch
+    aktif, bukan seluruh histori. Paginasi opsional lewat ?page=&limit=.
+    """
+    status_filter = request.args.get("status")
+    if status_filter and status_filter not in STATUS_KESEGARAN:
+        return jsonify({"status": "error", "message": f"Status harus salah satu dari: {', '.join(STATUS_KESEGARAN)}"}), 400
+
+    paginate = 'page' in request.args or 'limit' in request.args
+    try:
+        page = get_page_arg()
+        limit = get_limit_arg(default=100, maximum=500)
+    except ValueError as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+
     try:
         today = date.today()
-        batches = BatchStok.query.join(Buah, BatchStok.buah_id == Buah.buah_id).all()
-
-        result = []
-        for b in batches:
-            if b.stok_saat_ini <= 0:
-                continue
-
-            umur_batch = (today - b.tanggal_masuk_batch).days
-            umur_max = b.jenis_buah.umur_simpan_hari
-            days_left = umur_max - umur_batch
-            persentase_sisa = days_left / umur_max if umur_max else 0
-
-            if persentase_sisa <= 0.2:
-                status = "Kritis"
-            elif persentase_sisa <= 0.5:
-                status = "Sedang"
-            else:
-                status = "Aman"
-
-            result.append({
-                "batch_id": b.batch_id,
-                "buah": b.jenis_buah.nama_buah,
-                "stok_saat_ini": float(b.stok_saat_ini),
-                "tanggal_masuk": b.tanggal_masuk_batch.strftime("%Y-%m-%d"),
-                "umur_simpan_hari": umur_max,
-                "days_left": days_left,
-                "status_fifo": status
-            })
-
-        return jsonify({"status": "success", "data": result}), 200
+        days_left, status = kesegaran_columns(today)
+
+        query = db.session.query(
+            BatchStok.batch_id,
+            Buah.nama_buah,
+            BatchStok.stok_saat_ini,
+            BatchStok.tanggal_masuk_batch,
+            BatchStok.tanggal_kadaluarsa,
+            Buah.umur_simpan_hari,
+            days_left.label("days_left"),
+            status.label("status_fifo")
+        ).join(
+            Buah, BatchStok.buah_id == Buah.buah_id
+        ).filter(
+            BatchStok.stok_saat_ini > 0
+        )
+        if status_filter:
+            query = query.filter(status == status_filter)
+
+        # Paling dekat kadaluarsa dulu (urutan index)
+        query = query.order_by(BatchStok.tanggal_kadaluarsa.asc(), BatchStok.batch_id.asc())
+        if paginate:
+            query = query.limit(limit + 1).offset((page - 1) * limit)
+
+        rows = query.all()
+        has_more = paginate and len(rows) > limit
+        if paginate:
+            rows = rows[:limit]
+
+        result = [{
+            "batch_id": row.batch_id,
+            "buah": row.nama_buah,
+            "stok_saat_ini": float(row.stok_saat_ini),
+            "tanggal_masuk": row.tanggal_masuk_batch.strftime("%Y-%m-%d"),
+            "tanggal_kadaluarsa": row.tanggal_kadaluarsa.strftime("%Y-%m-%d") if row.tanggal_kadaluarsa else None,
+            "umur_simpan_hari": row.umur_simpan_hari,
+            "days_left": row.days_left,
+            "status_fifo": row.status_fifo
+        } for row in rows]
+
+        response = {"status": "success", "data": result}
+        if paginate:
+            response["pagination"] = {"page": page, "limit": limit, "has_more": has_more}
+        return jsonify(response), 200
 
     except Exception as e:
         return jsonify({"status": "error", "message": str(e)}), 500
+
+
+@monitor_bp.route("/perf", methods=["GET"])
+@jwt_required()
+@admin_required()
+def get_perf_stats():
+    """
+    Persentil waktu request & SQL per endpoint dari jendela sampel terakhir.
+    Angka milik worker yang melayani request ini (lihat "pid").
+    """
+    return jsonify({"status": "success", "data": perf_snapshot(current_app)}), 200
@@ -5,41 +5,145 @@ from flask_jwt_extended import jwt_required, get_jwt_identity
 from datetime import date
 from decimal import Decimal
 
+from sqlalchemy import func, insert, update
+
 from sim_buah_api.database import db
 from sim_buah_api.models import BarangKeluar, DetailKeluar, BatchStok, User, Pelanggan
 # FIX KRITIS: Import record_log dari helper file
 from ..utils.log_helper import record_log 
+from ..utils.auth_helper import get_user_role
+from ..utils.cache_helper import invalidate_dashboard_on_write
+from ..utils.fifo_helper import kunci_batch, allocate_fifo, StokTidakCukup
+from ..utils.stok_helper import (
+    kurangi_stok_batch, tambah_stok_batch, ubah_stok_total, KonflikStok, is_lock_conflict
+)
+from ..utils.rekap_helper import rekap_pesanan_baru, rekap_ubah_status, rekap_hapus_pesanan
+from ..utils.metrics_helper import inc_metric
+from ..utils.pagination import get_limit_arg, get_page_arg, get_int_arg, get_date_arg, get_bool_arg
 
 transaksi_bp = Blueprint('transaksi', __name__, url_prefix='/api/transaksi')
 
+# Setiap write yang sukses meng-invalidate snapshot dashboard
+transaksi_bp.after_request(invalidate_dashboard_on_write)
+
 
 # =========================
-# Helper: Ambil role user
+# Helper: Kembalikan stok detail pesanan (batal / hapus)
 # =========================
-def get_user_role(user_id):
-    user = User.query.get(user_id)
-    return user.role.nama_role if user else "unknown"
+def kembalikan_stok(trx):
+    penambahan_batch = {}
+    delta_buah = {}
+    rows = db.session.query(
+        DetailKeluar.batch_id, BatchStok.buah_id, DetailKeluar.jumlah_keluar
+    ).join(
+        BatchStok, DetailKeluar.batch_id == BatchStok.batch_id
+    ).filter(DetailKeluar.keluar_id == trx.keluar_id).all()
+
+    for batch_id, buah_id, qty in rows:
+        penambahan_batch[batch_id] = penambahan_batch.get(batch_id, 0) + qty
+        delta_buah[buah_id] = delta_buah.get(buah_id, 0) + qty
+
+    tambah_stok_batch(penambahan_batch)
+    ubah_stok_total(delta_buah)
 
 
 # =========================
-# GET – Semua Transaksi Keluar
+# Helper: Transisi status bersyarat (guard batal / hapus)
+# =========================
+STATUS_DIHAPUS = "Dihapus"  # penanda sementara, baris dihapus di transaksi yang sama
+PESAN_KONFLIK_STATUS = "Status pesanan sudah diubah oleh request lain, muat ulang lalu coba lagi"
+
+
+def ganti_status(keluar_id, status_lama, status_baru):
+    """
+    UPDATE status bersyarat (WHERE status_pesanan = status_lama). True hanya
+    untuk satu request pemenang; request lain yang membaca status yang sama
+    mendapat rowcount 0 dan tidak boleh menyentuh stok / rekap.
+    """
+    result = db.session.execute(
+        update(BarangKeluar)
+        .where(BarangKeluar.keluar_id == keluar_id, BarangKeluar.status_pesanan == status_lama)
+        .values(status_pesanan=status_baru)
+        .execution_options(synchronize_session=False)
+    )
+    return result.rowcount == 1
+
+
+# =========================
+# GET – Transaksi Keluar (Paginated & Filterable)
 # =========================
 @transaksi_bp.route("/keluar", methods=["GET"])
+@jwt_required()
 def get_barang_keluar():
-    # ... (Logika READ tetap sama)
     try:
-        data = BarangKeluar.query.all()
+        limit = get_limit_arg()
+        page = get_page_arg()
+        start_date = get_date_arg("start_date")
+        end_date = get_date_arg("end_date")
+        pelanggan_id = get_int_arg("pelanggan_id")
+    except ValueError as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+
+    status = request.args.get("status")
+    with_total = get_bool_arg("with_total")
+
+    filters = []
+    if status:
+        filters.append(BarangKeluar.status_pesanan == status)
+    if start_date:
+        filters.append(BarangKeluar.tanggal_transaksi >= start_date)
+    if end_date:
+        filters.append(BarangKeluar.tanggal_transaksi <= end_date)
+    if pelanggan_id:
+        filters.append(BarangKeluar.pelanggan_id == pelanggan_id)
+
+    try:
+        # Nama pelanggan & petugas di-resolve dalam query yang sama (tanpa lazy load per baris)
+        rows = db.session.query(
+            BarangKeluar.keluar_id,
+            BarangKeluar.tanggal_transaksi,
+            BarangKeluar.status_pesanan,
+            BarangKeluar.total_penjualan,
+            Pelanggan.nama_pelanggan,
+            User.nama_lengkap
+        ).outerjoin(
+            Pelanggan, BarangKeluar.pelanggan_id == Pelanggan.pelanggan_id
+        ).outerjoin(
+            User, BarangKeluar.user_id == User.user_id
+        ).filter(
+            *filters
+        ).order_by(
+            BarangKeluar.tanggal_transaksi.desc(),
+            BarangKeluar.keluar_id.desc()
+        ).offset((page - 1) * limit).limit(limit + 1).all()
+
+        has_more = len(rows) > limit
         result = []
-        for row in data:
+        for row in rows[:limit]:
             result.append({
                 "keluar_id": row.keluar_id,
-                "pelanggan": row.pembeli.nama_pelanggan if row.pembeli else None,
-                "petugas": row.petugas_keluar.nama_lengkap if row.petugas_keluar else None,
+                "pelanggan": row.nama_pelanggan,
+                "petugas": row.nama_lengkap,
                 "status": row.status_pesanan,
                 "tanggal": row.tanggal_transaksi.strftime("%Y-%m-%d") if row.tanggal_transaksi else None,
                 "total_penjualan": float(row.total_penjualan) if row.total_penjualan else 0
             })
-        return jsonify({"status": "success", "data": result}), 200
+
+        response = {
+            "status": "success",
+            "data": result,
+            "page": page,
+            "limit": limit,
+            "has_more": has_more
+        }
+
+        # Total hanya dihitung bila diminta: COUNT tanpa JOIN di atas filter yang sama
+        if with_total:
+            response["total"] = db.session.query(
+                func.count(BarangKeluar.keluar_id)
+            ).filter(*filters).scalar()
+
+        return jsonify(response), 200
     except Exception as e:
         return jsonify({"status": "error", "message": str(e)}), 500
 
@@ -55,20 +159,92 @@ def create_barang_keluar_safe():
     if role not in ["Admin", "Petugas Gudang"]:
         return jsonify({"error": "Akses ditolak"}), 403
 
-    data = request.json
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return jsonify({"error": "Body request harus berupa objek JSON"}), 400
     pelanggan_id = data.get("pelanggan_id")
     items = data.get("items", [])
-    total_penjualan = Decimal(str(data.get("total_penjualan", 0)))
 
     if not pelanggan_id:
         return jsonify({"error": "Pelanggan wajib dipilih"}), 400
     if not items:
         return jsonify({"error": "Item tidak boleh kosong"}), 400
+    if not isinstance(items, list):
+        return jsonify({"error": "Items harus berupa list"}), 400
+
+    # Validasi & normalisasi semua input di memori sebelum menyentuh database.
+    # Decimal / int bisa raise TypeError (mis. list), ValueError, atau
+    # ArithmeticError (decimal.InvalidOperation) -> semuanya 400, bukan 500.
+    try:
+        total_penjualan = Decimal(str(data.get("total_penjualan", 0)))
+    except (TypeError, ValueError, ArithmeticError):
+        return jsonify({"error": "Total penjualan tidak valid"}), 400
+
+    lines = []
+    for idx, item in enumerate(items):
+        if not isinstance(item, dict):
+            return jsonify({"error": f"Item ke-{idx+1} harus berupa objek"}), 400
+        try:
+            qty = Decimal(str(item.get("jumlah", 0)))
+            harga = Decimal(str(item.get("harga_satuan", 0)))
+            batch_id = int(item["batch_id"]) if item.get("batch_id") else None
+            buah_id = int(item["buah_id"]) if item.get("buah_id") else None
+        except (TypeError, ValueError, ArithmeticError):
+            return jsonify({"error": f"Data item ke-{idx+1} tidak valid"}), 400
+
+        if qty <= 0:
+            return jsonify({"error": f"Jumlah item ke-{idx+1} harus lebih dari 0"}), 400
+        if not batch_id and not buah_id:
+            return jsonify({"error": f"Item ke-{idx+1} wajib berisi batch_id atau buah_id"}), 400
+        lines.append((batch_id, buah_id, qty, harga))
 
     try:
         # Cari nama pelanggan untuk deskripsi log
-        pelanggan = Pelanggan.query.get(pelanggan_id)
-        pelanggan_name = pelanggan.nama_pelanggan if pelanggan else "ID Tidak Dikenal"
+        pelanggan_name = db.session.query(Pelanggan.nama_pelanggan).filter(
+            Pelanggan.pelanggan_id == pelanggan_id
+        ).scalar() or "ID Tidak Dikenal"
+
+        # Batch eksplisit + semua batch ber-stok untuk buah FIFO dikunci dengan
+        # SATU SELECT ... FOR UPDATE urut batch_id, sebelum alokasi apa pun
+        batch_ids = {batch_id for batch_id, _, _, _ in lines if batch_id}
+        fifo_buah_ids = {buah_id for batch_id, buah_id, _, _ in lines if not batch_id}
+        batch_map = kunci_batch(batch_ids, fifo_buah_ids)
+
+        pengurangan_batch = {}   # {batch_id: qty} total per batch
+        delta_buah = {}          # {buah_id: -qty} untuk Buah.stok_total
+        detail_rows = []         # (batch_id, buah_id, qty, harga)
+        fifo_lines = []          # baris tanpa batch_id: dialokasikan FIFO oleh server
+
+        for idx, (batch_id, buah_id, qty, harga) in enumerate(lines):
+            if not batch_id:
+                fifo_lines.append((buah_id, qty, harga))
+                continue
+
+            batch = batch_map.get(batch_id)
+            if not batch:
+                db.session.rollback()
+                return jsonify({"error": f"Batch {batch_id} tidak ditemukan"}), 400
+
+            pengurangan_batch[batch_id] = pengurangan_batch.get(batch_id, 0) + qty
+            if batch.stok_saat_ini < pengurangan_batch[batch_id]:
+                db.session.rollback()
+                return jsonify({"error": f"Stok batch {batch_id} tidak cukup. Tersisa: {batch.stok_saat_ini}"}), 409
+            detail_rows.append((batch_id, batch.buah_id, qty, harga))
+
+        if fifo_lines:
+            # Alokasi di memori atas batch yang sudah dikunci; stok batch
+            # eksplisit di pesanan ini dianggap sudah terpakai.
+            allocations = allocate_fifo(
+                [(buah_id, qty) for buah_id, qty, _ in fifo_lines],
+                batch_map.values(),
+                reserved=pengurangan_batch
+            )
+            for line_idx, batch, qty in allocations:
+                pengurangan_batch[batch.batch_id] = pengurangan_batch.get(batch.batch_id, 0) + qty
+                detail_rows.append((batch.batch_id, batch.buah_id, qty, fifo_lines[line_idx][2]))
+
+        for _, buah_id, qty, _ in detail_rows:
+            delta_buah[buah_id] = delta_buah.get(buah_id, 0) - qty
 
         # Buat transaksi baru
         trx = BarangKeluar(
@@ -81,49 +257,51 @@ def create_barang_keluar_safe():
         db.session.add(trx)
         db.session.flush()
 
-        # Proses setiap item (kurangi stok dan buat detail)
-        for idx, item in enumerate(items):
-            # ... (Logic validasi stok & pengurangan)
-            batch_id = int(item.get("batch_id"))
-            qty = Decimal(str(item.get("jumlah", 0)))
-            harga = Decimal(str(item.get("harga_satuan", 0)))
+        # Mutasi stok: satu UPDATE bersyarat untuk semua batch, satu untuk semua buah
+        kurangi_stok_batch(pengurangan_batch)
+        ubah_stok_total(delta_buah)
 
-            batch = BatchStok.query.get(batch_id)
-            if not batch:
-                db.session.rollback()
-                return jsonify({"error": f"Batch {batch_id} tidak ditemukan"}), 400
-            if qty <= 0:
-                db.session.rollback()
-                return jsonify({"error": f"Jumlah item ke-{idx+1} harus lebih dari 0"}), 400
-            if batch.stok_saat_ini < qty:
-                db.session.rollback()
-                return jsonify({"error": f"Stok batch {batch_id} tidak cukup. Tersisa: {batch.stok_saat_ini}"}), 400
-
-            # Kurangi stok
-            batch.stok_saat_ini -= qty
-            batch.jenis_buah.stok_total -= qty
-
-            # Tambahkan detail keluar
-            detail = DetailKeluar(
-                keluar_id=trx.keluar_id,
-                batch_id=batch_id,
-                jumlah_keluar=qty,
-                harga_jual_satuan=harga
-            )
-            db.session.add(detail)
+        # Detail keluar di-insert sekaligus (multi-row INSERT)
+        db.session.execute(insert(DetailKeluar), [
+            {
+                "keluar_id": trx.keluar_id,
+                "batch_id": batch_id,
+                "jumlah_keluar": qty,
+                "harga_jual_satuan": harga
+            } for batch_id, _, qty, harga in detail_rows
+        ])
 
-        db.session.commit() # Commit transaksi utama
+        # Rekap penjualan harian ikut di transaksi yang sama
+        rekap_pesanan_baru(trx)
+
+        alokasi = [
+            {"batch_id": batch_id, "buah_id": buah_id, "jumlah": float(qty)}
+            for batch_id, buah_id, qty, _ in detail_rows
+        ]
 
         # --- FIX 1: Catat Log (CREATE) ---
         record_log(
             action_type='TRX_KELUAR_CREATE',
             description=f'Membuat pesanan ID {trx.keluar_id} untuk pelanggan: {pelanggan_name}. Total: {total_penjualan}'
         )
+        keluar_id = trx.keluar_id  # dibaca sebelum commit (menghindari reload setelah expire)
+        db.session.commit() # Commit transaksi utama
+        inc_metric('sim_buah_orders_created_total')
 
-        return jsonify({"status": "success", "msg": f"Transaksi ID {trx.keluar_id} berhasil dibuat"}), 201
+        return jsonify({
+            "status": "success",
+            "msg": f"Transaksi ID {keluar_id} berhasil dibuat",
+            "keluar_id": keluar_id,
+            "alokasi": alokasi
+        }), 201
 
+    except (KonflikStok, StokTidakCukup) as e:
+        db.session.rollback()
+        return jsonify({"error": str(e)}), 409
     except Exception as e:
         db.session.rollback()
+        if is_lock_conflict(e):
+            return jsonify({"error": "Stok sedang diproses transaksi lain, silakan coba lagi"}), 409
         return jsonify({"status": "error", "message": str(e)}), 500
 
 
@@ -143,33 +321,37 @@ def update_status_keluar(id):
     if not status_baru:
         return jsonify({"error": "Status baru tidak boleh kosong"}), 400
 
+    # Di luar try: 404 (pesanan sudah dihapus request lain) tidak jadi 500
+    trx = BarangKeluar.query.get_or_404(id)
     try:
-        trx = BarangKeluar.query.get_or_404(id)
         status_lama = trx.status_pesanan
 
-        # 1. LOGIKA PENGEMBALIAN STOK SAAT DIBATALKAN
+        # 1. Transisi status adalah guard: dua pembatalan bersamaan tidak boleh
+        #    sama-sama mengembalikan stok. Baris pesanan di-lock lebih dulu.
+        if not ganti_status(id, status_lama, status_baru):
+            db.session.rollback()
+            return jsonify({"status": "error", "message": PESAN_KONFLIK_STATUS}), 409
+
+        # 2. LOGIKA PENGEMBALIAN STOK SAAT DIBATALKAN
         if status_lama != "Batal" and status_baru == "Batal":
-            for detail in trx.detail_keluar:
-                batch = detail.batch_asal
-                if batch:
-                    qty = detail.jumlah_keluar
-                    batch.stok_saat_ini += qty
-                    batch.jenis_buah.stok_total += qty
-        
-        # 2. Perbarui status transaksi
-        trx.status_pesanan = status_baru
-        db.session.commit()
-        
+            kembalikan_stok(trx)
+
+        # 3. Rekap hanya berubah jika masuk / keluar dari "Batal"
+        rekap_ubah_status(trx, status_lama, status_baru)
+
         # --- FIX 2: Catat Log (UPDATE STATUS) ---
         record_log(
             action_type='TRX_KELUAR_UPDATE',
             description=f'Mengubah status Pesanan ID {id} dari {status_lama} menjadi {status_baru}.'
         )
+        db.session.commit()
 
         return jsonify({"status": "success", "msg": f"Status transaksi ID {id} berhasil diperbarui menjadi {status_baru}"}), 200
 
     except Exception as e:
         db.session.rollback()
+        if is_lock_conflict(e):
+            return jsonify({"status": "error", "message": PESAN_KONFLIK_STATUS}), 409
         return jsonify({"status": "error", "message": str(e)}), 500
 
 
@@ -179,31 +361,38 @@ def update_status_keluar(id):
 @transaksi_bp.route("/keluar/<int:id>", methods=["DELETE"])
 @jwt_required()
 def delete_barang_keluar(id):
+    # Di luar try: 404 (pesanan sudah dihapus request lain) tidak jadi 500
+    trx = BarangKeluar.query.get_or_404(id)
     try:
-        trx = BarangKeluar.query.get_or_404(id)
+        status_lama = trx.status_pesanan
         pelanggan_name = trx.pembeli.nama_pelanggan if trx.pembeli else "N/A"
 
+        # Guard yang sama dengan ubah status: hapus / batal bersamaan untuk
+        # pesanan ini hanya satu yang lolos mengembalikan stok
+        if not ganti_status(id, status_lama, STATUS_DIHAPUS):
+            db.session.rollback()
+            return jsonify({"status": "error", "message": PESAN_KONFLIK_STATUS}), 409
+
         # Logika pengembalian stok hanya berjalan jika status BUKAN "Batal"
-        if trx.status_pesanan != "Batal":
-            for detail in trx.detail_keluar:
-                batch = detail.batch_asal
-                if batch:
-                    qty = detail.jumlah_keluar
-                    batch.stok_saat_ini += qty
-                    batch.jenis_buah.stok_total += qty
-        
+        if status_lama != "Batal":
+            kembalikan_stok(trx)
+
         # Lanjutkan menghapus transaksi dari database
+        # (trx di sesi masih berstatus status_lama: UPDATE di atas tidak disinkronkan)
+        rekap_hapus_pesanan(trx)
         db.session.delete(trx)
-        db.session.commit()
 
         # --- FIX 3: Catat Log (DELETE) ---
         record_log(
             action_type='TRX_KELUAR_DELETE',
             description=f'Menghapus Pesanan ID {id} (Pelanggan: {pelanggan_name}). Stok dikembalikan.'
         )
+        db.session.commit()
 
         return jsonify({"status": "success", "msg": f"Transaksi ID {id} berhasil dihapus"}), 200
 
     except Exception as e:
         db.session.rollback()
+        if is_lock_conflict(e):
+            return jsonify({"status": "error", "message": PESAN_KONFLIK_STATUS}), 409
         return jsonify({"status": "error", "message": str(e)}), 500
\ No newline at end of file
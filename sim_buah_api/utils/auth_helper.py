@@ -0,0 +1,138 @@
+import threading
+import time
+from functools import wraps
+from flask import current_app, jsonify, request
+from flask_jwt_extended import get_jwt_identity
+from sqlalchemy import select
+from ..database import db
+from ..models import User, Role
+from .cache_helper import get_cache
+
+# ====================================================================
+# OTORISASI BERSAMA (ROLE DARI STATUS AKUN)
+# --------------------------------------------------------------------
+# Route tidak perlu lagi User.query.get + lazy load user.role di setiap
+# request. Role untuk otorisasi diambil dari status akun (is_active + role
+# terkini, satu query join), bukan dari claim 'role' di token, lewat cache
+# kecil per proses:
+#   - entri hidup AUTH_CACHE_TTL detik -> user yang dinonaktifkan / diganti
+#     role-nya paling lama lolos selama TTL
+#   - write sukses di admin_routes mem-bump versi 'auth_user' di cache
+#     bersama -> entri di semua worker langsung dianggap basi
+# ====================================================================
+
+_AUTH_NAMESPACE = 'auth_user'
+
+
+class _StatusUserCache:
+    """user_id -> (kadaluarsa, versi, is_active, nama_role) milik satu proses."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._data = {}
+
+    def get(self, user_id, version):
+        with self._lock:
+            entry = self._data.get(user_id)
+        if entry and entry[0] > time.monotonic() and entry[1] == version:
+            return entry[2], entry[3]
+        return None
+
+    def set(self, user_id, version, is_active, role, ttl):
+        with self._lock:
+            self._data[user_id] = (time.monotonic() + ttl, version, is_active, role)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+_status_cache = _StatusUserCache()
+
+
+def _versi_auth():
+    try:
+        return get_cache().get_version(_AUTH_NAMESPACE)
+    except Exception as e:
+        # Cache bersama tidak tersedia: TTL saja yang membatasi umur entri
+        print(f"ERROR: Gagal membaca versi cache auth: {e}")
+        return None
+
+
+def status_user(user_id):
+    """
+    (is_active, nama_role) terkini untuk user_id, atau None jika user tidak ada.
+    Satu query (join role) saat cache miss; selalu dibaca dari primary.
+    """
+    user_id = str(user_id)
+    version = _versi_auth()
+    cached = _status_cache.get(user_id, version)
+    if cached is not None:
+        return cached
+
+    row = db.session.execute(
+        select(User.is_active, Role.nama_role)
+        .join(Role, Role.role_id == User.role_id)
+        .where(User.user_id == int(user_id)),
+        # Status akun tidak boleh terlambat karena lag replikasi
+        bind_arguments={'bind': db.engine},
+    ).first()
+    if row is None:
+        return None
+    status = (bool(row.is_active), row.nama_role)
+    _status_cache.set(user_id, version, *status, current_app.config.get('AUTH_CACHE_TTL', 30))
+    return status
+
+
+def get_user_role(user_id=None):
+    """
+    Role terkini user yang sedang login, dari status akun (cache per proses).
+    None jika user tidak ada / nonaktif. Role di database selalu menang atas
+    claim 'role' di token: jika admin mengganti role sejak token dibuat, role
+    baru langsung berlaku tanpa menunggu token kadaluarsa.
+    """
+    if user_id is None:
+        user_id = get_jwt_identity()
+    status = status_user(user_id)
+    if status is None:
+        return None
+    is_active, role = status
+    if not is_active:
+        return None
+    return role
+
+
+def invalidate_status_user():
+    """Buang cache status akun di semua worker (dipanggil setelah data user berubah)."""
+    _status_cache.clear()
+    try:
+        get_cache().bump_version(_AUTH_NAMESPACE)
+    except Exception as e:
+        print(f"ERROR: Gagal invalidasi cache auth: {e}")
+
+
+def invalidate_status_user_on_write(response):
+    """Hook after_request untuk blueprint yang mengubah user / role."""
+    if request.method in ('POST', 'PUT', 'PATCH', 'DELETE') and response.status_code < 400:
+        invalidate_status_user()
+    return response
+
+
+def role_required(*roles, message="Akses ditolak"):
+    """
+    Decorator RBAC (dipasang setelah @jwt_required()): 403 jika akun nonaktif
+    atau role tidak termasuk `roles`.
+    """
+    def wrapper(fn):
+        @wraps(fn)
+        def decorator(*args, **kwargs):
+            if get_user_role() not in roles:
+                return jsonify(msg=message), 403
+            return fn(*args, **kwargs)
+        return decorator
+    return wrapper
+
+
+def admin_required():
+    """Decorator kustom untuk membatasi akses hanya untuk user dengan Role 'Admin'."""
+    return role_required('Admin', message="Akses Ditolak: Hanya Admin yang dapat mengakses modul ini.")
@@ -0,0 +1,204 @@
+import atexit
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from flask import current_app, request
+
+# ====================================================================
+# CACHE BERSAMA ANTAR WORKER
+# --------------------------------------------------------------------
+# Gunicorn menjalankan beberapa proses worker; cache di memori proses tidak
+# bisa di-invalidate dari worker lain. Backend di sini adalah satu file
+# SQLite lokal (stdlib, tanpa service eksternal) berisi:
+#   - cache_entry   : key -> value JSON + waktu kadaluarsa
+#   - cache_version : nomor versi per namespace (di-bump saat ada write)
+#   - cache_counter : hit / miss gabungan semua worker. Setiap proses
+#                     menghitung di memori lalu menambahkan delta-nya paling
+#                     cepat tiap COUNTER_FLUSH_SECONDS (dan saat stats() / exit),
+#                     jadi get() tidak menulis ke file di setiap baca
+#   - cache_lease   : klaim job terjadwal (satu worker per interval)
+# ====================================================================
+
+DEFAULT_CACHE_PATH = os.path.join(tempfile.gettempdir(), 'sim_buah_cache.db')
+COUNTER_FLUSH_SECONDS = 10
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS cache_entry (key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL);
+CREATE TABLE IF NOT EXISTS cache_version (namespace TEXT PRIMARY KEY, version INTEGER NOT NULL);
+CREATE TABLE IF NOT EXISTS cache_counter (name TEXT PRIMARY KEY, value INTEGER NOT NULL);
+CREATE TABLE IF NOT EXISTS cache_lease (name TEXT PRIMARY KEY, claimed_at REAL NOT NULL);
+"""
+
+
+class SharedCache:
+    """Cache key-value ber-TTL di file SQLite, aman dipakai banyak proses & thread."""
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        self._counter_lock = threading.Lock()
+        self._reset_counters()
+        atexit.register(self.flush_counters)
+
+    def _reset_counters(self):
+        # Setelah fork, hitungan milik parent tidak boleh ikut di-flush dua kali
+        self._counter_pid = os.getpid()
+        self._counters = {}
+        self._counters_flushed_at = time.monotonic()
+
+    def _conn(self):
+        # Koneksi sqlite3 tidak boleh dibagi antar thread / proses hasil fork
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.executescript(_SCHEMA)
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def _count(self, name):
+        with self._counter_lock:
+            if self._counter_pid != os.getpid():
+                self._reset_counters()
+            self._counters[name] = self._counters.get(name, 0) + 1
+            due = time.monotonic() - self._counters_flushed_at >= COUNTER_FLUSH_SECONDS
+        if due:
+            self.flush_counters()
+
+    def flush_counters(self):
+        """Tambahkan hitungan hit/miss proses ini ke cache_counter (satu transaksi)."""
+        with self._counter_lock:
+            if self._counter_pid != os.getpid():
+                self._reset_counters()
+            counters, self._counters = self._counters, {}
+            self._counters_flushed_at = time.monotonic()
+        if not counters:
+            return
+        conn = self._conn()
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            conn.executemany(
+                "INSERT INTO cache_counter (name, value) VALUES (?, ?) "
+                "ON CONFLICT(name) DO UPDATE SET value = value + excluded.value",
+                list(counters.items())
+            )
+            conn.execute('COMMIT')
+        except Exception as e:
+            if conn.in_transaction:
+                conn.execute('ROLLBACK')
+            # Hitungan dikembalikan supaya tidak hilang; dicoba lagi di flush berikutnya
+            with self._counter_lock:
+                for name, value in counters.items():
+                    self._counters[name] = self._counters.get(name, 0) + value
+            print(f"ERROR: Gagal flush counter cache: {e}")
+
+    def get(self, key, count=True):
+        """
+        Ambil value (sudah di-decode JSON) atau None jika tidak ada / kadaluarsa.
+        count=False untuk penanda internal yang tidak ikut statistik hit/miss.
+        """
+        row = self._conn().execute(
+            "SELECT value FROM cache_entry WHERE key = ? AND expires_at > ?", (key, time.time())
+        ).fetchone()
+        if count:
+            self._count('hit' if row else 'miss')
+        return json.loads(row[0]) if row else None
+
+    def set(self, key, value, ttl):
+        conn = self._conn()
+        now = time.time()
+        conn.execute(
+            "INSERT OR REPLACE INTO cache_entry (key, value, expires_at) VALUES (?, ?, ?)",
+            (key, json.dumps(value), now + ttl)
+        )
+        # Bersihkan entri kadaluarsa (termasuk snapshot versi lama)
+        conn.execute("DELETE FROM cache_entry WHERE expires_at <= ?", (now,))
+
+    def get_version(self, namespace):
+        row = self._conn().execute(
+            "SELECT version FROM cache_version WHERE namespace = ?", (namespace,)
+        ).fetchone()
+        return row[0] if row else 0
+
+    def bump_version(self, namespace):
+        """Naikkan versi namespace: semua key lama otomatis tidak terpakai lagi."""
+        self._conn().execute(
+            "INSERT INTO cache_version (namespace, version) VALUES (?, 1) "
+            "ON CONFLICT(namespace) DO UPDATE SET version = version + 1", (namespace,)
+        )
+
+    def klaim_lease(self, name, interval):
+        """
+        True jika proses ini berhasil mengklaim job `name` (klaim terakhir sudah
+        lebih dari `interval` detik lalu). UPDATE bersyarat bersifat atomik, jadi
+        dari semua worker yang mencoba bersamaan hanya satu yang menang.
+        """
+        conn = self._conn()
+        now = time.time()
+        conn.execute("INSERT OR IGNORE INTO cache_lease (name, claimed_at) VALUES (?, 0)", (name,))
+        cursor = conn.execute(
+            "UPDATE cache_lease SET claimed_at = ? WHERE name = ? AND claimed_at <= ?",
+            (now, name, now - interval)
+        )
+        return cursor.rowcount == 1
+
+    def stats(self):
+        # Hitungan worker lain bisa tertinggal paling lama COUNTER_FLUSH_SECONDS
+        self.flush_counters()
+        counters = dict(self._conn().execute("SELECT name, value FROM cache_counter").fetchall())
+        hits, misses = counters.get('hit', 0), counters.get('miss', 0)
+        total = hits + misses
+        return {
+            "hits": hits,
+            "misses": misses,
+            "hit_ratio": round(hits / total, 4) if total else 0.0,
+            "entries": self._conn().execute("SELECT COUNT(*) FROM cache_entry").fetchone()[0]
+        }
+
+
+_caches = {}
+_caches_lock = threading.Lock()
+
+
+def get_cache():
+    """Instance SharedCache untuk app aktif (path dari config CACHE_PATH)."""
+    path = current_app.config.get('CACHE_PATH') or DEFAULT_CACHE_PATH
+    with _caches_lock:
+        if path not in _caches:
+            _caches[path] = SharedCache(path)
+        return _caches[path]
+
+
+def invalidate_dashboard():
+    """Bump versi snapshot dashboard; dipanggil setelah write berhasil di-commit."""
+    try:
+        get_cache().bump_version('dashboard')
+    except Exception as e:
+        # Gagal invalidasi tidak boleh menggagalkan write; snapshot tetap kadaluarsa oleh TTL.
+        print(f"ERROR: Gagal invalidasi cache dashboard: {e}")
+
+
+def invalidate_dashboard_on_write(response):
+    """Hook after_request untuk blueprint yang mengubah data dashboard."""
+    if request.method in ('POST', 'PUT', 'PATCH', 'DELETE') and response.status_code < 400:
+        invalidate_dashboard()
+    return response
+
+
+def invalidate_master_on_write(response):
+    """
+    Hook after_request untuk blueprint master: selain dashboard, bump versi
+    'master' (nama pelanggan / supplier tampil di laporan PDF yang di-cache).
+    """
+    if request.method in ('POST', 'PUT', 'PATCH', 'DELETE') and response.status_code < 400:
+        invalidate_dashboard()
+        try:
+            get_cache().bump_version('master')
+        except Exception as e:
+            print(f"ERROR: Gagal invalidasi cache master: {e}")
+    return response
@@ -0,0 +1,218 @@
+import os
+import threading
+import time
+from sqlalchemy.engine import make_url
+from sqlalchemy.pool import QueuePool, StaticPool
+
+# ====================================================================
+# KONFIGURASI ENGINE & POOL KONEKSI
+# --------------------------------------------------------------------
+# SQLALCHEMY_ENGINE_OPTIONS dibangun saat app dibuat, sesuai dialek URL:
+#   - profil (DB_PROFILE) memberi nilai default: production / benchmark / test
+#   - setiap nilai bisa ditimpa env DB_* (lihat config.py)
+#   - config yang sudah mengisi SQLALCHEMY_ENGINE_OPTIONS sendiri (skrip
+#     stress / benchmark) tidak diubah
+#   - bind tambahan (read replica) dibangun dengan aturan yang sama
+# Waktu tunggu checkout pool dicatat per proses untuk /api/status dan
+# metrik Prometheus.
+# ====================================================================
+
+DB_PROFILES = {
+    # Railway MySQL: koneksi idle diputus proxy, jadi recycle < 5 menit + pre-ping
+    'production': {
+        'pool_size': 10, 'max_overflow': 20, 'pool_timeout': 10, 'pool_recycle': 280,
+        'pool_pre_ping': True, 'connect_timeout': 5, 'read_timeout': 30, 'write_timeout': 30,
+        'statement_timeout_ms': 30000,
+    },
+    # Ukur throughput apa adanya: pool tetap (antrian terlihat), tanpa ping per checkout
+    'benchmark': {
+        'pool_size': 20, 'max_overflow': 0, 'pool_timeout': 30, 'pool_recycle': 3600,
+        'pool_pre_ping': False, 'connect_timeout': 5, 'read_timeout': 120, 'write_timeout': 120,
+        'statement_timeout_ms': 0,
+    },
+    # SQLite in-memory: satu koneksi bersama (StaticPool), tanpa timeout
+    'test': {
+        'pool_size': 1, 'max_overflow': 0, 'pool_timeout': 5, 'pool_recycle': -1,
+        'pool_pre_ping': False, 'connect_timeout': 5, 'read_timeout': 5, 'write_timeout': 5,
+        'statement_timeout_ms': 0,
+    },
+}
+
+# Key config -> key profil
+_CONFIG_KEYS = {
+    'DB_POOL_SIZE': 'pool_size',
+    'DB_MAX_OVERFLOW': 'max_overflow',
+    'DB_POOL_TIMEOUT': 'pool_timeout',
+    'DB_POOL_RECYCLE': 'pool_recycle',
+    'DB_POOL_PRE_PING': 'pool_pre_ping',
+    'DB_CONNECT_TIMEOUT': 'connect_timeout',
+    'DB_READ_TIMEOUT': 'read_timeout',
+    'DB_WRITE_TIMEOUT': 'write_timeout',
+    'DB_STATEMENT_TIMEOUT_MS': 'statement_timeout_ms',
+}
+
+
+def db_settings(config):
+    """Nilai profil DB_PROFILE yang ditimpa oleh key DB_* yang di-set di config."""
+    profile = config.get('DB_PROFILE') or 'production'
+    if profile not in DB_PROFILES:
+        raise ValueError(f"DB_PROFILE tidak dikenal: {profile} (pilihan: {', '.join(DB_PROFILES)})")
+    settings = dict(DB_PROFILES[profile])
+    for config_key, key in _CONFIG_KEYS.items():
+        if config.get(config_key) is not None:
+            settings[key] = config[config_key]
+    return profile, settings
+
+
+def build_engine_options(uri, settings):
+    """SQLALCHEMY_ENGINE_OPTIONS untuk URI & setting pool yang diberikan."""
+    url = make_url(uri)
+    backend = url.get_backend_name()
+
+    if backend == 'sqlite':
+        if url.database in (None, '', ':memory:'):
+            # Semua sesi harus melihat database memori yang sama
+            return {'poolclass': StaticPool, 'connect_args': {'check_same_thread': False}}
+        # SQLite tidak punya statement timeout; timeout = lama menunggu lock file
+        return {
+            'poolclass': QueuePool,
+            'pool_size': settings['pool_size'], 'max_overflow': settings['max_overflow'],
+            'pool_timeout': settings['pool_timeout'], 'pool_pre_ping': settings['pool_pre_ping'],
+            'connect_args': {'timeout': settings['read_timeout']},
+        }
+
+    options = {
+        'poolclass': QueuePool,
+        'pool_size': settings['pool_size'],
+        'max_overflow': settings['max_overflow'],
+        'pool_timeout': settings['pool_timeout'],
+        'pool_recycle': settings['pool_recycle'],
+        'pool_pre_ping': settings['pool_pre_ping'],
+    }
+    statement_timeout = settings['statement_timeout_ms']
+    if backend == 'mysql':
+        # Berlaku untuk pymysql & mysqlclient; max_execution_time hanya membatasi SELECT
+        connect_args = {
+            'connect_timeout': settings['connect_timeout'],
+            'read_timeout': settings['read_timeout'],
+            'write_timeout': settings['write_timeout'],
+        }
+        if statement_timeout:
+            connect_args['init_command'] = f"SET SESSION max_execution_time={int(statement_timeout)}"
+        options['connect_args'] = connect_args
+    elif backend == 'postgresql':
+        connect_args = {'connect_timeout': settings['connect_timeout']}
+        if statement_timeout:
+            connect_args['options'] = f"-c statement_timeout={int(statement_timeout)}"
+        options['connect_args'] = connect_args
+    return options
+
+
+def init_engine_options(app):
+    """Isi SQLALCHEMY_ENGINE_OPTIONS sebelum db.init_app (dari create_app dan app.py)."""
+    instrument_queue_pool()
+    profile, settings = db_settings(app.config)
+    if not app.config.get('SQLALCHEMY_DATABASE_URI'):
+        # Jangan pernah jatuh ke database default: tanpa URL, app berhenti di sini
+        raise RuntimeError(
+            f"DATABASE_URL belum di-set (DB_PROFILE={profile}). Isi DATABASE_URL di environment / .env, "
+            "atau pakai DB_PROFILE=test untuk SQLite in-memory."
+        )
+    app.config['DB_PROFILE'] = profile
+    if app.config.get('SQLALCHEMY_ENGINE_OPTIONS') is None:
+        app.config['SQLALCHEMY_ENGINE_OPTIONS'] = build_engine_options(
+            app.config['SQLALCHEMY_DATABASE_URI'], settings)
+        # Bind lain (mis. read replica) dapat opsi sesuai dialeknya sendiri;
+        # opsi lengkap supaya tidak mewarisi opsi primary yang tidak cocok
+        app.config['SQLALCHEMY_BINDS'] = {
+            key: dict(build_engine_options(value, settings), url=value) if isinstance(value, str) else value
+            for key, value in (app.config.get('SQLALCHEMY_BINDS') or {}).items()
+        }
+
+
+# ====================================================================
+# TELEMETRI POOL
+# ====================================================================
+
+class _PoolWaitStats:
+    """Statistik waktu tunggu checkout pool milik satu proses."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.listeners = []
+        self._reset()
+
+    def _reset(self):
+        self._pid = os.getpid()
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def record(self, seconds):
+        with self._lock:
+            if self._pid != os.getpid():
+                self._reset()
+            self.count += 1
+            self.total += seconds
+            self.max = max(self.max, seconds)
+        for listener in self.listeners:
+            listener(seconds)
+
+    def snapshot(self):
+        with self._lock:
+            if self._pid != os.getpid():
+                self._reset()
+            return {
+                "count": self.count,
+                "total_ms": round(self.total * 1000, 2),
+                "avg_ms": round(self.total * 1000 / self.count, 3) if self.count else 0.0,
+                "max_ms": round(self.max * 1000, 2),
+            }
+
+
+pool_wait_stats = _PoolWaitStats()
+
+
+def instrument_queue_pool():
+    """Ukur waktu tunggu checkout: QueuePool._do_get menunggu slot kosong di pool."""
+    original = QueuePool._do_get
+    if getattr(original, '_wait_instrumented', False):
+        return
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return original(self)
+        finally:
+            pool_wait_stats.record(time.perf_counter() - start)
+
+    _do_get._wait_instrumented = True
+    QueuePool._do_get = _do_get
+
+
+def add_pool_wait_listener(listener):
+    """Daftarkan callback(detik) untuk setiap checkout (dipakai metrics_helper)."""
+    if listener not in pool_wait_stats.listeners:
+        pool_wait_stats.listeners.append(listener)
+
+
+def pool_status(db, app):
+    """Statistik pool per engine (bind) untuk proses worker ini."""
+    engines = {}
+    for bind, engine in db.engines.items():
+        pool = engine.pool
+        info = {"pool_class": type(pool).__name__}
+        if isinstance(pool, QueuePool):
+            info.update({
+                "size": pool.size(),
+                "checked_out": pool.checkedout(),
+                "checked_in": pool.checkedin(),
+                "overflow": max(0, pool.overflow()),
+            })
+        engines[bind or 'default'] = info
+    return {
+        "pid": os.getpid(),
+        "profile": app.config.get('DB_PROFILE'),
+        "engines": engines,
+        "checkout_wait": pool_wait_stats.snapshot(),
+    }
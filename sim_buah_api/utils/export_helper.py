@@ -0,0 +1,242 @@
+import csv
+import io
+import shutil
+import tempfile
+import xlsxwriter
+from sqlalchemy import String, func, literal, select, union_all
+from ..database import db
+from .cache_helper import get_cache
+from .replica_helper import get_read_engine
+from ..models import BarangKeluar, BarangMasuk, Pelanggan, Supplier, RekapPenjualanHarian
+
+# ====================================================================
+# SUMBER BARIS & WRITER EXPORT LAPORAN
+# --------------------------------------------------------------------
+# Export tidak lagi memuat seluruh laporan ke list / DataFrame. Baris dibaca
+# dari server-side cursor (stream_results) per potongan dan langsung ditulis
+# ke output, jadi memori tetap datar berapapun panjang rentang tanggalnya.
+# ====================================================================
+
+# Ukuran potongan fetch dari cursor & jumlah baris per chunk response
+CHUNK_ROWS = 1000
+
+# Kolom setiap laporan (urutan = urutan kolom file export)
+KOLOM_LAPORAN = {
+    'transaksi': ['id', 'tanggal', 'tipe', 'pihak', 'total', 'status'],
+    'penjualan': ['tanggal', 'total_penjualan', 'jumlah_transaksi', 'jumlah_batal'],
+}
+
+# Tipe setiap kolom untuk format sel XLSX: int | number | date | text
+TIPE_KOLOM = {
+    'transaksi': ['int', 'date', 'text', 'text', 'number', 'text'],
+    'penjualan': ['date', 'number', 'int', 'int'],
+}
+
+# Lebar kolom XLSX per tipe (constant_memory tidak bisa auto-fit setelah menulis)
+_LEBAR_KOLOM = {'int': 10, 'number': 16, 'date': 12, 'text': 30}
+
+
+def stream_query(stmt, chunk_rows=CHUNK_ROWS):
+    """
+    Jalankan SELECT di koneksi tersendiri dengan server-side cursor dan
+    yield baris satu per satu (diambil per `chunk_rows`). Koneksi ditutup
+    saat generator selesai atau dihentikan (mis. client memutus download).
+    """
+    with get_read_engine(db).connect() as conn:
+        result = conn.execution_options(stream_results=True, max_row_buffer=chunk_rows).execute(stmt)
+        for partition in result.partitions(chunk_rows):
+            yield from partition
+
+
+def _float(value):
+    return float(value) if value is not None else 0.00
+
+
+def transaksi_query(start_date, end_date):
+    """
+    Laporan transaksi (keluar + masuk) sebagai SATU statement UNION ALL yang
+    sudah di-JOIN ke nama pelanggan / supplier dan diurutkan di database
+    (tanggal terbaru dulu, Keluar sebelum Masuk pada tanggal yang sama).
+    Kolom hasil: id, tanggal, tipe, pihak, total, status.
+    """
+    keluar = select(
+        BarangKeluar.keluar_id.label('id'),
+        BarangKeluar.tanggal_transaksi.label('tanggal'),
+        literal('Keluar', String(10)).label('tipe'),
+        func.coalesce(Pelanggan.nama_pelanggan, 'N/A').label('pihak'),
+        BarangKeluar.total_penjualan.label('total'),
+        BarangKeluar.status_pesanan.label('status')
+    ).outerjoin(
+        Pelanggan, BarangKeluar.pelanggan_id == Pelanggan.pelanggan_id
+    ).where(BarangKeluar.tanggal_transaksi.between(start_date, end_date))
+
+    masuk = select(
+        BarangMasuk.masuk_id,
+        BarangMasuk.tanggal_transaksi,
+        literal('Masuk', String(10)),
+        func.coalesce(Supplier.nama_supplier, 'N/A'),
+        BarangMasuk.total_biaya,
+        literal('Selesai', String(50))
+    ).outerjoin(
+        Supplier, BarangMasuk.supplier_id == Supplier.supplier_id
+    ).where(BarangMasuk.tanggal_transaksi.between(start_date, end_date))
+
+    gabungan = union_all(keluar, masuk).subquery('transaksi')
+    return select(gabungan).order_by(
+        gabungan.c.tanggal.desc(), gabungan.c.tipe.asc(), gabungan.c.id.desc()
+    )
+
+
+def _iter_transaksi(start_date, end_date):
+    return (
+        (row.id, row.tanggal, row.tipe, row.pihak, _float(row.total), row.status)
+        for row in stream_query(transaksi_query(start_date, end_date))
+    )
+
+
+def _iter_penjualan(start_date, end_date):
+    stmt = select(
+        RekapPenjualanHarian.tanggal, RekapPenjualanHarian.total_penjualan,
+        RekapPenjualanHarian.jumlah_transaksi, RekapPenjualanHarian.jumlah_batal
+    ).where(
+        RekapPenjualanHarian.tanggal.between(start_date, end_date),
+        RekapPenjualanHarian.jumlah_transaksi > 0
+    ).order_by(RekapPenjualanHarian.tanggal.desc())
+    return ((row[0], _float(row[1]), row[2], row[3]) for row in stream_query(stmt))
+
+
+_SUMBER_LAPORAN = {
+    'transaksi': _iter_transaksi,
+    'penjualan': _iter_penjualan,
+}
+
+
+def iter_laporan_rows(report_type, start_date, end_date):
+    """Generator tuple baris laporan (urutan sesuai KOLOM_LAPORAN[report_type])."""
+    return _SUMBER_LAPORAN[report_type](start_date, end_date)
+
+
+def versi_data_laporan(report_type, start_date, end_date):
+    """
+    Sidik jari murah (agregat lewat index tanggal) dari data sebuah laporan,
+    dipakai sebagai versi data untuk cache hasil render. Nama pelanggan /
+    supplier ikut lewat versi cache 'master' yang di-bump oleh write master.
+    """
+    if report_type == 'penjualan':
+        agregat = db.session.execute(select(
+            func.count(), func.sum(RekapPenjualanHarian.jumlah_transaksi),
+            func.sum(RekapPenjualanHarian.total_penjualan), func.sum(RekapPenjualanHarian.jumlah_batal)
+        ).where(RekapPenjualanHarian.tanggal.between(start_date, end_date))).all()
+    else:
+        agregat = db.session.execute(select(
+            BarangKeluar.status_pesanan, func.count(), func.sum(BarangKeluar.keluar_id),
+            func.max(BarangKeluar.keluar_id), func.sum(BarangKeluar.total_penjualan)
+        ).where(
+            BarangKeluar.tanggal_transaksi.between(start_date, end_date)
+        ).group_by(BarangKeluar.status_pesanan).order_by(BarangKeluar.status_pesanan)).all()
+        agregat += db.session.execute(select(
+            func.count(), func.sum(BarangMasuk.masuk_id),
+            func.max(BarangMasuk.masuk_id), func.sum(BarangMasuk.total_biaya)
+        ).where(BarangMasuk.tanggal_transaksi.between(start_date, end_date))).all()
+    return f"{get_cache().get_version('master')}:{[tuple(row) for row in agregat]}"
+
+
+def iter_csv(columns, rows, chunk_rows=CHUNK_ROWS):
+    """Tulis CSV (UTF-8 dengan BOM agar terbaca Excel) per potongan `chunk_rows` baris."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    yield '\ufeff' + buffer.getvalue()
+
+    count = 0
+    buffer.seek(0)
+    buffer.truncate()
+    for row in rows:
+        writer.writerow(row)
+        count += 1
+        if count % chunk_rows == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+def write_xlsx(columns, types, rows, sheet_name='Laporan', output=None):
+    """
+    Tulis XLSX baris demi baris dengan mode constant_memory xlsxwriter
+    (hanya satu baris yang ditahan di memori). Tanpa `output`, ditulis ke file
+    sementara di disk yang otomatis terhapus saat ditutup (send_file
+    menutupnya setelah response terkirim). Mengembalikan file object yang
+    sudah di-seek ke awal.
+    """
+    if output is None:
+        output = tempfile.TemporaryFile(suffix='.xlsx')
+    workbook = xlsxwriter.Workbook(output, {'constant_memory': True, 'tmpdir': tempfile.gettempdir()})
+    try:
+        worksheet = workbook.add_worksheet(sheet_name)
+        header = workbook.add_format({'bold': True})
+        formats = {
+            'int': workbook.add_format({'num_format': '0'}),
+            'number': workbook.add_format({'num_format': '#,##0.00'}),
+            'date': workbook.add_format({'num_format': 'yyyy-mm-dd'}),
+            'text': None,
+        }
+        writers = {
+            'int': worksheet.write_number,
+            'number': worksheet.write_number,
+            'date': worksheet.write_datetime,
+            'text': lambda row, col, value, cell_format: worksheet.write_string(row, col, str(value)),
+        }
+
+        for col, tipe in enumerate(types):
+            worksheet.set_column(col, col, _LEBAR_KOLOM[tipe])
+        worksheet.write_row(0, 0, columns, header)
+
+        cell_writers = [(writers[tipe], formats[tipe]) for tipe in types]
+        for row_idx, row in enumerate(rows, start=1):
+            for col, value in enumerate(row):
+                if value is None:
+                    continue
+                write, cell_format = cell_writers[col]
+                write(row_idx, col, value, cell_format)
+    finally:
+        workbook.close()
+    output.seek(0)
+    return output
+
+
+# Format export -> (ekstensi file, mimetype)
+FORMAT_EXPORT = {
+    'csv': ('csv', 'text/csv'),
+    'excel': ('xlsx', 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'),
+    'pdf': ('pdf', 'application/pdf'),
+}
+
+
+def nama_file_laporan(report_type, start_date, end_date):
+    return f"Laporan_{report_type.capitalize()}_{start_date}_to_{end_date}"
+
+
+def render_laporan(report_type, report_format, start_date, end_date, output, rows=None):
+    """
+    Tulis laporan lengkap ke file biner `output` (dipakai job export di
+    background). `rows` boleh diisi generator yang sudah dibungkus (mis. untuk
+    menghitung progress); default langsung dari iter_laporan_rows.
+    """
+    if rows is None:
+        rows = iter_laporan_rows(report_type, start_date, end_date)
+    columns = KOLOM_LAPORAN[report_type]
+
+    if report_format == 'csv':
+        for chunk in iter_csv(columns, rows):
+            output.write(chunk.encode('utf-8'))
+    elif report_format == 'excel':
+        write_xlsx(columns, TIPE_KOLOM[report_type], rows, output=output)
+    elif report_format == 'pdf':
+        from .pdf_helper import cached_laporan_pdf
+        path, _ = cached_laporan_pdf(report_type, start_date, end_date, rows=rows)
+        with open(path, 'rb') as cached:
+            shutil.copyfileobj(cached, output)
+    else:
+        raise ValueError(f"Format export tidak didukung: {report_format}")
@@ -0,0 +1,355 @@
+import hashlib
+import multiprocessing
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import date
+from flask import current_app
+from ..database import db
+from .export_helper import CHUNK_ROWS, FORMAT_EXPORT, iter_laporan_rows, nama_file_laporan, render_laporan
+from .metrics_helper import flush_metrics, observe_metric
+
+# ====================================================================
+# JOB EXPORT DI BACKGROUND
+# --------------------------------------------------------------------
+# Export besar (terutama PDF) tidak lagi dirender di dalam request:
+#   1. request export dengan ?async=1 membuat job dan langsung mendapat job_id
+#   2. pool proses lokal (per worker gunicorn) merender file ke EXPORT_DIR
+#   3. client polling status lalu mengunduh file yang sudah jadi
+#
+# Status job disimpan di file SQLite (EXPORT_DIR/jobs.db) supaya polling /
+# download boleh jatuh ke worker gunicorn mana saja. Request identik yang
+# masih berjalan memakai job yang sama; file hasil dihapus setelah
+# EXPORT_JOB_TTL detik.
+#
+# Proses pool bisa mati di tengah job (OOM saat render PDF besar, worker
+# gunicorn di-recycle). Job yang sedang jalan memperbarui heartbeat_at setiap
+# CHUNK_ROWS baris; job queued / running yang heartbeat-nya (atau created_at
+# jika belum mulai) lebih tua dari EXPORT_JOB_TIMEOUT detik dianggap gagal,
+# baik saat dedup maupun saat status dipolling. Future pool yang gagal
+# (BrokenProcessPool) juga langsung menandai job-nya gagal.
+# ====================================================================
+
+STATUS_QUEUED = 'queued'
+STATUS_RUNNING = 'running'
+STATUS_DONE = 'done'
+STATUS_FAILED = 'failed'
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS export_job (
+    job_id TEXT PRIMARY KEY,
+    dedup_key TEXT NOT NULL,
+    status TEXT NOT NULL,
+    report_type TEXT NOT NULL,
+    report_format TEXT NOT NULL,
+    start_date TEXT NOT NULL,
+    end_date TEXT NOT NULL,
+    user_id INTEGER,
+    rows_done INTEGER NOT NULL DEFAULT 0,
+    file_path TEXT,
+    error TEXT,
+    created_at REAL NOT NULL,
+    heartbeat_at REAL,
+    finished_at REAL,
+    expires_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS ix_export_job_dedup ON export_job (dedup_key, status);
+"""
+
+PESAN_JOB_MACET = "Job export berhenti tanpa kabar (proses render mati / di-restart), silakan export ulang"
+
+
+class ExportJobStore:
+    """Tabel status job di file SQLite lokal, aman dipakai banyak proses & thread."""
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.path = os.path.join(directory, 'jobs.db')
+        self._local = threading.local()
+
+    def _conn(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            os.makedirs(self.directory, exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.executescript(_SCHEMA)
+            # jobs.db lama (sebelum ada heartbeat_at) tetap dipakai
+            kolom = {row['name'] for row in conn.execute("PRAGMA table_info(export_job)")}
+            if 'heartbeat_at' not in kolom:
+                conn.execute("ALTER TABLE export_job ADD COLUMN heartbeat_at REAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def _tandai_macet(self, conn, now, timeout, job_id=None):
+        """Job queued / running tanpa heartbeat selama `timeout` detik -> failed."""
+        sql = ("UPDATE export_job SET status = ?, error = ?, finished_at = ? "
+               "WHERE status IN (?, ?) AND COALESCE(heartbeat_at, created_at) < ?")
+        params = [STATUS_FAILED, PESAN_JOB_MACET, now, STATUS_QUEUED, STATUS_RUNNING, now - timeout]
+        if job_id is not None:
+            sql += " AND job_id = ?"
+            params.append(job_id)
+        conn.execute(sql, params)
+
+    def create_or_get(self, dedup_key, values, ttl, timeout):
+        """
+        Buat job baru, atau kembalikan (job, False) jika job identik masih berjalan.
+        Job identik yang macet (lihat _tandai_macet) ditandai gagal lebih dulu.
+        """
+        conn = self._conn()
+        now = time.time()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            self._tandai_macet(conn, now, timeout)
+            row = conn.execute(
+                "SELECT * FROM export_job WHERE dedup_key = ? AND status IN (?, ?) AND expires_at > ?",
+                (dedup_key, STATUS_QUEUED, STATUS_RUNNING, now)
+            ).fetchone()
+            if row:
+                conn.execute('COMMIT')
+                return dict(row), False
+            job = dict(values, job_id=uuid.uuid4().hex, dedup_key=dedup_key, status=STATUS_QUEUED,
+                       rows_done=0, created_at=now, expires_at=now + ttl)
+            conn.execute(
+                f"INSERT INTO export_job ({', '.join(job)}) VALUES ({', '.join('?' * len(job))})",
+                tuple(job.values())
+            )
+            conn.execute('COMMIT')
+            return job, True
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+
+    def get(self, job_id, timeout=None):
+        """Status job; dengan `timeout`, job macet ditandai gagal sebelum dibaca."""
+        conn = self._conn()
+        if timeout is not None:
+            self._tandai_macet(conn, time.time(), timeout, job_id)
+        row = conn.execute("SELECT * FROM export_job WHERE job_id = ?", (job_id,)).fetchone()
+        return dict(row) if row else None
+
+    def mulai(self, job_id):
+        """queued -> running (False jika job sudah tidak queued, mis. ditandai macet)."""
+        now = time.time()
+        cursor = self._conn().execute(
+            "UPDATE export_job SET status = ?, heartbeat_at = ? WHERE job_id = ? AND status = ?",
+            (STATUS_RUNNING, now, job_id, STATUS_QUEUED)
+        )
+        return cursor.rowcount == 1
+
+    def tandai_gagal(self, job_id, error):
+        """Tandai job gagal, kecuali sudah selesai / gagal lebih dulu."""
+        self._conn().execute(
+            "UPDATE export_job SET status = ?, error = ?, finished_at = ? WHERE job_id = ? AND status IN (?, ?)",
+            (STATUS_FAILED, error, time.time(), job_id, STATUS_QUEUED, STATUS_RUNNING)
+        )
+
+    def update(self, job_id, **values):
+        self._conn().execute(
+            f"UPDATE export_job SET {', '.join(f'{key} = ?' for key in values)} WHERE job_id = ?",
+            (*values.values(), job_id)
+        )
+
+    def purge_expired(self):
+        """Hapus job & file yang sudah melewati TTL."""
+        conn = self._conn()
+        now = time.time()
+        for row in conn.execute("SELECT job_id, file_path FROM export_job WHERE expires_at <= ?", (now,)).fetchall():
+            if row['file_path'] and os.path.exists(row['file_path']):
+                os.remove(row['file_path'])
+            conn.execute("DELETE FROM export_job WHERE job_id = ?", (row['job_id'],))
+
+
+_stores = {}
+_pool = None
+_pool_pid = None
+_pool_lock = threading.Lock()
+_stores_lock = threading.Lock()
+_worker_app = None
+
+
+def get_export_dir():
+    return current_app.config.get('EXPORT_DIR') or os.path.join(tempfile.gettempdir(), 'sim_buah_exports')
+
+
+def get_job_store(directory=None):
+    directory = directory or get_export_dir()
+    with _stores_lock:
+        if directory not in _stores:
+            _stores[directory] = ExportJobStore(directory)
+        return _stores[directory]
+
+
+def _init_worker(app):
+    """Initializer proses pool: pakai app hasil fork, tapi jangan pakai koneksi DB milik parent."""
+    global _worker_app
+    _worker_app = app
+    with app.app_context():
+        for engine in db.engines.values():
+            engine.dispose(close=False)
+
+
+def get_job_timeout():
+    return current_app.config.get('EXPORT_JOB_TIMEOUT', 600)
+
+
+def get_job(job_id):
+    """Status job untuk polling / download; job macet dilaporkan gagal."""
+    return get_job_store().get(job_id, timeout=get_job_timeout())
+
+
+def _reset_pool(pool):
+    """Buang pool yang rusak (BrokenProcessPool) supaya submit berikutnya membuat pool baru."""
+    global _pool
+    with _pool_lock:
+        if _pool is pool:
+            _pool = None
+
+
+def _get_pool():
+    """ProcessPoolExecutor milik proses ini (dibuat ulang jika proses hasil fork)."""
+    global _pool, _pool_pid
+    with _pool_lock:
+        if _pool is None or _pool_pid != os.getpid():
+            app = current_app._get_current_object()
+            _pool = ProcessPoolExecutor(
+                max_workers=app.config.get('EXPORT_WORKERS', 2),
+                mp_context=multiprocessing.get_context('fork'),
+                initializer=_init_worker,
+                initargs=(app,)
+            )
+            _pool_pid = os.getpid()
+        return _pool
+
+
+def _hitung_progress(rows, store, job_id):
+    """
+    Bungkus generator baris: simpan jumlah baris yang sudah ditulis setiap
+    CHUNK_ROWS, sekaligus heartbeat bahwa proses render masih hidup.
+    """
+    count = 0
+    for row in rows:
+        yield row
+        count += 1
+        if count % CHUNK_ROWS == 0:
+            store.update(job_id, rows_done=count, heartbeat_at=time.time())
+    store.update(job_id, rows_done=count, heartbeat_at=time.time())
+
+
+def _run_job(directory, job_id):
+    """Dijalankan di proses pool: render laporan ke file lalu tandai selesai / gagal."""
+    store = get_job_store(directory)
+    job = store.get(job_id)
+    if not job or not store.mulai(job_id):
+        # Job sudah dihapus / ditandai macet selama antre
+        return
+    mulai = time.time()
+
+    ekstensi = FORMAT_EXPORT[job['report_format']][0]
+    file_path = os.path.join(directory, f"{job_id}.{ekstensi}")
+    tmp_path = file_path + '.part'
+    try:
+        start_date = date.fromisoformat(job['start_date'])
+        end_date = date.fromisoformat(job['end_date'])
+        with _worker_app.app_context():
+            rows = _hitung_progress(
+                iter_laporan_rows(job['report_type'], start_date, end_date), store, job_id
+            )
+            with open(tmp_path, 'wb') as output:
+                render_laporan(job['report_type'], job['report_format'], start_date, end_date, output, rows=rows)
+        os.replace(tmp_path, file_path)
+        # TTL dihitung sejak file selesai dibuat
+        selesai = time.time()
+        store.update(job_id, status=STATUS_DONE, file_path=file_path, finished_at=selesai,
+                     expires_at=selesai + _worker_app.config.get('EXPORT_JOB_TTL', 3600))
+    except Exception as e:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        store.update(job_id, status=STATUS_FAILED, error=str(e), finished_at=time.time())
+
+    job = store.get(job_id)
+    observe_metric('sim_buah_export_job_duration_seconds', time.time() - mulai, {
+        'report_type': job['report_type'], 'format': job['report_format'], 'status': job['status']
+    }, app=_worker_app)
+    # Proses pool tidak melayani request; flush langsung supaya terlihat di /metrics
+    flush_metrics(_worker_app)
+
+
+def _cek_future(pool, directory, job_id):
+    """
+    Callback future pool: _run_job menangkap error render sendiri, jadi future
+    yang gagal berarti proses pool mati (OOM, dibunuh) -> tandai job gagal.
+    """
+    def callback(future):
+        if future.cancelled():
+            error = "Job export dibatalkan"
+        else:
+            exc = future.exception()
+            if exc is None:
+                return
+            if isinstance(exc, BrokenProcessPool):
+                _reset_pool(pool)
+            error = f"Proses export gagal: {exc!r}"
+        try:
+            get_job_store(directory).tandai_gagal(job_id, error)
+        except Exception as e:
+            print(f"ERROR: Gagal menandai job export {job_id} gagal: {e}")
+    return callback
+
+
+def submit_export_job(report_type, report_format, start_date, end_date, user_id=None):
+    """Daftarkan job export (atau pakai job identik yang masih berjalan). Mengembalikan (job, dibuat_baru)."""
+    store = get_job_store()
+    store.purge_expired()
+
+    dedup_key = hashlib.sha1(
+        f"{report_type}|{report_format}|{start_date}|{end_date}".encode()
+    ).hexdigest()
+    job, created = store.create_or_get(dedup_key, {
+        "report_type": report_type,
+        "report_format": report_format,
+        "start_date": start_date.isoformat(),
+        "end_date": end_date.isoformat(),
+        "user_id": user_id,
+    }, current_app.config.get('EXPORT_JOB_TTL', 3600), get_job_timeout())
+
+    if created:
+        pool = None
+        try:
+            pool = _get_pool()
+            future = pool.submit(_run_job, store.directory, job['job_id'])
+            future.add_done_callback(_cek_future(pool, store.directory, job['job_id']))
+        except Exception as e:
+            # Pool rusak / tidak bisa fork: job langsung gagal, jangan menggantung sampai TTL
+            if isinstance(e, BrokenProcessPool):
+                _reset_pool(pool)
+            store.tandai_gagal(job['job_id'], str(e))
+            job = store.get(job['job_id'])
+    return job, created
+
+
+def job_to_dict(job):
+    """Representasi JSON status job untuk client."""
+    data = {
+        "job_id": job['job_id'],
+        "status": job['status'],
+        "report_type": job['report_type'],
+        "format": job['report_format'],
+        "start_date": job['start_date'],
+        "end_date": job['end_date'],
+        "rows_done": job['rows_done'],
+        "expires_in": max(0, int(job['expires_at'] - time.time())),
+    }
+    if job['status'] == STATUS_FAILED:
+        data["error"] = job.get('error')
+    if job['status'] == STATUS_DONE:
+        ekstensi = FORMAT_EXPORT[job['report_format']][0]
+        data["file_name"] = f"{nama_file_laporan(job['report_type'], job['start_date'], job['end_date'])}.{ekstensi}"
+    return data
@@ -0,0 +1,87 @@
+from sqlalchemy import and_, or_
+from ..models import BatchStok
+
+
+class StokTidakCukup(Exception):
+    """Total stok batch tersedia untuk satu buah tidak mencukupi permintaan."""
+
+    def __init__(self, buah_id, diminta, tersedia):
+        self.buah_id = buah_id
+        self.diminta = diminta
+        self.tersedia = tersedia
+        super().__init__(
+            f"Stok buah ID {buah_id} tidak cukup. Diminta: {diminta}, Tersedia: {tersedia}"
+        )
+
+
+def kunci_batch(batch_ids=(), buah_ids=()):
+    """
+    Kunci semua batch yang mungkin dipakai satu pesanan dalam SATU
+    SELECT ... FOR UPDATE: batch eksplisit (batch_ids) ditambah semua batch
+    ber-stok untuk buah yang dialokasikan FIFO (buah_ids).
+
+    Baris dikunci urut batch_id (primary key) apa pun isi pesanannya, sesuai
+    urutan lock batch_stok di utils/stok_helper.py. Pesanan campuran (batch
+    eksplisit + FIFO) tidak bisa saling deadlock karena tidak ada lagi lock
+    kedua yang diambil belakangan dengan urutan berbeda. populate_existing()
+    memastikan nilai stok dibaca ulang dari baris yang dikunci.
+
+    Return: {batch_id: BatchStok}.
+    """
+    kondisi = []
+    if batch_ids:
+        kondisi.append(BatchStok.batch_id.in_(sorted(batch_ids)))
+    if buah_ids:
+        kondisi.append(and_(BatchStok.buah_id.in_(sorted(buah_ids)), BatchStok.stok_saat_ini > 0))
+    if not kondisi:
+        return {}
+    batches = BatchStok.query.filter(or_(*kondisi)).order_by(
+        BatchStok.batch_id
+    ).with_for_update().populate_existing().all()
+    return {batch.batch_id: batch for batch in batches}
+
+
+def allocate_fifo(lines, batches, reserved=None):
+    """
+    Alokasikan baris pesanan (buah_id, jumlah) ke batch tertua lebih dulu (FIFO).
+
+    Alokasi murni di memori atas batch yang sudah dikunci kunci_batch();
+    antrian per buah diurutkan tanggal_masuk_batch -> batch_id di sini, bukan
+    lewat urutan lock.
+
+    reserved: {batch_id: qty} yang sudah dipesan baris lain di pesanan yang
+    sama (batch_id eksplisit), dikurangkan dari stok sebelum alokasi.
+
+    Return: list (index_baris, batch, jumlah). Satu baris bisa dipecah ke
+    beberapa batch. Raise StokTidakCukup jika stok satu buah kurang.
+    """
+    buah_ids = {buah_id for buah_id, _ in lines}
+    antrian = {buah_id: [] for buah_id in buah_ids}
+    for batch in sorted(batches, key=lambda b: (b.tanggal_masuk_batch, b.batch_id)):
+        if batch.buah_id in antrian and batch.stok_saat_ini > 0:
+            antrian[batch.buah_id].append(batch)
+
+    # Sisa stok yang belum dialokasikan per batch (baris dengan buah sama berbagi antrian)
+    reserved = reserved or {}
+    sisa = {
+        batch.batch_id: batch.stok_saat_ini - reserved.get(batch.batch_id, 0)
+        for batches_buah in antrian.values() for batch in batches_buah
+    }
+    allocations = []
+
+    for idx, (buah_id, jumlah) in enumerate(lines):
+        kebutuhan = jumlah
+        for batch in antrian[buah_id]:
+            if kebutuhan <= 0:
+                break
+            ambil = min(sisa[batch.batch_id], kebutuhan)
+            if ambil <= 0:
+                continue
+            sisa[batch.batch_id] -= ambil
+            kebutuhan -= ambil
+            allocations.append((idx, batch, ambil))
+
+        if kebutuhan > 0:
+            raise StokTidakCukup(buah_id, jumlah, jumlah - kebutuhan)
+
+    return allocations
@@ -0,0 +1,213 @@
+import os
+import threading
+import time
+from datetime import date, datetime, timedelta
+from flask import current_app
+from sqlalchemy import delete, insert, select
+from ..database import db
+from ..models import AlertKadaluarsa, BatchStok, Buah, Role, User
+from .cache_helper import get_cache, invalidate_dashboard
+from .log_helper import record_log
+from .stok_helper import KonflikStok, is_lock_conflict, kurangi_stok_batch, ubah_stok_total
+
+# ====================================================================
+# SCAN KADALUARSA & WRITE-OFF
+# --------------------------------------------------------------------
+# scan_kadaluarsa() mencari batch yang sudah / hampir kadaluarsa dengan satu
+# query (index tanggal_kadaluarsa + stok_saat_ini), lalu mengganti isi tabel
+# alert_kadaluarsa yang dibaca dashboard. Jika write_off=True, stok batch
+# yang sudah lewat tanggal kadaluarsa dinolkan dalam satu UPDATE, stok_total
+# buah dikoreksi dalam satu UPDATE, dan dicatat SATU log aktivitas. Tanpa
+# user pencatat log (lihat _user_audit) write-off dibatalkan sebelum stok
+# diubah: tidak boleh ada write-off tanpa jejak audit.
+#
+# Dijalankan lewat:
+#   - CLI  : flask kadaluarsa scan [--hari N] [--write-off]
+#   - jadwal di dalam proses: EXPIRY_SCAN_INTERVAL > 0 (detik). Setiap worker
+#     gunicorn punya thread sendiri, tapi lease di cache bersama memastikan
+#     hanya satu worker yang menjalankan scan per interval.
+# ====================================================================
+
+STATUS_KADALUARSA = 'Kadaluarsa'
+STATUS_HAMPIR = 'Hampir Kadaluarsa'
+
+_MAX_PERCOBAAN = 3
+_LEASE_NAME = 'scan_kadaluarsa'
+
+
+class TidakAdaUserAudit(Exception):
+    """Write-off dibatalkan: tidak ada user aktif untuk mencatat log audit."""
+
+
+def _user_audit(user_id=None):
+    """
+    user_id pencatat log write-off: user_id eksplisit (--user-id, harus user
+    aktif), atau EXPIRY_SYSTEM_USER, atau Admin aktif pertama. None jika tidak ada.
+    """
+    query = select(User.user_id).where(User.is_active.is_(True))
+    if user_id:
+        return db.session.execute(query.where(User.user_id == user_id)).scalar()
+    username = current_app.config.get('EXPIRY_SYSTEM_USER')
+    if username:
+        user_id = db.session.execute(query.where(User.username == username)).scalar()
+        if user_id:
+            return user_id
+    return db.session.execute(
+        query.join(Role, User.role_id == Role.role_id)
+        .where(Role.nama_role == 'Admin')
+        .order_by(User.user_id.asc())
+        .limit(1)
+    ).scalar()
+
+
+def scan_kadaluarsa(hari_peringatan=2, write_off=False, user_id=None):
+    """
+    Scan batch yang kadaluarsa (tanggal_kadaluarsa < hari ini) atau hampir
+    kadaluarsa (<= hari ini + hari_peringatan), simpan ke alert_kadaluarsa dan
+    (opsional) hapus-bukukan stok yang sudah kadaluarsa.
+
+    Tidak melakukan commit: pemanggil yang commit / rollback. Raise KonflikStok
+    jika stok batch berubah di tengah write-off (aman untuk dicoba ulang), dan
+    TidakAdaUserAudit jika write-off tidak punya user pencatat log.
+    """
+    today = date.today()
+    batas = today + timedelta(days=hari_peringatan)
+
+    query = select(
+        BatchStok.batch_id,
+        BatchStok.buah_id,
+        Buah.nama_buah,
+        BatchStok.tanggal_kadaluarsa,
+        BatchStok.stok_saat_ini
+    ).join(
+        Buah, BatchStok.buah_id == Buah.buah_id
+    ).where(
+        BatchStok.tanggal_kadaluarsa <= batas,
+        BatchStok.stok_saat_ini > 0
+    ).order_by(BatchStok.tanggal_kadaluarsa.asc(), BatchStok.batch_id.asc())
+    if write_off:
+        # Urutan lock: batch_stok dulu, baru master_buah (lihat stok_helper)
+        query = query.with_for_update(of=BatchStok)
+    rows = db.session.execute(query).all()
+
+    kadaluarsa = [row for row in rows if row.tanggal_kadaluarsa < today]
+    dihapusbukukan = write_off and bool(kadaluarsa)
+    total_write_off = sum(row.stok_saat_ini for row in kadaluarsa) if dihapusbukukan else 0
+
+    if dihapusbukukan:
+        # User audit dipastikan ada SEBELUM stok diubah
+        audit_user_id = _user_audit(user_id)
+        if not audit_user_id:
+            raise TidakAdaUserAudit(
+                f"User {user_id} tidak ditemukan / tidak aktif" if user_id else
+                "Tidak ada EXPIRY_SYSTEM_USER maupun Admin aktif untuk mencatat log write-off"
+            )
+        kurangi_stok_batch({row.batch_id: row.stok_saat_ini for row in kadaluarsa})
+        per_buah = {}
+        for row in kadaluarsa:
+            per_buah[row.buah_id] = per_buah.get(row.buah_id, 0) + row.stok_saat_ini
+        ubah_stok_total({buah_id: -qty for buah_id, qty in per_buah.items()})
+
+        record_log(
+            'STOK_WRITE_OFF',
+            f"Write-off stok kadaluarsa: {len(kadaluarsa)} batch, total {float(total_write_off):.2f} kg "
+            f"(batch {', '.join(str(row.batch_id) for row in kadaluarsa)})",
+            user_id=audit_user_id
+        )
+
+    # Snapshot alert diganti seluruhnya oleh hasil scan terbaru
+    waktu_scan = datetime.utcnow()
+    db.session.execute(delete(AlertKadaluarsa))
+    if rows:
+        db.session.execute(insert(AlertKadaluarsa), [{
+            "batch_id": row.batch_id,
+            "buah_id": row.buah_id,
+            "nama_buah": row.nama_buah,
+            "tanggal_kadaluarsa": row.tanggal_kadaluarsa,
+            "stok": row.stok_saat_ini,
+            "status": STATUS_KADALUARSA if row.tanggal_kadaluarsa < today else STATUS_HAMPIR,
+            "dihapusbukukan": dihapusbukukan and row.tanggal_kadaluarsa < today,
+            "waktu_scan": waktu_scan,
+        } for row in rows])
+
+    return {
+        "kadaluarsa": len(kadaluarsa),
+        "hampir_kadaluarsa": len(rows) - len(kadaluarsa),
+        "dihapusbukukan": len(kadaluarsa) if dihapusbukukan else 0,
+        "total_write_off": float(total_write_off),
+    }
+
+
+def jalankan_scan_kadaluarsa(hari_peringatan=2, write_off=False, user_id=None):
+    """scan_kadaluarsa + commit, dicoba ulang jika bentrok dengan transaksi stok lain."""
+    for percobaan in range(1, _MAX_PERCOBAAN + 1):
+        try:
+            hasil = scan_kadaluarsa(hari_peringatan, write_off, user_id)
+            db.session.commit()
+            break
+        except Exception as e:
+            db.session.rollback()
+            if percobaan == _MAX_PERCOBAAN or not (isinstance(e, KonflikStok) or is_lock_conflict(e)):
+                raise
+    invalidate_dashboard()
+    return hasil
+
+
+# ====================================================================
+# JADWAL DI DALAM PROSES
+# ====================================================================
+
+_scheduler_pid = None
+_scheduler_lock = threading.Lock()
+
+
+def _loop_scan(app, interval):
+    # Bangun lebih sering dari interval; lease yang menentukan kapan scan jalan
+    jeda = min(interval, 60)
+    while True:
+        try:
+            with app.app_context():
+                if get_cache().klaim_lease(_LEASE_NAME, interval):
+                    hari = app.config.get('EXPIRY_ALERT_DAYS', 2)
+                    try:
+                        hasil = jalankan_scan_kadaluarsa(hari, app.config.get('EXPIRY_AUTO_WRITE_OFF', False))
+                    except TidakAdaUserAudit as e:
+                        # Write-off ditunda, tapi alert kadaluarsa tetap diperbarui
+                        print(f"ERROR: Write-off otomatis dibatalkan: {e}")
+                        hasil = jalankan_scan_kadaluarsa(hari, write_off=False)
+                    print(f"Scan kadaluarsa selesai: {hasil}")
+                db.session.remove()
+        except Exception as e:
+            print(f"ERROR: Scan kadaluarsa terjadwal gagal: {e}")
+        time.sleep(jeda)
+
+
+def _mulai_scheduler(app):
+    """Start thread scan di proses ini (sekali per PID, aman setelah fork gunicorn)."""
+    global _scheduler_pid
+    if _scheduler_pid == os.getpid():
+        return
+    with _scheduler_lock:
+        if _scheduler_pid == os.getpid():
+            return
+        thread = threading.Thread(
+            target=_loop_scan, args=(app, app.config['EXPIRY_SCAN_INTERVAL']),
+            name='scan-kadaluarsa', daemon=True
+        )
+        thread.start()
+        _scheduler_pid = os.getpid()
+
+
+def init_scan_scheduler(app):
+    """
+    Aktifkan scan terjadwal jika EXPIRY_SCAN_INTERVAL > 0. Thread baru dimulai
+    pada request pertama di tiap worker, bukan saat import, supaya tidak hilang
+    ketika gunicorn --preload melakukan fork (dan tidak jalan saat perintah CLI).
+    """
+    if not app.config.get('EXPIRY_SCAN_INTERVAL'):
+        return
+
+    @app.before_request
+    def _pastikan_scheduler():
+        if _scheduler_pid != os.getpid():
+            _mulai_scheduler(app)
@@ -1,33 +1,85 @@
+from datetime import datetime
+from flask import g, has_request_context
 from flask_jwt_extended import get_jwt_identity
+from sqlalchemy import event, insert
 from ..database import db
 from ..models import LogAktivitas
 
-def record_log(action_type, description):
+# Panjang maksimum kolom log_aktivitas.deskripsi
+_MAX_DESKRIPSI = 255
+
+
+def record_log(action_type, description, user_id=None):
     """
     Fungsi helper untuk mencatat aktivitas ke tabel LogAktivitas.
-    Dipanggil setelah db.session.commit() dari transaksi utama.
+
+    Log TIDAK di-commit sendiri: entri ditampung per request dan ditulis
+    (satu multi-row INSERT) di dalam commit transaksi utama. Karena itu panggil
+    record_log SEBELUM db.session.commit(). Jika transaksi utama di-rollback
+    atau tidak pernah di-commit (handler keluar lebih awal), log ikut dibuang
+    saat teardown request.
     """
     try:
         # PENTING: get_jwt_identity() akan memberikan user_id dari token JWT
-        user_id = get_jwt_identity() 
-        
+        user_id = user_id or get_jwt_identity()
+
         # Cek apakah user_id tersedia
         if not user_id:
-            # Jika tidak ada user ID (misalnya dipanggil di context non-JWT),
-            # gunakan ID default atau batalkan log.
             # Kita asumsikan semua aksi CRUD harus melalui JWT.
             print("ERROR: record_log dipanggil tanpa User ID (JWT Identity).")
             return
-            
-        log = LogAktivitas(
-            user_id=user_id,
-            jenis_aksi=action_type, # e.g., 'USER_CREATE', 'TRX_MASUK_POST'
-            deskripsi=description
-        )
-        db.session.add(log)
-        db.session.commit()
+
+        entry = {
+            "user_id": int(user_id),
+            "timestamp": datetime.utcnow(),
+            "jenis_aksi": action_type,  # e.g., 'USER_CREATE', 'TRX_MASUK_POST'
+            "deskripsi": description[:_MAX_DESKRIPSI]
+        }
+        if has_request_context():
+            g.setdefault('_log_buffer', []).append(entry)
+        else:
+            db.session.execute(insert(LogAktivitas), [entry])
     except Exception as e:
-        # Jika gagal mencatat log, cetak error tetapi JANGAN HENTIKAN proses 
-        # API utama (karena transaksi utama sudah committed).
+        # Jika gagal mencatat log, cetak error tetapi JANGAN HENTIKAN proses API utama.
         print(f"ERROR: Gagal mencatat log aktivitas: {e}")
-        db.session.rollback()
\ No newline at end of file
+
+
+def _write_log_buffer(session):
+    """Tulis semua log yang tertampung dengan satu INSERT (gagal log tidak membatalkan transaksi)."""
+    if not has_request_context():
+        return
+    entries = g.pop('_log_buffer', None)
+    if not entries:
+        return
+    # Flush perubahan bisnis lebih dulu: error di sini milik transaksi utama
+    session.flush()
+    try:
+        # SAVEPOINT: INSERT log yang gagal hanya me-rollback savepoint-nya.
+        # Tanpa ini PostgreSQL menandai seluruh transaksi aborted dan commit
+        # transaksi utama ikut gagal.
+        with session.begin_nested():
+            session.execute(insert(LogAktivitas), entries)
+    except Exception as e:
+        print(f"ERROR: Gagal mencatat log aktivitas: {e}")
+
+
+def _discard_log_buffer(session, previous_transaction=None):
+    """Transaksi utama batal -> log untuk aksi tersebut ikut dibuang."""
+    if has_request_context():
+        g.pop('_log_buffer', None)
+
+
+def init_audit_log(app):
+    """Pasang hook: log ditulis di commit yang sama, sisa log dibuang saat teardown."""
+    if not event.contains(db.session, 'before_commit', _write_log_buffer):
+        event.listen(db.session, 'before_commit', _write_log_buffer)
+        event.listen(db.session, 'after_soft_rollback', _discard_log_buffer)
+
+    @app.teardown_request
+    def discard_pending_logs(exc):
+        # Sisa buffer = aksi yang transaksinya tidak di-commit. Jangan commit
+        # sesi request di sini: itu ikut menyimpan perubahan bisnis setengah jadi.
+        entries = g.pop('_log_buffer', None)
+        if entries:
+            print(f"ERROR: {len(entries)} log aktivitas dibuang, transaksinya tidak di-commit: "
+                  f"{', '.join(entry['jenis_aksi'] for entry in entries)}")
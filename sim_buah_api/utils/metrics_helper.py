@@ -0,0 +1,366 @@
+import atexit
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from flask import Response, current_app, g, request
+from sqlalchemy import event
+from sqlalchemy.pool import Pool, QueuePool
+from .engine_helper import add_pool_wait_listener
+
+# ====================================================================
+# METRIK FORMAT PROMETHEUS (GET /metrics)
+# --------------------------------------------------------------------
+# Tanpa service / library tambahan. Setiap worker gunicorn (dan proses pool
+# export) mencatat metrik di memori, lalu thread flusher menulis delta-nya
+# setiap METRICS_FLUSH_INTERVAL detik ke satu file SQLite bersama
+# (METRICS_PATH), pola yang sama dengan cache_helper & export_jobs:
+#   - counter & histogram : satu baris per seri (pid = 0), nilai ditambah delta
+#   - gauge               : satu baris per seri per PID, dijumlah saat scrape;
+#                           baris milik worker yang sudah mati diabaikan
+# Scrape /metrics boleh jatuh ke worker mana saja: worker tsb flush dulu
+# miliknya sendiri, lalu membaca agregat dari file.
+# ====================================================================
+
+DEFAULT_METRICS_PATH = os.path.join(tempfile.gettempdir(), 'sim_buah_metrics.db')
+
+_LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+_WAIT_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 30.0)
+_JOB_BUCKETS = (1.0, 5.0, 15.0, 30.0, 60.0, 120.0, 300.0, 600.0, 1800.0)
+
+# nama -> (tipe, help, buckets)
+METRICS = {
+    'sim_buah_http_requests_total': (
+        'counter', 'Jumlah request HTTP per route & status.', None),
+    'sim_buah_http_request_duration_seconds': (
+        'histogram', 'Latensi request HTTP per blueprint & route.', _LATENCY_BUCKETS),
+    'sim_buah_http_requests_in_flight': (
+        'gauge', 'Request yang sedang diproses (semua worker).', None),
+    'sim_buah_db_pool_checkouts_total': (
+        'counter', 'Jumlah checkout koneksi dari pool database.', None),
+    'sim_buah_db_pool_checked_out': (
+        'gauge', 'Koneksi database yang sedang dipakai.', None),
+    'sim_buah_db_pool_overflow': (
+        'gauge', 'Koneksi overflow di atas pool_size.', None),
+    'sim_buah_db_pool_wait_seconds': (
+        'histogram', 'Waktu tunggu mendapatkan koneksi dari pool.', _WAIT_BUCKETS),
+    'sim_buah_export_job_duration_seconds': (
+        'histogram', 'Durasi job export di background.', _JOB_BUCKETS),
+    'sim_buah_orders_created_total': (
+        'counter', 'Pesanan barang keluar yang berhasil dibuat.', None),
+    'sim_buah_stock_received_total': (
+        'counter', 'Penerimaan barang masuk yang berhasil dicatat.', None),
+    'sim_buah_stock_received_kg_total': (
+        'counter', 'Total kg stok yang diterima.', None),
+    'sim_buah_login_attempts_total': (
+        'counter', 'Percobaan login per hasil.', None),
+}
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS metric_sample (
+    name TEXT NOT NULL,
+    labels TEXT NOT NULL,
+    pid INTEGER NOT NULL,
+    value REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    PRIMARY KEY (name, labels, pid)
+);
+"""
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(labels):
+    return ','.join(f'{key}="{_escape(value)}"' for key, value in sorted(labels.items()))
+
+
+def _format_bucket_labels(labels, bound):
+    # le selalu label terakhir, supaya bucket bisa diurutkan per seri saat render
+    le = 'le="+Inf"' if bound == float('inf') else f'le="{float(bound)!r}"'
+    prefix = _format_labels(labels)
+    return f'{prefix},{le}' if prefix else le
+
+
+def _bucket_sort_key(labels):
+    prefix, _, le = labels.rpartition('le="')
+    return prefix, float(le.rstrip('"').replace('+Inf', 'inf'))
+
+
+def _format_value(value):
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+class MetricsRegistry:
+    """Buffer metrik milik satu proses; isinya di-flush ke file SQLite bersama."""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._reset()
+
+    def _reset(self):
+        # Setelah fork, buffer milik parent tidak boleh ikut di-flush dua kali
+        self._pid = os.getpid()
+        self._deltas = {}  # (sample_name, labels) -> delta
+        self._gauges = {}  # (name, labels) -> nilai terkini proses ini
+
+    def _check_pid(self):
+        if self._pid != os.getpid():
+            self._reset()
+
+    def _conn(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.executescript(_SCHEMA)
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def inc(self, name, labels=None, amount=1):
+        key = (name, _format_labels(labels or {}))
+        with self._lock:
+            self._check_pid()
+            self._deltas[key] = self._deltas.get(key, 0) + amount
+
+    def observe(self, name, value, labels=None):
+        labels = labels or {}
+        with self._lock:
+            self._check_pid()
+            for bound in METRICS[name][2] + (float('inf'),):
+                if value <= bound:
+                    key = (f'{name}_bucket', _format_bucket_labels(labels, bound))
+                    self._deltas[key] = self._deltas.get(key, 0) + 1
+            for suffix, amount in (('_sum', value), ('_count', 1)):
+                key = (f'{name}{suffix}', _format_labels(labels))
+                self._deltas[key] = self._deltas.get(key, 0) + amount
+
+    def add_gauge(self, name, amount, labels=None):
+        key = (name, _format_labels(labels or {}))
+        with self._lock:
+            self._check_pid()
+            self._gauges[key] = self._gauges.get(key, 0) + amount
+
+    def set_gauge(self, name, value, labels=None):
+        with self._lock:
+            self._check_pid()
+            self._gauges[(name, _format_labels(labels or {}))] = value
+
+    def flush(self, interval):
+        """Tulis delta counter/histogram dan nilai gauge proses ini dalam satu transaksi."""
+        with self._lock:
+            self._check_pid()
+            deltas, self._deltas = self._deltas, {}
+            gauges = dict(self._gauges)
+        now = time.time()
+        conn = self._conn()
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            conn.executemany(
+                "INSERT INTO metric_sample (name, labels, pid, value, updated_at) VALUES (?, ?, 0, ?, ?) "
+                "ON CONFLICT(name, labels, pid) DO UPDATE SET value = value + excluded.value, "
+                "updated_at = excluded.updated_at",
+                [(name, labels, delta, now) for (name, labels), delta in deltas.items()]
+            )
+            conn.executemany(
+                "INSERT INTO metric_sample (name, labels, pid, value, updated_at) VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT(name, labels, pid) DO UPDATE SET value = excluded.value, "
+                "updated_at = excluded.updated_at",
+                [(name, labels, os.getpid(), value, now) for (name, labels), value in gauges.items()]
+            )
+            # Gauge milik worker yang sudah lama tidak flush (mati / di-restart)
+            conn.execute("DELETE FROM metric_sample WHERE pid != 0 AND updated_at < ?", (now - interval * 10,))
+            conn.execute('COMMIT')
+        except Exception:
+            if conn.in_transaction:
+                conn.execute('ROLLBACK')
+            # Delta dikembalikan supaya tidak hilang; dicoba lagi di flush berikutnya
+            with self._lock:
+                for key, delta in deltas.items():
+                    self._deltas[key] = self._deltas.get(key, 0) + delta
+            raise
+
+    def render(self, interval):
+        """Teks exposition Prometheus dari agregat semua proses."""
+        # Gauge hanya dari worker yang flush dalam 3 interval terakhir (masih hidup)
+        stale_after = interval * 3
+        rows = self._conn().execute(
+            "SELECT name, labels, SUM(value) FROM metric_sample "
+            "WHERE pid = 0 OR updated_at >= ? GROUP BY name, labels ORDER BY name, labels",
+            (time.time() - stale_after,)
+        ).fetchall()
+        samples = {}
+        for sample_name, labels, value in rows:
+            samples.setdefault(sample_name, []).append((labels, value))
+
+        lines = []
+        for name, (tipe, help_text, _) in METRICS.items():
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} {tipe}')
+            sample_names = (f'{name}_bucket', f'{name}_sum', f'{name}_count') if tipe == 'histogram' else (name,)
+            for sample_name in sample_names:
+                series = samples.get(sample_name, [])
+                if sample_name.endswith('_bucket'):
+                    series = sorted(series, key=lambda item: _bucket_sort_key(item[0]))
+                for labels, value in series:
+                    label_text = f'{{{labels}}}' if labels else ''
+                    lines.append(f'{sample_name}{label_text} {_format_value(value)}')
+        return '\n'.join(lines) + '\n'
+
+
+_registries = {}
+_registries_lock = threading.Lock()
+
+
+def _registry_for(path):
+    with _registries_lock:
+        if path not in _registries:
+            _registries[path] = MetricsRegistry(path)
+        return _registries[path]
+
+
+def get_metrics(app=None):
+    app = app or current_app
+    return _registry_for(app.config.get('METRICS_PATH') or DEFAULT_METRICS_PATH)
+
+
+def inc_metric(name, labels=None, amount=1):
+    """Naikkan counter bisnis (dipanggil setelah commit berhasil). Tidak pernah raise."""
+    try:
+        get_metrics().inc(name, labels, amount)
+    except Exception as e:
+        print(f"ERROR: Gagal mencatat metrik {name}: {e}")
+
+
+def observe_metric(name, value, labels=None, app=None):
+    try:
+        get_metrics(app).observe(name, value, labels)
+    except Exception as e:
+        print(f"ERROR: Gagal mencatat metrik {name}: {e}")
+
+
+def flush_metrics(app=None):
+    app = app or current_app
+    try:
+        _catat_pool(app)
+        get_metrics(app).flush(app.config.get('METRICS_FLUSH_INTERVAL', 5))
+    except Exception as e:
+        print(f"ERROR: Gagal flush metrik: {e}")
+
+
+# ====================================================================
+# POOL DATABASE
+# ====================================================================
+
+# Metrik pool dicatat ke registry app terakhir yang di-init (satu app per proses)
+_pool_registry = None
+
+
+def _on_checkout(dbapi_connection, connection_record, connection_proxy):
+    if _pool_registry is not None:
+        _pool_registry.inc('sim_buah_db_pool_checkouts_total')
+
+
+def _on_pool_wait(seconds):
+    # Waktu tunggu diukur di engine_helper (QueuePool._do_get)
+    if _pool_registry is not None:
+        _pool_registry.observe('sim_buah_db_pool_wait_seconds', seconds)
+
+
+def _catat_pool(app):
+    """Gauge pool (checked out, overflow) untuk semua engine app ini."""
+    registry = get_metrics(app)
+    with app.app_context():
+        from ..database import db
+        checked_out = overflow = 0
+        for engine in db.engines.values():
+            pool = engine.pool
+            if isinstance(pool, QueuePool):
+                checked_out += pool.checkedout()
+                overflow += max(0, pool.overflow())
+    registry.set_gauge('sim_buah_db_pool_checked_out', checked_out)
+    registry.set_gauge('sim_buah_db_pool_overflow', overflow)
+
+
+# ====================================================================
+# THREAD FLUSHER & HOOK REQUEST
+# ====================================================================
+
+_flusher_pid = None
+_flusher_lock = threading.Lock()
+
+
+def _loop_flush(app, interval):
+    while True:
+        time.sleep(interval)
+        flush_metrics(app)
+
+
+def start_metrics_flusher(app):
+    """Start thread flusher di proses ini (sekali per PID, aman setelah fork)."""
+    global _flusher_pid
+    if _flusher_pid == os.getpid():
+        return
+    with _flusher_lock:
+        if _flusher_pid == os.getpid():
+            return
+        threading.Thread(
+            target=_loop_flush, args=(app, app.config.get('METRICS_FLUSH_INTERVAL', 5)),
+            name='metrics-flush', daemon=True
+        ).start()
+        atexit.register(flush_metrics, app)
+        _flusher_pid = os.getpid()
+
+
+def init_metrics(app):
+    """Pasang hook metrik request + endpoint GET /metrics (dari create_app dan app.py)."""
+    global _pool_registry
+    registry = get_metrics(app)
+    _pool_registry = registry
+    if not event.contains(Pool, 'checkout', _on_checkout):
+        event.listen(Pool, 'checkout', _on_checkout)
+    add_pool_wait_listener(_on_pool_wait)
+
+    @app.before_request
+    def mulai_metrik():
+        if _flusher_pid != os.getpid():
+            start_metrics_flusher(app)
+        g._metrics_start = time.perf_counter()
+        registry.add_gauge('sim_buah_http_requests_in_flight', 1)
+
+    @app.after_request
+    def status_metrik(response):
+        g._metrics_status = response.status_code
+        return response
+
+    @app.teardown_request
+    def catat_metrik(exc):
+        start = g.pop('_metrics_start', None)
+        if start is None:
+            return
+        registry.add_gauge('sim_buah_http_requests_in_flight', -1)
+        labels = {
+            'method': request.method,
+            'route': request.url_rule.rule if request.url_rule else '<unmatched>',
+            'blueprint': request.blueprint or '',
+        }
+        registry.observe('sim_buah_http_request_duration_seconds', time.perf_counter() - start, labels)
+        registry.inc('sim_buah_http_requests_total', dict(labels, status=g.pop('_metrics_status', 500)))
+
+    def metrics_view():
+        token = app.config.get('METRICS_TOKEN')
+        if token and request.headers.get('Authorization') != f'Bearer {token}':
+            return Response('unauthorized\n', status=401, mimetype='text/plain')
+        flush_metrics(app)
+        return Response(
+            registry.render(app.config.get('METRICS_FLUSH_INTERVAL', 5)),
+            mimetype='text/plain; version=0.0.4; charset=utf-8'
+        )
+
+    app.add_url_rule('/metrics', 'metrics', metrics_view, methods=['GET'])
@@ -0,0 +1,51 @@
+from datetime import datetime
+from flask import request
+
+# Batas default & maksimum jumlah baris per halaman untuk endpoint list
+DEFAULT_LIMIT = 20
+MAX_LIMIT = 100
+
+
+def get_limit_arg(default=DEFAULT_LIMIT, maximum=MAX_LIMIT):
+    """Ambil parameter ?limit= dan batasi ke rentang 1..maximum."""
+    try:
+        limit = int(request.args.get('limit', default))
+    except (TypeError, ValueError):
+        raise ValueError("Parameter limit harus berupa angka")
+    return max(1, min(limit, maximum))
+
+
+def get_int_arg(name):
+    """Ambil parameter query integer opsional (None jika tidak diisi)."""
+    value = request.args.get(name)
+    if value in (None, ''):
+        return None
+    try:
+        return int(value)
+    except ValueError:
+        raise ValueError(f"Parameter {name} harus berupa angka")
+
+
+def get_date_arg(name):
+    """Ambil parameter query tanggal opsional berformat YYYY-MM-DD."""
+    value = request.args.get(name)
+    if not value:
+        return None
+    try:
+        return datetime.strptime(value, '%Y-%m-%d').date()
+    except ValueError:
+        raise ValueError(f"Format {name} tidak valid (YYYY-MM-DD)")
+
+
+def get_page_arg():
+    """Ambil parameter ?page= (mulai dari 1)."""
+    try:
+        page = int(request.args.get('page', 1))
+    except (TypeError, ValueError):
+        raise ValueError("Parameter page harus berupa angka")
+    return max(1, page)
+
+
+def get_bool_arg(name):
+    """Parameter query boolean: '1', 'true', 'yes' dianggap True."""
+    return request.args.get(name, '').lower() in ('1', 'true', 'yes')
@@ -0,0 +1,172 @@
+import hashlib
+import math
+import os
+import tempfile
+import time
+from datetime import date
+from functools import lru_cache
+from flask import current_app
+from reportlab.lib import colors
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.styles import getSampleStyleSheet
+from reportlab.platypus import SimpleDocTemplate, LongTable, TableStyle, Paragraph, Spacer
+
+# ====================================================================
+# RENDER PDF LAPORAN BESAR
+# --------------------------------------------------------------------
+# - Baris dipecah menjadi LongTable seukuran satu halaman (header diulang di
+#   setiap potongan), jadi layout tidak perlu memecah satu tabel raksasa.
+# - Lebar kolom dihitung dari tipe kolom, bukan dibagi rata.
+# - Stylesheet & TableStyle dibuat sekali per proses dan dipakai ulang.
+# - PDF hasil render di-cache di disk dengan key (tipe laporan, rentang
+#   tanggal, versi data); unduhan ulang periode yang sudah tutup cukup
+#   mengirim file yang sudah ada.
+# ====================================================================
+
+# Naikkan jika tampilan PDF berubah, supaya cache lama tidak terpakai lagi
+RENDER_VERSION = 1
+
+_FONT = 'Helvetica'
+_FONT_BOLD = 'Helvetica-Bold'
+_FONT_SIZE = 8
+_ROW_HEIGHT = 14
+_PADDING = 3
+_SPACER = 12
+
+# Bobot lebar relatif per tipe kolom (lihat TIPE_KOLOM di export_helper)
+_BOBOT_KOLOM = {'int': 1.0, 'date': 1.4, 'number': 1.8, 'text': 3.0}
+
+# Stylesheet ReportLab cukup dibuat sekali per proses
+_STYLES = getSampleStyleSheet()
+
+
+@lru_cache(maxsize=None)
+def _table_style(types):
+    """TableStyle per kombinasi tipe kolom (angka rata kanan), dipakai ulang antar request."""
+    commands = [
+        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#047857')),
+        ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
+        ('FONTNAME', (0, 0), (-1, 0), _FONT_BOLD),
+        ('FONTNAME', (0, 1), (-1, -1), _FONT),
+        ('FONTSIZE', (0, 0), (-1, -1), _FONT_SIZE),
+        ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+        ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+        ('TOPPADDING', (0, 0), (-1, -1), _PADDING),
+        ('BOTTOMPADDING', (0, 0), (-1, -1), _PADDING),
+        ('INNERGRID', (0, 0), (-1, -1), 0.25, colors.black),
+        ('BOX', (0, 0), (-1, -1), 0.25, colors.black),
+    ]
+    for col, tipe in enumerate(types):
+        if tipe in ('int', 'number'):
+            commands.append(('ALIGN', (col, 0), (col, -1), 'RIGHT'))
+    return TableStyle(commands)
+
+
+def _lebar_kolom(types, total_width):
+    total_bobot = sum(_BOBOT_KOLOM[tipe] for tipe in types)
+    return [total_width * _BOBOT_KOLOM[tipe] / total_bobot for tipe in types]
+
+
+def _format_sel(value, tipe):
+    if value is None:
+        return ''
+    if tipe == 'number':
+        return f"{value:,.2f}"
+    if tipe == 'date' and isinstance(value, date):
+        return value.isoformat()
+    return str(value)
+
+
+def render_pdf(title, columns, types, rows, output):
+    """Render laporan sebagai potongan LongTable per halaman ke file object `output`."""
+    doc = SimpleDocTemplate(output, pagesize=A4, title=title)
+    types = tuple(types)
+    col_widths = _lebar_kolom(types, doc.width)
+    style = _table_style(types)
+
+    # Setiap potongan = header + baris yang pas satu frame halaman (frame punya
+    # padding 6pt atas & bawah). Sisa ruang < 2 baris, jadi potongan berikutnya
+    # selalu mulai di halaman baru. Potongan pertama dikurangi tinggi judul.
+    title_para = Paragraph(title, _STYLES['Title'])
+    _, title_height = title_para.wrap(doc.width, doc.height)
+    tinggi_frame = doc.height - 12
+    rows_per_page = max(1, int(tinggi_frame // _ROW_HEIGHT) - 1)
+    rows_first_page = max(1, rows_per_page - math.ceil(
+        (title_height + _STYLES['Title'].spaceAfter + _SPACER) / _ROW_HEIGHT))
+    header = list(columns)
+
+    def _table(chunk):
+        return LongTable([header] + chunk, colWidths=col_widths, rowHeights=_ROW_HEIGHT,
+                         repeatRows=1, style=style)
+
+    elements = [title_para, Spacer(1, _SPACER)]
+    chunk = []
+    limit = rows_first_page
+    for row in rows:
+        chunk.append([_format_sel(value, tipe) for value, tipe in zip(row, types)])
+        if len(chunk) == limit:
+            elements.append(_table(chunk))
+            chunk = []
+            limit = rows_per_page
+    if chunk or len(elements) == 2:
+        elements.append(_table(chunk))
+
+    doc.build(elements)
+    output.seek(0)
+    return output
+
+
+# ====================================================================
+# CACHE PDF DI DISK
+# ====================================================================
+
+def get_pdf_cache_dir():
+    directory = current_app.config.get('PDF_CACHE_DIR') or os.path.join(
+        tempfile.gettempdir(), 'sim_buah_pdf_cache')
+    os.makedirs(directory, exist_ok=True)
+    return directory
+
+
+def _purge_cache(directory, ttl):
+    batas = time.time() - ttl
+    for name in os.listdir(directory):
+        path = os.path.join(directory, name)
+        try:
+            if os.path.getmtime(path) < batas:
+                os.remove(path)
+        except OSError:
+            pass
+
+
+def cached_laporan_pdf(report_type, start_date, end_date, rows=None):
+    """
+    Path PDF laporan dari cache disk; dirender (lalu disimpan) jika belum ada
+    untuk versi data saat ini. `rows` opsional (generator yang sudah dibungkus,
+    mis. untuk progress job); hanya dipakai jika perlu render.
+    """
+    from .export_helper import KOLOM_LAPORAN, TIPE_KOLOM, iter_laporan_rows, nama_file_laporan, versi_data_laporan
+
+    directory = get_pdf_cache_dir()
+    key = hashlib.sha1(
+        f"{RENDER_VERSION}|{report_type}|{start_date}|{end_date}|"
+        f"{versi_data_laporan(report_type, start_date, end_date)}".encode()
+    ).hexdigest()
+    path = os.path.join(directory, f"{report_type}_{key}.pdf")
+    if os.path.exists(path):
+        os.utime(path)  # PDF yang sering diunduh tidak ikut terhapus oleh TTL
+        return path, True
+
+    _purge_cache(directory, current_app.config.get('PDF_CACHE_TTL', 86400))
+    if rows is None:
+        rows = iter_laporan_rows(report_type, start_date, end_date)
+    fd, tmp_path = tempfile.mkstemp(suffix='.part', dir=directory)
+    try:
+        with os.fdopen(fd, 'wb') as output:
+            render_pdf(nama_file_laporan(report_type, start_date, end_date),
+                       KOLOM_LAPORAN[report_type], TIPE_KOLOM[report_type], rows, output)
+        os.replace(tmp_path, path)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return path, False
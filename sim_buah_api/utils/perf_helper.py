@@ -0,0 +1,161 @@
+import os
+import re
+import threading
+import time
+from collections import Counter, defaultdict, deque
+from flask import g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# ====================================================================
+# INSTRUMENTASI PERFORMA PER REQUEST
+# --------------------------------------------------------------------
+# Per request dicatat: waktu total, jumlah statement SQL, waktu SQL dan
+# rows_affected = baris yang diubah INSERT / UPDATE / DELETE (cursor.rowcount).
+# Baris hasil SELECT tidak dihitung: rowcount untuk SELECT bernilai -1 di
+# SQLite dan driver lain, jadi angkanya tidak bisa dibandingkan antar
+# database. Hasilnya:
+#   - header Server-Timing (app;dur=.., db;dur=..) untuk devtools browser
+#   - jendela bergulir PERF_WINDOW sampel per endpoint -> persentil di
+#     GET /api/monitor/perf (per proses worker)
+#   - peringatan N+1: statement dengan bentuk sama (literal & daftar IN
+#     dinormalisasi) dijalankan lebih dari PERF_N_PLUS_ONE_THRESHOLD kali
+# ====================================================================
+
+_IN_LIST = re.compile(r'\(\s*(?:\?|%s|:\w+)(?:\s*,\s*(?:\?|%s|:\w+))*\s*\)')
+_LITERAL = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_SPASI = re.compile(r'\s+')
+
+
+def bentuk_statement(statement):
+    """Normalisasi SQL jadi 'bentuk' statement: literal & daftar parameter IN diseragamkan."""
+    shape = _LITERAL.sub('?', statement)
+    shape = _IN_LIST.sub('(?)', shape)
+    return _SPASI.sub(' ', shape).strip()
+
+
+class PerfStore:
+    """Sampel per endpoint (deque ber-ukuran tetap) milik satu proses worker."""
+
+    def __init__(self, window):
+        self.window = window
+        self._lock = threading.Lock()
+        self._samples = defaultdict(lambda: deque(maxlen=self.window))
+        self._n_plus_one = Counter()
+        self._total = Counter()
+
+    def record(self, endpoint, sample, n_plus_one=None):
+        with self._lock:
+            self._samples[endpoint].append(sample)
+            self._total[endpoint] += 1
+            if n_plus_one:
+                self._n_plus_one[endpoint] += 1
+
+    def snapshot(self):
+        with self._lock:
+            data = {endpoint: list(samples) for endpoint, samples in self._samples.items()}
+            totals = dict(self._total)
+            n_plus_one = dict(self._n_plus_one)
+
+        result = {}
+        for endpoint, samples in data.items():
+            wall = sorted(s['wall_ms'] for s in samples)
+            sql_ms = sorted(s['sql_ms'] for s in samples)
+            sql_count = [s['sql_count'] for s in samples]
+            result[endpoint] = {
+                "requests": totals.get(endpoint, 0),
+                "window": len(samples),
+                "wall_ms": _persentil(wall),
+                "sql_ms": _persentil(sql_ms),
+                "sql_count_avg": round(sum(sql_count) / len(sql_count), 2),
+                "sql_count_max": max(sql_count),
+                "rows_affected_avg": round(sum(s['rows_affected'] for s in samples) / len(samples), 2),
+                "n_plus_one": n_plus_one.get(endpoint, 0),
+                "last_n_plus_one": next(
+                    (s['n_plus_one'] for s in reversed(samples) if s['n_plus_one']), None),
+            }
+        return result
+
+
+def _persentil(values):
+    """p50/p95/p99 (nearest-rank) dari list yang sudah terurut."""
+    def rank(p):
+        return round(values[min(len(values) - 1, max(0, int(p / 100 * len(values) + 0.5) - 1))], 2)
+    return {"p50": rank(50), "p95": rank(95), "p99": rank(99), "max": round(values[-1], 2)}
+
+
+# ====================================================================
+# HOOK ENGINE (SEMUA ENGINE, TERMASUK BIND LAIN) & REQUEST
+# ====================================================================
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if has_request_context() and '_perf' in g:
+        conn.info.setdefault('_perf_start', []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if not (has_request_context() and '_perf' in g):
+        return
+    starts = conn.info.get('_perf_start')
+    if not starts:
+        return
+    perf = g._perf
+    perf['sql_ms'] += (time.perf_counter() - starts.pop()) * 1000
+    perf['sql_count'] += 1
+    perf['shapes'][bentuk_statement(statement)] += 1
+    if (context.isinsert or context.isupdate or context.isdelete) and cursor.rowcount > 0:
+        perf['rows_affected'] += cursor.rowcount
+
+
+def init_perf(app):
+    """Pasang middleware instrumentasi (dipanggil dari create_app dan app.py)."""
+    if not event.contains(Engine, 'before_cursor_execute', _before_cursor_execute):
+        event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+
+    store = PerfStore(app.config.get('PERF_WINDOW', 1000))
+    app.extensions['perf_store'] = store
+    threshold = app.config.get('PERF_N_PLUS_ONE_THRESHOLD', 10)
+
+    @app.before_request
+    def mulai_perf():
+        g._perf = {'start': time.perf_counter(), 'sql_count': 0, 'sql_ms': 0.0, 'rows_affected': 0, 'shapes': Counter()}
+
+    @app.after_request
+    def catat_perf(response):
+        perf = g.pop('_perf', None)
+        if perf is None:
+            return response
+        wall_ms = (time.perf_counter() - perf['start']) * 1000
+
+        n_plus_one = None
+        if perf['shapes']:
+            shape, count = perf['shapes'].most_common(1)[0]
+            if count > threshold:
+                n_plus_one = {"count": count, "statement": shape[:300]}
+                app.logger.warning(
+                    "Kemungkinan N+1 di %s %s: statement sama dijalankan %d kali: %s",
+                    request.method, request.path, count, shape[:300]
+                )
+
+        # Pakai pola route (bukan path asli) supaya /x/1 dan /x/2 masuk satu endpoint
+        endpoint = f"{request.method} {request.url_rule.rule if request.url_rule else '<unmatched>'}"
+        store.record(endpoint, {
+            'wall_ms': wall_ms,
+            'sql_ms': perf['sql_ms'],
+            'sql_count': perf['sql_count'],
+            'rows_affected': perf['rows_affected'],
+            'n_plus_one': n_plus_one,
+        }, n_plus_one)
+
+        response.headers.add(
+            'Server-Timing',
+            f'app;dur={wall_ms:.1f}, db;dur={perf["sql_ms"]:.1f};desc="{perf["sql_count"]} queries"'
+        )
+        return response
+
+
+def perf_snapshot(app):
+    """Ringkasan persentil per endpoint untuk proses worker ini."""
+    store = app.extensions.get('perf_store')
+    return {"pid": os.getpid(), "endpoints": store.snapshot() if store else {}}
@@ -0,0 +1,145 @@
+from decimal import Decimal
+from sqlalchemy import case, delete, func, insert, select
+from ..database import db
+from ..models import BarangKeluar, RekapPenjualanHarian
+
+# ====================================================================
+# REKAP PENJUALAN HARIAN
+# --------------------------------------------------------------------
+# Laporan penjualan & grafik dashboard membaca tabel rekap_penjualan_harian
+# (satu baris per hari), bukan GROUP BY ulang seluruh trx_barang_keluar.
+# Setiap perubahan pesanan mengirim delta lewat catat_rekap_penjualan()
+# di transaksi yang sama, sehingga rekap ikut di-rollback jika pesanan gagal.
+#
+# Delta diterapkan dengan satu UPSERT atomik (nilai = nilai + delta), jadi
+# dua worker yang menulis hari yang sama tidak saling menimpa. Baris rekap
+# di-lock paling akhir (setelah batch_stok dan master_buah).
+# ====================================================================
+
+STATUS_BATAL = "Batal"
+
+
+def _upsert_statement(values):
+    """INSERT ... ON CONFLICT/DUPLICATE KEY yang menambahkan delta ke baris yang sudah ada."""
+    dialect = db.session.get_bind().dialect.name
+    table = RekapPenjualanHarian.__table__
+    if dialect == 'mysql':
+        from sqlalchemy.dialects.mysql import insert as dialect_insert
+        stmt = dialect_insert(table).values(**values)
+        new = stmt.inserted
+        return stmt.on_duplicate_key_update(
+            jumlah_transaksi=table.c.jumlah_transaksi + new.jumlah_transaksi,
+            total_penjualan=table.c.total_penjualan + new.total_penjualan,
+            jumlah_batal=table.c.jumlah_batal + new.jumlah_batal,
+        )
+    if dialect == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert as dialect_insert
+    else:
+        from sqlalchemy.dialects.postgresql import insert as dialect_insert
+    stmt = dialect_insert(table).values(**values)
+    new = stmt.excluded
+    return stmt.on_conflict_do_update(
+        index_elements=[table.c.tanggal],
+        set_={
+            "jumlah_transaksi": table.c.jumlah_transaksi + new.jumlah_transaksi,
+            "total_penjualan": table.c.total_penjualan + new.total_penjualan,
+            "jumlah_batal": table.c.jumlah_batal + new.jumlah_batal,
+        }
+    )
+
+
+def catat_rekap_penjualan(tanggal, jumlah_transaksi=0, total_penjualan=0, jumlah_batal=0):
+    """Tambahkan delta ke rekap hari `tanggal` (delta boleh negatif). Tidak melakukan commit."""
+    if not (jumlah_transaksi or total_penjualan or jumlah_batal):
+        return
+    db.session.execute(_upsert_statement({
+        "tanggal": tanggal,
+        "jumlah_transaksi": jumlah_transaksi,
+        "total_penjualan": Decimal(str(total_penjualan or 0)),
+        "jumlah_batal": jumlah_batal,
+    }))
+
+
+def rekap_pesanan_baru(trx):
+    catat_rekap_penjualan(
+        trx.tanggal_transaksi, jumlah_transaksi=1, total_penjualan=trx.total_penjualan,
+        jumlah_batal=1 if trx.status_pesanan == STATUS_BATAL else 0
+    )
+
+
+def rekap_ubah_status(trx, status_lama, status_baru):
+    """Hanya perpindahan ke / dari 'Batal' yang mengubah rekap."""
+    if (status_lama == STATUS_BATAL) == (status_baru == STATUS_BATAL):
+        return
+    catat_rekap_penjualan(trx.tanggal_transaksi, jumlah_batal=1 if status_baru == STATUS_BATAL else -1)
+
+
+def rekap_hapus_pesanan(trx):
+    catat_rekap_penjualan(
+        trx.tanggal_transaksi, jumlah_transaksi=-1, total_penjualan=-(trx.total_penjualan or 0),
+        jumlah_batal=-1 if trx.status_pesanan == STATUS_BATAL else 0
+    )
+
+
+# ====================================================================
+# REBUILD / REKONSILIASI
+# ====================================================================
+
+def _agregat_transaksi(start_date=None, end_date=None):
+    """SELECT agregat per hari langsung dari trx_barang_keluar (sumber kebenaran)."""
+    query = select(
+        BarangKeluar.tanggal_transaksi.label('tanggal'),
+        func.count(BarangKeluar.keluar_id).label('jumlah_transaksi'),
+        func.coalesce(func.sum(BarangKeluar.total_penjualan), 0).label('total_penjualan'),
+        func.coalesce(func.sum(case((BarangKeluar.status_pesanan == STATUS_BATAL, 1), else_=0)), 0).label('jumlah_batal'),
+    ).group_by(BarangKeluar.tanggal_transaksi)
+    if start_date:
+        query = query.where(BarangKeluar.tanggal_transaksi >= start_date)
+    if end_date:
+        query = query.where(BarangKeluar.tanggal_transaksi <= end_date)
+    return query
+
+
+def _filter_rentang(query, start_date, end_date):
+    if start_date:
+        query = query.where(RekapPenjualanHarian.tanggal >= start_date)
+    if end_date:
+        query = query.where(RekapPenjualanHarian.tanggal <= end_date)
+    return query
+
+
+def rebuild_rekap_penjualan(start_date=None, end_date=None):
+    """
+    Hapus rekap pada rentang tanggal lalu isi ulang dengan satu INSERT ... SELECT.
+    Tanpa rentang = seluruh tabel. Tidak melakukan commit. Mengembalikan jumlah hari.
+    """
+    db.session.execute(_filter_rentang(delete(RekapPenjualanHarian), start_date, end_date))
+    agregat = _agregat_transaksi(start_date, end_date)
+    db.session.execute(
+        insert(RekapPenjualanHarian).from_select(
+            ['tanggal', 'jumlah_transaksi', 'total_penjualan', 'jumlah_batal'], agregat
+        )
+    )
+    return db.session.execute(
+        _filter_rentang(select(func.count()).select_from(RekapPenjualanHarian), start_date, end_date)
+    ).scalar()
+
+
+def cek_rekap_penjualan(start_date=None, end_date=None):
+    """Bandingkan rekap dengan transaksi asli; kembalikan daftar hari yang berbeda."""
+    def normal(row):
+        return (int(row.jumlah_transaksi), Decimal(str(row.total_penjualan)), int(row.jumlah_batal))
+
+    asli = {row.tanggal: normal(row) for row in db.session.execute(_agregat_transaksi(start_date, end_date))}
+    rekap = {
+        row.tanggal: normal(row)
+        for row in db.session.execute(_filter_rentang(select(RekapPenjualanHarian), start_date, end_date)).scalars()
+        # Hari yang semua pesanannya sudah dihapus tersisa sebagai baris nol
+        if row.jumlah_transaksi or row.total_penjualan or row.jumlah_batal
+    }
+    kosong = (0, Decimal('0'), 0)
+    return [
+        {"tanggal": tanggal, "transaksi": asli.get(tanggal, kosong), "rekap": rekap.get(tanggal, kosong)}
+        for tanggal in sorted(set(asli) | set(rekap))
+        if asli.get(tanggal, kosong) != rekap.get(tanggal, kosong)
+    ]
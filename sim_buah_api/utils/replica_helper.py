@@ -0,0 +1,119 @@
+from flask import g, has_request_context, request
+from flask_jwt_extended import get_jwt_identity, verify_jwt_in_request
+from flask_sqlalchemy.session import Session
+from sqlalchemy.sql.selectable import CompoundSelect, Select
+from .cache_helper import get_cache
+
+# ====================================================================
+# READ REPLICA (OPSIONAL)
+# --------------------------------------------------------------------
+# Jika DATABASE_REPLICA_URL di-set, engine kedua didaftarkan sebagai bind
+# 'replica'. RoutingSession mengirim SELECT biasa ke replica hanya untuk
+# request baca (GET) di blueprint DB_REPLICA_BLUEPRINTS (laporan,
+# monitor, listing). Selalu ke primary:
+#   - INSERT/UPDATE/DELETE, flush, SELECT ... FOR UPDATE, SQL mentah
+#   - semua query sesudah ada write di sesi yang sama
+#   - request dengan header 'X-Read-Primary: 1'
+#   - user yang baru saja menulis (read-your-writes): penanda di cache
+#     bersama selama DB_REPLICA_STICKY_SECONDS setelah write sukses
+#   - data yang dibangun untuk cache bersama (baca_dari_primary)
+# ====================================================================
+
+REPLICA_BIND = 'replica'
+_WRITE_METHODS = ('POST', 'PUT', 'PATCH', 'DELETE')
+
+
+def _replica_engine(db):
+    return db.engines.get(REPLICA_BIND)
+
+
+class RoutingSession(Session):
+    """Session Flask-SQLAlchemy yang bisa mengarahkan SELECT ke bind 'replica'."""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None:
+            if isinstance(clause, (Select, CompoundSelect)) and clause._for_update_arg is None:
+                if (not self.info.get('_ada_write') and has_request_context()
+                        and g.get('_baca_replica')):
+                    engine = _replica_engine(self._db)
+                    if engine is not None:
+                        return engine
+            else:
+                # DML / flush / SQL mentah: sisa sesi ini dibaca dari primary
+                self.info['_ada_write'] = True
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+def get_read_engine(db):
+    """
+    Engine untuk query baca di luar sesi ORM (stream export): replica jika
+    request ini boleh membaca replica, atau di luar request (job background).
+    """
+    engine = _replica_engine(db)
+    if engine is not None and (not has_request_context() or g.get('_baca_replica')):
+        return engine
+    return db.engine
+
+
+def baca_dari_primary():
+    """
+    Sisa request ini membaca dari primary. Dipakai sebelum membangun data yang
+    di-cache di bawah versi terbaru (snapshot dashboard): hasil dari replica
+    yang tertinggal akan tersimpan basi selama TTL cache.
+    """
+    if has_request_context():
+        g._baca_replica = False
+
+
+def _sticky_key(user_id):
+    return f"replica:baru_menulis:{user_id}"
+
+
+def _user_id_request():
+    try:
+        verify_jwt_in_request(optional=True)
+        return get_jwt_identity()
+    except Exception:
+        # Token tidak valid ditangani oleh @jwt_required di view
+        return None
+
+
+def init_read_replica(app):
+    """
+    Daftarkan bind 'replica' (jika DATABASE_REPLICA_URL di-set) dan hook
+    routing per request. Dipanggil sebelum db.init_app di create_app dan app.py.
+    """
+    replica_url = app.config.get('DATABASE_REPLICA_URL')
+    if not replica_url:
+        return
+    binds = dict(app.config.get('SQLALCHEMY_BINDS') or {})
+    binds.setdefault(REPLICA_BIND, replica_url)
+    app.config['SQLALCHEMY_BINDS'] = binds
+
+    blueprints = set(app.config.get('DB_REPLICA_BLUEPRINTS') or ())
+    sticky_seconds = app.config.get('DB_REPLICA_STICKY_SECONDS', 5)
+
+    @app.before_request
+    def pilih_replica():
+        if request.method != 'GET' or request.blueprint not in blueprints:
+            return
+        if request.headers.get('X-Read-Primary') == '1':
+            return
+        user_id = _user_id_request()
+        if user_id and get_cache().get(_sticky_key(user_id), count=False):
+            return
+        g._baca_replica = True
+
+    @app.after_request
+    def tandai_write(response):
+        # Write sukses -> baca berikutnya dari user ini ke primary selama sticky_seconds
+        if request.method in _WRITE_METHODS and response.status_code < 400 and sticky_seconds > 0:
+            user_id = _user_id_request()
+            if user_id:
+                try:
+                    get_cache().set(_sticky_key(user_id), 1, sticky_seconds)
+                except Exception as e:
+                    print(f"ERROR: Gagal menandai read-your-writes: {e}")
+        if request.method == 'GET':
+            response.headers['X-DB-Read'] = 'replica' if g.get('_baca_replica') else 'primary'
+        return response
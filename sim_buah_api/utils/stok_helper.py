@@ -0,0 +1,98 @@
+from sqlalchemy import case, update
+from sqlalchemy.exc import OperationalError
+from ..database import db
+from ..models import BatchStok, Buah
+from .versi_helper import tandai_versi
+
+# ====================================================================
+# MUTASI STOK ATOMIK
+# --------------------------------------------------------------------
+# Semua perubahan stok dilakukan sebagai UPDATE bersyarat di SQL
+# (stok = stok - qty WHERE stok >= qty), bukan read-modify-write di Python,
+# sehingga dua worker gunicorn tidak bisa menjual stok yang sama dua kali.
+# Setiap fungsi hanya mengirim satu statement berapapun jumlah barisnya.
+#
+# Urutan lock yang dipakai di seluruh aplikasi:
+#   0. trx_barang_keluar (satu pesanan; batal / hapus diawali UPDATE status
+#      bersyarat yang menjadi guard, lihat transaksi_routes.ganti_status)
+#   1. batch_stok   (batch_id menaik; pesanan baru mengunci semua batch yang
+#                    mungkin dipakai, eksplisit maupun FIFO, dengan satu
+#                    SELECT ... FOR UPDATE urut batch_id, lihat
+#                    utils/fifo_helper.kunci_batch)
+#   2. master_buah  (buah_id menaik)
+#   3. rekap_penjualan_harian (lihat utils/rekap_helper.py)
+#   4. versi_data   (saat commit, lihat utils/versi_helper.py)
+# ====================================================================
+
+# Kode error MySQL: 1205 = lock wait timeout, 1213 = deadlock
+_LOCK_ERROR_CODES = {1205, 1213}
+
+
+class KonflikStok(Exception):
+    """UPDATE bersyarat gagal: stok salah satu batch sudah berubah / tidak cukup."""
+
+    def __init__(self, batch_ids):
+        self.batch_ids = list(batch_ids)
+        daftar = ", ".join(str(batch_id) for batch_id in self.batch_ids)
+        super().__init__(f"Stok batch {daftar} tidak cukup atau sudah berubah, silakan coba lagi")
+
+
+def _case_per_id(column, perubahan):
+    """CASE column WHEN id THEN nilai ... END untuk satu UPDATE multi-baris."""
+    return case(perubahan, value=column)
+
+
+def kurangi_stok_batch(perubahan):
+    """
+    Kurangi stok_saat_ini untuk {batch_id: qty} dalam SATU UPDATE bersyarat.
+    Raise KonflikStok jika jumlah baris ter-update kurang dari jumlah batch
+    (artinya ada batch yang stoknya tidak cukup saat UPDATE dijalankan).
+    """
+    if not perubahan:
+        return
+    qty = _case_per_id(BatchStok.batch_id, perubahan)
+    result = db.session.execute(
+        update(BatchStok)
+        .where(BatchStok.batch_id.in_(sorted(perubahan)), BatchStok.stok_saat_ini >= qty)
+        .values(stok_saat_ini=BatchStok.stok_saat_ini - qty)
+        .execution_options(synchronize_session=False)
+    )
+    if result.rowcount != len(perubahan):
+        raise KonflikStok(sorted(perubahan))
+
+
+def tambah_stok_batch(perubahan):
+    """Kembalikan stok_saat_ini untuk {batch_id: qty} (pembatalan / hapus pesanan)."""
+    if not perubahan:
+        return
+    db.session.execute(
+        update(BatchStok)
+        .where(BatchStok.batch_id.in_(sorted(perubahan)))
+        .values(stok_saat_ini=BatchStok.stok_saat_ini + _case_per_id(BatchStok.batch_id, perubahan))
+        .execution_options(synchronize_session=False)
+    )
+
+
+def ubah_stok_total(perubahan):
+    """Terapkan delta {buah_id: delta} ke Buah.stok_total dalam satu UPDATE (delta boleh negatif)."""
+    perubahan = {buah_id: delta for buah_id, delta in perubahan.items() if delta}
+    if not perubahan:
+        return
+    db.session.execute(
+        update(Buah)
+        .where(Buah.buah_id.in_(sorted(perubahan)))
+        .values(stok_total=Buah.stok_total + _case_per_id(Buah.buah_id, perubahan))
+        .execution_options(synchronize_session=False)
+    )
+    # UPDATE massal tidak lewat flush ORM: tandai manual supaya ETag list buah berubah
+    tandai_versi('buah')
+
+
+def is_lock_conflict(exc):
+    """True jika error database adalah deadlock / lock timeout yang aman untuk dicoba ulang."""
+    if not isinstance(exc, OperationalError):
+        return False
+    args = getattr(exc.orig, 'args', ())
+    if args and args[0] in _LOCK_ERROR_CODES:
+        return True
+    return 'database is locked' in str(exc.orig)
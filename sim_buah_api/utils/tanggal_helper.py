@@ -0,0 +1,42 @@
+from datetime import timedelta
+from sqlalchemy import Integer
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.functions import FunctionElement
+
+# ====================================================================
+# ARITMETIKA TANGGAL
+# --------------------------------------------------------------------
+# Selisih hari antar DATE ditulis berbeda di tiap database; selisih_hari()
+# dikompilasi sesuai dialek supaya query kesegaran batch (monitor, scan
+# kadaluarsa) bisa dihitung di SQL, bukan di loop Python.
+# ====================================================================
+
+
+class selisih_hari(FunctionElement):
+    """selisih_hari(a, b) -> jumlah hari a - b (integer)."""
+    type = Integer()
+    inherit_cache = True
+    name = 'selisih_hari'
+
+
+@compiles(selisih_hari)
+def _selisih_hari_default(element, compiler, **kw):
+    a, b = list(element.clauses)
+    return f"({compiler.process(a, **kw)} - {compiler.process(b, **kw)})"
+
+
+@compiles(selisih_hari, 'mysql')
+def _selisih_hari_mysql(element, compiler, **kw):
+    a, b = list(element.clauses)
+    return f"DATEDIFF({compiler.process(a, **kw)}, {compiler.process(b, **kw)})"
+
+
+@compiles(selisih_hari, 'sqlite')
+def _selisih_hari_sqlite(element, compiler, **kw):
+    a, b = list(element.clauses)
+    return f"CAST(julianday({compiler.process(a, **kw)}) - julianday({compiler.process(b, **kw)}) AS INTEGER)"
+
+
+def hitung_kadaluarsa(tanggal_masuk, umur_simpan_hari):
+    """Tanggal kadaluarsa batch = tanggal masuk + umur simpan buah."""
+    return tanggal_masuk + timedelta(days=int(umur_simpan_hari or 0))
@@ -0,0 +1,104 @@
+from flask import current_app, jsonify, request
+from sqlalchemy import event, select
+from ..database import db
+from ..models import Buah, Supplier, Pelanggan, VersiData
+
+# ====================================================================
+# VERSI DATA MASTER (ETAG LIST BUAH / SUPPLIER / PELANGGAN)
+# --------------------------------------------------------------------
+# Setiap tabel master punya satu baris di versi_data. Tabel yang berubah
+# di sebuah transaksi ditandai di session.info:
+#   - otomatis saat flush ORM (create / update / delete di master_routes)
+#   - lewat tandai_versi() untuk UPDATE massal (ubah_stok_total)
+# lalu versinya dinaikkan dengan satu UPSERT tepat sebelum commit, di
+# transaksi yang sama. Versi & data selalu konsisten (juga di read replica),
+# dan baris versi di-lock paling akhir (setelah rekap_penjualan_harian)
+# hanya selama commit.
+#
+# GET list membaca versi lebih dulu: jika cocok dengan If-None-Match, balas
+# 304 tanpa membaca baris data sama sekali.
+# ====================================================================
+
+_TABEL_MODEL = {Buah: 'buah', Supplier: 'supplier', Pelanggan: 'pelanggan'}
+_INFO_KEY = '_versi_tabel'
+
+
+def tandai_versi(*tabel):
+    """Tandai tabel master yang berubah di transaksi aktif (versi naik saat commit)."""
+    db.session.info.setdefault(_INFO_KEY, set()).update(tabel)
+
+
+def _tandai_dari_flush(session, flush_context, instances):
+    tabel = {
+        _TABEL_MODEL[type(obj)]
+        for obj in (*session.new, *session.dirty, *session.deleted)
+        if type(obj) in _TABEL_MODEL and (obj not in session.dirty or session.is_modified(obj))
+    }
+    if tabel:
+        session.info.setdefault(_INFO_KEY, set()).update(tabel)
+
+
+def _upsert_statement(tabel):
+    """INSERT ... ON CONFLICT/DUPLICATE KEY: versi + 1 (baris baru mulai dari 1)."""
+    dialect = db.engine.dialect.name
+    table = VersiData.__table__
+    values = [{"nama_tabel": nama, "versi": 1} for nama in tabel]
+    if dialect == 'mysql':
+        from sqlalchemy.dialects.mysql import insert as dialect_insert
+        stmt = dialect_insert(table).values(values)
+        return stmt.on_duplicate_key_update(versi=table.c.versi + 1)
+    if dialect == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert as dialect_insert
+    else:
+        from sqlalchemy.dialects.postgresql import insert as dialect_insert
+    stmt = dialect_insert(table).values(values)
+    return stmt.on_conflict_do_update(
+        index_elements=[table.c.nama_tabel],
+        set_={"versi": table.c.versi + 1},
+    )
+
+
+def _naikkan_versi(session):
+    # Flush lebih dulu supaya perubahan ORM yang belum di-flush ikut tertandai
+    session.flush()
+    tabel = session.info.pop(_INFO_KEY, None)
+    if tabel:
+        # Urutan nama tetap -> urutan lock baris versi sama di semua worker
+        session.execute(_upsert_statement(sorted(tabel)))
+
+
+def _buang_tanda(session, previous_transaction=None):
+    """Transaksi batal -> tidak ada data yang berubah, versi tidak perlu naik."""
+    session.info.pop(_INFO_KEY, None)
+
+
+def init_versi_data(app):
+    """Pasang hook session (dipanggil dari create_app dan app.py)."""
+    if not event.contains(db.session, 'before_commit', _naikkan_versi):
+        event.listen(db.session, 'before_flush', _tandai_dari_flush)
+        event.listen(db.session, 'before_commit', _naikkan_versi)
+        event.listen(db.session, 'after_soft_rollback', _buang_tanda)
+
+
+def ambil_versi(tabel):
+    """Versi tabel saat ini (0 jika belum pernah berubah): satu lookup primary key."""
+    versi = db.session.execute(
+        select(VersiData.versi).where(VersiData.nama_tabel == tabel)
+    ).scalar()
+    return versi or 0
+
+
+def jsonify_list_versi(tabel, ambil_data):
+    """
+    Response list master dengan ETag "<tabel>-<versi>". If-None-Match cocok ->
+    304 tanpa memanggil ambil_data(); selain itu jsonify(ambil_data()).
+    """
+    etag = f"{tabel}-{ambil_versi(tabel)}"
+    if request.if_none_match.contains(etag):
+        response = current_app.response_class(status=304)
+    else:
+        response = jsonify(ambil_data())
+    response.set_etag(etag)
+    # private: data hanya untuk user yang login; no-cache: browser selalu revalidasi
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
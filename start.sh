@@ -5,22 +5,27 @@ echo "=== AUTO MIGRATION START ==="
 export FLASK_APP=app.py
 export FLASK_ENV=production
 
-# Hapus migrations lama jika ada
-if [ -d "migrations" ]; then
-  echo "Old migrations found, removing..."
-  rm -rf migrations
-fi
-
-# Init migrations baru
-echo "Initializing new migrations..."
-flask db init
-
-# Buat migration baru dari model saat ini
-echo "Generating new migration..."
-flask db migrate -m "auto migration" || echo "No changes detected in models."
-
-# Terapkan migration ke database
+# Migrasi disimpan di repo (folder migrations/) dan ditulis idempotent,
+# jadi cukup jalankan upgrade. Jika alembic_version masih berisi revisi
+# lama hasil autogenerate sebelumnya (alembic: "Can't locate revision"),
+# reset lalu upgrade ulang. Error lain (koneksi, SQL migrasi gagal, dst.)
+# tidak boleh menyentuh alembic_version: deploy dihentikan.
 echo "Applying migration..."
-flask db upgrade
+LOG=$(mktemp)
+if ! flask db upgrade >"$LOG" 2>&1; then
+  cat "$LOG"
+  if grep -q "Can't locate revision" "$LOG"; then
+    echo "Unknown revision in alembic_version, re-stamping..."
+    flask db stamp --purge base || exit 1
+    flask db upgrade || exit 1
+  else
+    echo "ERROR: Migrasi gagal, alembic_version tidak diubah."
+    rm -f "$LOG"
+    exit 1
+  fi
+else
+  cat "$LOG"
+fi
+rm -f "$LOG"
 
 echo "=== AUTO MIGRATION DONE ==="